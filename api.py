@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from auspicious import search_days
+from bazi_core import Bazi, analyze_bazi, cached_analysis
+from batch import chunked, record_datetime, record_pillars
+from bulk import chart_line
+
+# --- HTTP API (ASGI，不依賴 Streamlit) ---
+# 處理函式皆為 async；排盤與分析在程序池中執行，事件迴圈只負責解析請求與輸出 JSON。
+# 啟動：python api.py --port 8000 --workers 4，或 uvicorn api:app (程序數取環境變數 BAZI_API_WORKERS)
+
+BATCH_CHUNK_SIZE = 256
+MAX_BATCH_SIZE = 10000
+
+
+def chart_record(record):
+    pillars = record_pillars(record)
+    return {'pillars': pillars, 'gender': Bazi(*pillars, record['gender']).gender}
+
+
+def record_birth(record):
+    """出生時刻：datetime 欄位 (同 record_datetime)，或 birth_date (含時刻時為 datetime，只有日期時為 date)"""
+    if record.get('datetime'):
+        return record_datetime(record)
+    value = record.get('birth_date')
+    if not value:
+        return None
+    return (datetime.datetime if 'T' in value or ' ' in value.strip() else datetime.date).fromisoformat(value)
+
+
+def analyze_record(record):
+    """在工作程序中分析一筆紀錄；有出生時刻時大運用實際起運歲數，沒有時走 cached_analysis"""
+    pillars = record_pillars(record)
+    birth_date = record_birth(record)
+    if birth_date is not None:
+        return analyze_bazi(Bazi(*pillars, record['gender']), birth_date)
+    return cached_analysis(*pillars, record['gender'])
+
+
+def analyze_records(records):
+    """在工作程序中分析一批紀錄；單筆錯誤只影響該筆，回傳 {'error': 訊息}"""
+    out = []
+    for record in records:
+        try:
+            out.append(analyze_record(record))
+        except (KeyError, TypeError, ValueError) as e:
+            out.append({'error': error_message(e)})
+    return out
+
+
+def summary_record(record):
+    """在工作程序中取命盤摘要 (與 bulk.py 輸出相同)：結果庫存在時為 O(1) 查表，否則即時計算"""
+    line = chart_line(None, record)
+    line.pop('row')
+    return line
+
+
+def auspicious_record(record):
+    """在工作程序中擇日；未指定區間時為今天起一年"""
+    try:
+        bazi = Bazi(*record_pillars(record), record['gender'])
+        start = datetime.date.fromisoformat(record['start']) if record.get('start') else datetime.date.today()
+        end = datetime.date.fromisoformat(record['end']) if record.get('end') else start + datetime.timedelta(days=365)
+        return {'days': search_days(bazi, start, end, record.get('purpose', '一般'), int(record.get('top', 10)))}
+    except (KeyError, TypeError, ValueError) as e:
+        return {'error': error_message(e)}
+
+
+async def request_params(request):
+    """合併查詢字串與 JSON 內容 (POST)"""
+    params = dict(request.query_params)
+    if request.method == 'POST':
+        body = await request.json()
+        if not isinstance(body, dict):
+            raise ValueError("請求內容需為 JSON 物件")
+        params.update(body)
+    return params
+
+
+async def run_in_pool(request, func, *args):
+    return await asyncio.get_running_loop().run_in_executor(request.app.state.pool, func, *args)
+
+
+def error_message(e):
+    return f"{type(e).__name__}: {e}"
+
+
+def error_response(message, status=400):
+    return JSONResponse({'error': message}, status_code=status)
+
+
+async def chart_endpoint(request):
+    """datetime + gender → 四柱 (查表運算，直接在事件迴圈中完成)"""
+    try:
+        return JSONResponse(chart_record(await request_params(request)))
+    except (KeyError, TypeError, ValueError) as e:
+        return error_response(error_message(e))
+
+
+async def analysis_endpoint(request):
+    """pillars (或 datetime) + gender [+ birth_date] → 完整分析鏈結果；有出生時刻時大運為實際起運歲數"""
+    try:
+        params = await request_params(request)
+    except ValueError as e:
+        return error_response(error_message(e))
+    result = (await run_in_pool(request, analyze_records, [params]))[0]
+    return JSONResponse(result, status_code=400 if 'error' in result else 200)
+
+
+async def summary_endpoint(request):
+    """pillars (或 datetime) + gender → 五行分數、強弱、格局、喜用忌神與神煞摘要 (優先查預算結果庫)"""
+    try:
+        params = await request_params(request)
+    except ValueError as e:
+        return error_response(error_message(e))
+    result = await run_in_pool(request, summary_record, params)
+    return JSONResponse(result, status_code=400 if 'error' in result else 200)
+
+
+async def auspicious_endpoint(request):
+    """pillars (或 datetime) + gender [+ start, end, purpose, top] → 依分數排序的吉日與理由"""
+    try:
+        params = await request_params(request)
+    except ValueError as e:
+        return error_response(error_message(e))
+    result = await run_in_pool(request, auspicious_record, params)
+    return JSONResponse(result, status_code=400 if 'error' in result else 200)
+
+
+async def batch_endpoint(request):
+    """POST 紀錄陣列 → 依序回傳分析結果陣列，分 chunk 平行送入程序池"""
+    try:
+        records = await request.json()
+    except ValueError as e:
+        return error_response(error_message(e))
+    if not isinstance(records, list):
+        return error_response("請求內容需為 JSON 陣列")
+    if len(records) > MAX_BATCH_SIZE:
+        return error_response(f"單次最多 {MAX_BATCH_SIZE} 筆", status=413)
+    chunks = await asyncio.gather(*(run_in_pool(request, analyze_records, chunk) for chunk in chunked(records, BATCH_CHUNK_SIZE)))
+    return JSONResponse([result for chunk in chunks for result in chunk])
+
+
+def create_app(workers=None):
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        try:
+            yield
+        finally:
+            app.state.pool.shutdown(wait=True, cancel_futures=True)
+
+    return Starlette(
+        routes=[
+            Route('/chart', chart_endpoint, methods=['GET', 'POST']),
+            Route('/analysis', analysis_endpoint, methods=['GET', 'POST']),
+            Route('/summary', summary_endpoint, methods=['GET', 'POST']),
+            Route('/auspicious', auspicious_endpoint, methods=['GET', 'POST']),
+            Route('/batch', batch_endpoint, methods=['POST']),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_app(int(os.environ.get('BAZI_API_WORKERS', 0)) or None)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="八字分析 HTTP API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help="分析程序數 (預設為 CPU 核心數)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.workers), host=args.host, port=args.port)
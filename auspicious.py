@@ -0,0 +1,134 @@
+import argparse
+import datetime
+import json
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from bazi_core import Bazi, STEMS, BRANCHES, ELEMENTS_MAP, cached_analysis, get_ten_god
+from batch import record_pillars
+from matcher import branch_relations, stem_relations
+from solar_pillars import MIN_YEAR, MAX_YEAR, jiazi_name, pillar_indices_batch
+
+# --- 擇日 ---
+# 候選日的分數只取決於日柱，所以每個命盤只需對六十甲子各算一次分數與理由 (沿用 analyze_all_interactions 的干支關係表
+# 與 determine_pattern_and_yongshen 的喜用忌神)；掃描日期區間時以預算的逐日干支表查出日柱，再查表、排序。
+# 與命盤無關的日子本身吉凶 (日支沖月支為月破、沖年支為歲破) 由逐日干支表向量化計算後加總。
+
+STEM_SCORES = {'合': 6, '沖': -6}
+BRANCH_SCORES = {'六合': 8, '半合': 4, '沖': -10, '自刑': -4}
+POSITION_NAMES = ('年', '月', '日', '時')
+POSITION_WEIGHTS = (1, 1, 2, 1)  # 與日柱 (自身) 的關係加倍
+ELEMENT_ROLE_SCORES = {'用神': 12, '喜神': 8, '忌神': -10}
+# 用途 -> 日干對日主的十神加減分 (男, 女)；嫁娶看配偶星：男命正財、女命正官
+PURPOSE_TEN_GODS = {
+    '一般': ({}, {}),
+    '簽約': ({'正財': 8, '偏財': 5, '正官': 5, '食神': 3, '七殺': -5, '劫財': -8},) * 2,
+    '嫁娶': ({'正財': 10, '正官': 3, '比肩': -5, '劫財': -10}, {'正官': 10, '正財': 3, '七殺': -5, '傷官': -10}),
+}
+MONTH_BREAK_SCORE = -15
+YEAR_BREAK_SCORE = -10
+BRANCH_CLASH = np.array([[any(kind == '沖' for kind, _ in branch_relations(a, b)) for b in BRANCHES] for a in BRANCHES])
+FIRST_DAY = datetime.date(MIN_YEAR, 1, 1)
+LAST_DAY = datetime.date(MAX_YEAR, 12, 31)
+
+DAY_TABLE = None
+
+
+def day_table():
+    """1900-2100 逐日的 (年柱, 月柱, 日柱) 六十甲子序號 (取正午)，首次使用時建立一次"""
+    global DAY_TABLE
+    if DAY_TABLE is None:
+        days = np.arange(np.datetime64(FIRST_DAY), np.datetime64(LAST_DAY) + 1)
+        DAY_TABLE = pillar_indices_batch(days + np.timedelta64(12, 'h'))[:, :3].astype(np.int8)
+    return DAY_TABLE
+
+
+@lru_cache(maxsize=1024)
+def jiazi_scores(pillars, gender, purpose):
+    """命盤對六十甲子日的分數 (60,) 與理由 [(說明, 分數)]"""
+    bazi = Bazi(*pillars, gender)
+    pattern = cached_analysis(*pillars, gender)['pattern']
+    roles = {e: '忌神' for e in pattern['ji_shen']}
+    roles.update({pattern['xi_shen']: '喜神', pattern['yong_shen']: '用神'})
+    ten_god_scores = PURPOSE_TEN_GODS[purpose][bazi.gender_code]
+    scores = np.zeros(60, dtype=np.int32)
+    reasons = []
+    for jz in range(60):
+        stem, branch = STEMS[jz % 10], BRANCHES[jz % 12]
+        found = []
+        for pos in range(4):
+            for kind, name in stem_relations(stem, bazi.stems[pos]):
+                found.append((f"{POSITION_NAMES[pos]}干 {name}", STEM_SCORES[kind] * POSITION_WEIGHTS[pos]))
+            for kind, name in branch_relations(branch, bazi.branches[pos]):
+                found.append((f"{POSITION_NAMES[pos]}支 {name}", BRANCH_SCORES[kind] * POSITION_WEIGHTS[pos]))
+        for label, char in (('天干', stem), ('地支', branch)):
+            role = roles.get(ELEMENTS_MAP[char])
+            if role:
+                found.append((f"{label}{char}屬{ELEMENTS_MAP[char]}，為{role}", ELEMENT_ROLE_SCORES[role]))
+        ten_god = get_ten_god(bazi.stems[2], stem)
+        if ten_god in ten_god_scores:
+            found.append((f"{ten_god}日 ({purpose})", ten_god_scores[ten_god]))
+        scores[jz] = sum(points for _, points in found)
+        reasons.append(tuple(found))
+    return scores, tuple(reasons)
+
+
+def search_days(bazi, start, end, purpose='一般', top=10):
+    """[start, end] 內對 bazi 最有利的 top 個日子，依分數由高到低 (同分取較早的日子)"""
+    if purpose not in PURPOSE_TEN_GODS:
+        raise ValueError(f"未知的用途：{purpose} (可用：{'、'.join(PURPOSE_TEN_GODS)})")
+    if top < 1:
+        raise ValueError(f"top 需為正整數：{top}")
+    if not FIRST_DAY <= start <= end <= LAST_DAY:
+        raise ValueError(f"日期區間需在 {FIRST_DAY} ~ {LAST_DAY} 之內且起日不晚於迄日")
+    scores, reasons = jiazi_scores(tuple(bazi.pillars), bazi.gender, purpose)
+    first = (start - FIRST_DAY).days
+    table = day_table()[first:(end - FIRST_DAY).days + 1]
+    day_b = table[:, 2] % 12
+    month_break = BRANCH_CLASH[day_b, table[:, 1] % 12]
+    year_break = BRANCH_CLASH[day_b, table[:, 0] % 12]
+    day_scores = scores[table[:, 2]] + MONTH_BREAK_SCORE * month_break + YEAR_BREAK_SCORE * year_break
+    if top < len(day_scores):
+        # 先取分數最高的 top 個 (含同分)，再於其中依 (分數, 日期) 排序
+        cutoff = np.partition(day_scores, len(day_scores) - top)[len(day_scores) - top]
+        candidates = np.flatnonzero(day_scores >= cutoff)
+    else:
+        candidates = np.arange(len(day_scores))
+    ranked = candidates[np.argsort(-day_scores[candidates], kind='stable')][:top]
+
+    def day_reasons(i):
+        found = list(reasons[table[i, 2]])
+        if month_break[i]:
+            found.append((f"月破 (日支沖月支{BRANCHES[table[i, 1] % 12]})", MONTH_BREAK_SCORE))
+        if year_break[i]:
+            found.append((f"歲破 (日支沖年支{BRANCHES[table[i, 0] % 12]})", YEAR_BREAK_SCORE))
+        return [f"{text} ({points:+d})" for text, points in found]
+
+    return [{
+        'date': (start + datetime.timedelta(days=i)).isoformat(),
+        'pillar': jiazi_name(int(table[i, 2])),
+        'month_pillar': jiazi_name(int(table[i, 1])),
+        'year_pillar': jiazi_name(int(table[i, 0])),
+        'score': int(day_scores[i]),
+        'reasons': day_reasons(i),
+    } for i in ranked.tolist()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="擇日：依命盤在日期區間內找出最有利的日子")
+    parser.add_argument('--datetime', help="出生時刻 (ISO 8601)")
+    parser.add_argument('--pillars', help="四柱，以逗號分隔")
+    parser.add_argument('--gender', default='男')
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date.today())
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=None, help="預設為起日後一年")
+    parser.add_argument('--purpose', choices=list(PURPOSE_TEN_GODS), default='一般')
+    parser.add_argument('-n', '--top', type=int, default=10)
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    bazi = Bazi(*record_pillars({'datetime': args.datetime, 'pillars': args.pillars}), args.gender)
+    end = args.end or args.start + datetime.timedelta(days=365)
+    for day in search_days(bazi, args.start, end, args.purpose, args.top):
+        print(json.dumps(day, ensure_ascii=False))
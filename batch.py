@@ -0,0 +1,91 @@
+import datetime
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from bazi_core import Bazi, analyze_bazi
+from solar_pillars import solar_to_pillars
+
+# --- 批次分析 (程序池) ---
+# 紀錄以 chunksize 為單位打包送入工作程序，每個 chunk 只做一次 IPC；
+# 同時在途的 chunk 數量有上限，輸入可以是任意長度的串流，記憶體用量維持固定。
+
+
+def to_bazi_args(record):
+    """紀錄轉為 (Bazi, birth_date)：接受 Bazi、(年, 月, 日, 時, 性別[, 出生日期]) 或含同名鍵的 dict"""
+    if isinstance(record, Bazi):
+        return record, None
+    if isinstance(record, dict):
+        return Bazi(record['year'], record['month'], record['day'], record['hour'], record['gender']), record.get('birth_date')
+    return Bazi(*record[:5]), (record[5] if len(record) > 5 else None)
+
+
+def record_pillars(record):
+    """外部紀錄 (JSON / CSV 列) 轉為四柱：接受 pillars (列表或以逗號、空白分隔)、datetime (ISO 8601)，或 date 加 time / hour 欄位"""
+    if not isinstance(record, dict):
+        raise TypeError("紀錄需為物件")
+    pillars = record.get('pillars')
+    if pillars:
+        if isinstance(pillars, str):
+            pillars = re.split(r'[,\s]+', pillars.strip())
+        if len(pillars) != 4:
+            raise ValueError("pillars 需為四柱")
+        return list(pillars)
+    dt = record_datetime(record)
+    return list(solar_to_pillars(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second))
+
+
+def record_datetime(record):
+    """紀錄的出生時刻：datetime (ISO 8601)，或 date 加 time / hour 欄位"""
+    if record.get('datetime'):
+        return datetime.datetime.fromisoformat(record['datetime'])
+    dt = datetime.datetime.fromisoformat(record['date'])
+    if record.get('time'):
+        return datetime.datetime.combine(dt.date(), datetime.time.fromisoformat(record['time']))
+    if record.get('hour') not in (None, ''):
+        return dt.replace(hour=int(record['hour']))
+    return dt
+
+
+def analyze_chunk(records):
+    """在工作程序中分析一批紀錄"""
+    return [analyze_bazi(*to_bazi_args(r)) for r in records]
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def map_chunks(func, records, workers=None, chunksize=256, max_tasks_per_child=None):
+    """以程序池對每個 chunk 執行 func (須回傳列表)，依輸入順序逐筆產出結果；
+    max_tasks_per_child 設定時每個工作程序處理該數量的 chunk 後換新程序，釋放累積的記憶體"""
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(records, chunksize)
+    if workers == 1:
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=max_tasks_per_child)
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def analyze_many(records, workers=None, chunksize=256):
+    """批次執行完整分析鏈 (analyze_bazi)，依輸入順序逐筆產出結構化結果；workers=1 時不啟動程序池"""
+    return map_chunks(analyze_chunk, records, workers=workers, chunksize=chunksize)
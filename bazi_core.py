@@ -0,0 +1,1712 @@
+import datetime
+import string
+import struct
+from functools import lru_cache, wraps
+
+from timing import timed
+
+# --- 1. 基礎資料定義 (全域變數最優先初始化，防止 NameError) ---
+BRANCHES = ['子', '丑', '寅', '卯', '辰', '巳', '午', '未', '申', '酉', '戌', '亥']
+STEMS = ['甲', '乙', '丙', '丁', '戊', '己', '庚', '辛', '壬', '癸']
+FIVE_ELEMENTS = ['木', '火', '土', '金', '水']
+
+ELEMENTS_MAP = {
+    '甲': '木', '乙': '木', '丙': '火', '丁': '火', '戊': '土', '己': '土', '庚': '金', '辛': '金', '壬': '水', '癸': '水',
+    '寅': '木', '卯': '木', '巳': '火', '午': '火', '申': '金', '酉': '金', '亥': '水', '子': '水',
+    '辰': '土', '戌': '土', '丑': '土', '未': '土'
+}
+
+STEM_PROPS = {
+    '甲': {'element': '木', 'polarity': '陽'}, '乙': {'element': '木', 'polarity': '陰'},
+    '丙': {'element': '火', 'polarity': '陽'}, '丁': {'element': '火', 'polarity': '陰'},
+    '戊': {'element': '土', 'polarity': '陽'}, '己': {'element': '土', 'polarity': '陰'},
+    '庚': {'element': '金', 'polarity': '陽'}, '辛': {'element': '金', 'polarity': '陰'},
+    '壬': {'element': '水', 'polarity': '陽'}, '癸': {'element': '水', 'polarity': '陰'}
+}
+
+NAYIN_DATA = {
+    "甲子": "海中金", "乙丑": "海中金", "丙寅": "爐中火", "丁卯": "爐中火", "戊辰": "大林木", "己巳": "大林木",
+    "庚午": "路旁土", "辛未": "路旁土", "壬申": "劍鋒金", "癸酉": "劍鋒金", "甲戌": "山頭火", "乙亥": "山頭火",
+    "丙子": "澗下水", "丁丑": "澗下水", "戊寅": "城頭土", "己卯": "城頭土", "庚辰": "白蠟金", "辛巳": "白蠟金",
+    "壬午": "楊柳木", "癸未": "楊柳木", "甲申": "泉中水", "乙酉": "泉中水", "丙戌": "屋上土", "丁亥": "屋上土",
+    "戊子": "霹靂火", "己丑": "霹靂火", "庚寅": "松柏木", "辛卯": "松柏木", "壬辰": "長流水", "癸巳": "長流水",
+    "甲午": "砂中金", "乙未": "砂中金", "丙申": "山下火", "丁酉": "山下火", "戊戌": "平地木", "己亥": "平地木",
+    "庚子": "壁上土", "辛丑": "壁上土", "壬寅": "金箔金", "癸卯": "金箔金", "甲辰": "佛燈火", "乙巳": "佛燈火",
+    "丙午": "天河水", "丁未": "天河水", "戊申": "大驛土", "己酉": "大驛土", "庚戌": "釵釧金", "辛亥": "釵釧金",
+    "壬子": "桑柘木", "癸丑": "桑柘木", "甲寅": "大溪水", "乙卯": "大溪水", "丙辰": "沙中土", "丁巳": "沙中土",
+    "戊午": "天上火", "己未": "天上火", "庚申": "石榴木", "辛酉": "石榴木", "壬戌": "大海水", "癸亥": "大海水"
+}
+
+HIDDEN_STEMS_DATA = {
+    '子': [('癸', 100)], '丑': [('己', 60), ('癸', 30), ('辛', 10)],
+    '寅': [('甲', 60), ('丙', 30), ('戊', 10)], '卯': [('乙', 100)],
+    '辰': [('戊', 60), ('乙', 30), ('癸', 10)], '巳': [('丙', 60), ('庚', 30), ('戊', 10)],
+    '午': [('丁', 70), ('己', 30)], '未': [('己', 60), ('丁', 30), ('乙', 10)],
+    '申': [('庚', 60), ('壬', 30), ('戊', 10)], '酉': [('辛', 100)],
+    '戌': [('戊', 60), ('辛', 30), ('丁', 10)], '亥': [('壬', 70), ('甲', 30)]
+}
+
+# --- 神煞解析資料庫 (對應 Excel 內容) ---
+SHEN_SHA_INFO = {
+    '天乙貴人': {'feature': '命中最吉之神，代表高層次助力。', 'effect': '逢凶化吉，一生少病災，多得提拔。'},
+    '天德貴人': {'feature': '積善、德行、寬厚、化煞。', 'effect': '減輕凶性，遇難呈祥，化解意外。'},
+    '月德貴人': {'feature': '柔和、吉祥、長壽、處世無憂。', 'effect': '與天德並稱「二德」，主一生平安。'},
+    '太極貴人': {'feature': '專注精神、直覺、研究心、宗教緣。', 'effect': '有神祕學、藝術天賦，晚景康泰。'},
+    '文昌貴人': {'feature': '聰明才智、文筆、名氣、領悟力。', 'effect': '利求學考試、文書工作，利於成名。'},
+    '國印貴人': {'feature': '正直忠厚、按部就班、權力象徵。', 'effect': '利於公職、公務員，代表官運與誠信。'},
+    '學堂': {'feature': '智慧、書香、儒雅、金榜題名。', 'effect': '學習能力強，代表有學位與高學歷。'},
+    '詞館': {'feature': '口才、辭章、聲望、交際。', 'effect': '文章蓋世，在文壇或社交界享有盛譽。'},
+    '祿神': {'feature': '衣食、俸祿、事業基礎、身體根基。', 'effect': '主財祿豐盈，身弱者可增強氣勢。'},
+    '驛馬': {'feature': '動力、變動、出國、升遷、不安現狀。', 'effect': '主遷徙轉職，動中求財，效率高。'},
+    '桃花': {'feature': '魅力、社交、異性緣、審美。', 'effect': '利於人際公關，過多則招感情煩惱。'},
+    '紅鸞': {'feature': '婚姻、喜事、浪漫、性格開朗。', 'effect': '主早婚、情緣美滿，一生喜氣多。'},
+    '咸池': {'feature': '個人的魅力與才華，也與情感波動密切。', 'effect': '賦予命主極佳的「觀眾緣」與人際吸引力，或表現為情感不專一、容易衝動行事，或因男女感情問題而導致財產或名譽受損。'},
+    '天喜': {'feature': '喜慶、生育、家庭、歡樂。', 'effect': '帶來偏財喜事，利於懷孕與添丁。'},
+    '羊刃': {'feature': '剛烈、勇猛、競爭、爭奪。', 'effect': '身弱者助身，身強者易傷身破財。'},
+    '劫煞': {'feature': '徒勞、波折、損失、外傷。', 'effect': '處理事務多阻礙，容易因意外損財。'},
+    '災煞': {'feature': '衝撞、牢獄、血光、不測。', 'effect': '多主凶險、官非，代表不穩定因素。'},
+    '空亡': {'feature': '虛幻、不實、落空、能量減半。', 'effect': '吉神遇空不吉，凶神遇空不凶。'},
+    '福星貴人': {'feature': '安泰、平穩、知足、多福氣。', 'effect': '一生衣食無慮，不求大富但求心安。'},
+    '天廚貴人': {'feature': '口福、福壽、經濟寬裕。', 'effect': '有食神之祿，代表富裕且懂得生活。'},
+    '德秀貴人': {'feature': '品學兼優、人中龍鳳、化戾氣。', 'effect': '為人清高，易得好名聲，遠離凶災。'},
+    '天醫': {'feature': '醫藥、養生、哲學、康復力。', 'effect': '利醫療行業、心理學，能逢醫必治。'},
+    '正詞館': {'feature': '學識正統、權威、名聲。', 'effect': '利官職提升，文書有權。'},
+    '正學堂': {'feature': '學問純粹、正途功名。', 'effect': '主科甲之名，利於正當學術成就。'},
+    '月德合': {'feature': '和諧、穩定、貴人扶助。', 'effect': '強化月德吉祥，化解人際矛盾。'},
+    '天德合': {'feature': '輔助天德、增吉減凶。', 'effect': '化解災禍的力量倍增。'},
+    '三奇貴人': {'feature': '卓越、特立獨行、成就非凡。', 'effect': '思想超前，多為奇才或傳奇人物。'},
+    '將星': {'feature': '統帥能力、決斷力、威嚴。', 'effect': '代表職權、管理職，能得眾人服從。'},
+    '華蓋': {'feature': '藝術、宗教、孤獨、思想深度。', 'effect': '有才藝但清高，喜靜、好學佛道。'},
+    '魁罡': {'feature': '剛毅、果敢、威權、嫉惡如仇。', 'effect': '成功與失敗皆劇烈，事業心強。'},
+    '飛刃': {'feature': '意外受傷、破財、爭執。', 'effect': '注意血光意外或刀傷手術。'},
+    '血刃': {'feature': '病災、手術、流血、意外。', 'effect': '應注意身體健康，易有血光之險。'},
+    '勾絞煞': {'feature': '羈絆、口舌、糾纏、不順。', 'effect': '處理事情易藕斷絲連，主紛爭官司。'},
+    '元辰': {'feature': '思緒混亂、耗神、損財、形貌。', 'effect': '代表消耗與不安，流年遇之多阻滯。'},
+    '孤辰': {'feature': '孤獨、男忌、性格內向。', 'effect': '主性格孤僻，利於獨立作業與思考。'},
+    '寡宿': {'feature': '寡居、女忌、情感波折。', 'effect': '心理壓力較大，婚姻感較疏離。'},
+    '紅艷煞': {'feature': '浪漫、多情、色慾、藝術感。', 'effect': '增加魅力，但需防感情生活混亂。'},
+    '亡神': {'feature': '城府深、計謀、心理壓力。', 'effect': '處理得當為奇策，不得當為官非。'},
+    '金輿': {'feature': '貴氣、代步工具、配偶相助。', 'effect': '出入平安，利於經濟提升，代表富貴。'},
+    '金神': {'feature': '威武、剛強、不屈不撓。', 'effect': '遇火制則能發貴，代表武職威望。'},
+    '天赦日': {'feature': '寬免、赦罪、轉危為安。', 'effect': '能化解官災刑罰，一生多平安。'},
+    '流霞': {'feature': '產危、出血、手術、意外。', 'effect': '女命主產厄，男命主意外傷災。'},
+    '喪門': {'feature': '哀傷、喪事、哭泣、情緒低。', 'effect': '流年遇之需注意長輩健康。'},
+    '弔客': {'feature': '探病、弔喪、悲傷感。', 'effect': '影響心情，主親友間的憂慮之事。'},
+    '披麻': {'feature': '孝服、家庭憂患、喪服。', 'effect': '主家庭成員的健康問題與哀戚。'},
+    '童子煞': {'feature': '婚姻晚成、體弱、靈異感。', 'effect': '感覺敏銳，多有神秘緣分，婚遲。'},
+    '十靈日': {'feature': '直覺力、通靈感、智慧高。', 'effect': '聰明有預知力，利從事神祕學研究。'},
+    '八專日': {'feature': '專業領域、技術、自信。', 'effect': '在特定領域能成為權威，但性格強勢。'},
+    '六秀日': {'feature': '容貌俊美、聰明、才藝。', 'effect': '主人聰明且外型出眾，人緣好。'},
+    '九醜日': {'feature': '名譽受損、感情糾葛。', 'effect': '容易發生桃色新聞，影響個人聲譽。'},
+    '四廢日': {'feature': '意志消沉、做事費力、半途而廢。', 'effect': '主精力不足，創業不易，宜守舊。'},
+    '十惡大敗': {'feature': '財富難守、祖業破敗。', 'effect': '不善理財，花錢無度，忌與人合夥。'},
+    '天羅': {'feature': '困頓、束縛、官司、阻礙。', 'effect': '多主生活艱辛或法律糾紛，宜沉穩。'},
+    '地網': {'feature': '困頓、束縛、官司、阻礙。', 'effect': '多主生活艱辛或法律糾紛，宜沉穩。'},
+    '陰差陽錯': {'feature': '婚姻阻滯、夫妻不睦。', 'effect': '容易與配偶家產生隔閡，婚姻需多磨。'},
+    '孤鸞煞': {'feature': '婚姻孤寂、剋配偶、二婚。', 'effect': '主情感生活不美滿，有孤獨感。'},
+    '拱祿': {'feature': '暗祿、富貴、官職、擁護。', 'effect': '雖不顯露但有暗財，得人尊敬支持。'}
+}
+STEM_INDEX = {s: i for i, s in enumerate(STEMS)}
+BRANCH_INDEX = {b: i for i, b in enumerate(BRANCHES)}
+GENDERS = ['男', '女']  # 性別編碼：0 = 男，1 = 女
+BAZI_STRUCT = struct.Struct('<I')
+
+class Bazi:
+    """整數編碼的八字：天干索引 (0-9)、地支索引 (0-11)、性別編碼；字串屬性於首次存取時才產生。
+    key 為 32 位元命盤鍵：四柱各以 天干 * 12 + 地支 佔 7 位元 (年柱在最高位)，最低位為性別。"""
+    __slots__ = ('stem_idx', 'branch_idx', 'gender_code', '_stems', '_branches', '_pillars')
+
+    def __init__(self, year, month, day, hour, gender):
+        pillars = (year, month, day, hour)
+        if any(len(p) != 2 or p[0] not in STEM_INDEX or p[1] not in BRANCH_INDEX for p in pillars) or gender not in GENDERS:
+            raise ValueError(f"無效的八字：{pillars} {gender}")
+        self.stem_idx = tuple(STEM_INDEX[p[0]] for p in pillars)
+        self.branch_idx = tuple(BRANCH_INDEX[p[1]] for p in pillars)
+        self.gender_code = GENDERS.index(gender)
+        self._stems = self._branches = self._pillars = None
+
+    @classmethod
+    def from_indices(cls, stems, branches, gender_code):
+        """由 (年, 月, 日, 時) 天干與地支索引建立，不經字串轉換"""
+        bazi = cls.__new__(cls)
+        bazi.stem_idx = tuple(stems)
+        bazi.branch_idx = tuple(branches)
+        bazi.gender_code = gender_code
+        bazi._stems = bazi._branches = bazi._pillars = None
+        return bazi
+
+    @classmethod
+    def from_key(cls, key):
+        codes = [(key >> shift) & 0x7F for shift in (22, 15, 8, 1)]
+        return cls.from_indices([c // 12 for c in codes], [c % 12 for c in codes], key & 1)
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls.from_key(BAZI_STRUCT.unpack(data)[0])
+
+    @property
+    def key(self):
+        s, b = self.stem_idx, self.branch_idx
+        return ((((s[0] * 12 + b[0]) << 7 | s[1] * 12 + b[1]) << 7 | s[2] * 12 + b[2]) << 7 | s[3] * 12 + b[3]) << 1 | self.gender_code
+
+    def to_bytes(self):
+        return BAZI_STRUCT.pack(self.key)
+
+    @property
+    def stems(self):
+        if self._stems is None:
+            self._stems = [STEMS[i] for i in self.stem_idx]
+        return self._stems
+
+    @property
+    def branches(self):
+        if self._branches is None:
+            self._branches = [BRANCHES[i] for i in self.branch_idx]
+        return self._branches
+
+    @property
+    def pillars(self):
+        if self._pillars is None:
+            self._pillars = [STEMS[s] + BRANCHES[b] for s, b in zip(self.stem_idx, self.branch_idx)]
+        return self._pillars
+
+    year = property(lambda self: self.pillars[0])
+    month = property(lambda self: self.pillars[1])
+    day = property(lambda self: self.pillars[2])
+    hour = property(lambda self: self.pillars[3])
+    gender = property(lambda self: GENDERS[self.gender_code])
+
+    def __eq__(self, other):
+        return isinstance(other, Bazi) and self.key == other.key
+
+    def __hash__(self):
+        return self.key
+
+    def __reduce__(self):
+        # 跨程序傳遞時只送 32 位元鍵
+        return (Bazi.from_key, (self.key,))
+
+    def __repr__(self):
+        return f"Bazi(year={self.year!r}, month={self.month!r}, day={self.day!r}, hour={self.hour!r}, gender={self.gender!r})"
+
+# --- 2. 核心運算 ---
+
+# 十神整數編碼：關係 (同我、我生、我剋、剋我、生我) * 2 + (同性 0 / 異性 1)
+TEN_GODS = ['比肩', '劫財', '食神', '傷官', '偏財', '正財', '七殺', '正官', '偏印', '正印']
+
+# 10x10 十神表 (日主索引, 目標天干索引)，天干索引 // 2 為五行 (木火土金水)，% 2 為陰陽
+TEN_GOD_TABLE = tuple(
+    tuple(((t // 2 - m // 2) % 5) * 2 + (m + t) % 2 for t in range(10))
+    for m in range(10)
+)
+
+def ten_god_idx(me, target):
+    """以天干索引查十神編碼 (0-9，對應 TEN_GODS)"""
+    return TEN_GOD_TABLE[me][target]
+
+def get_ten_god(me_stem, target_stem):
+    if not me_stem or not target_stem: return ""
+    return TEN_GODS[TEN_GOD_TABLE[STEM_INDEX[me_stem]][STEM_INDEX[target_stem]]]
+
+def get_nayin_element(pillar):
+    full = NAYIN_DATA.get(pillar, "   ")
+    return full[-1] if len(full) >= 3 else ""
+
+def get_xun_kong(pillar):
+    s_idx = STEMS.index(pillar[0])
+    b_idx = BRANCHES.index(pillar[1])
+    diff = (b_idx - s_idx) % 12
+    return [BRANCHES[(diff - 2) % 12], BRANCHES[(diff - 1) % 12]]
+
+# --- 3. 神煞引擎 ---
+# 規則於載入時編譯為索引查表：每柱只需數次查表與位元 OR，結果為 64 位元遮罩，名稱按需解碼。
+
+TY_MAP = {'甲':['丑','未'],'戊':['丑','未'],'庚':['丑','未'],'乙':['子','申'],'己':['子','申'],'丙':['亥','酉'],'丁':['亥','酉'],'壬':['卯','巳'],'癸':['卯','巳'],'辛':['午','寅']}
+TD_MAP = {'寅':'丁','卯':'申','辰':'壬','巳':'辛','午':'亥','未':'甲','申':'癸','酉':'寅','戌':'丙','亥':'乙','子':'巳','丑':'庚'}
+YD_MAP = {'寅':'丙','午':'丙','戌':'丙','申':'壬','子':'壬','辰':'壬','亥':'甲','卯':'甲','未':'甲','巳':'庚','酉':'庚','丑':'庚'}
+TJ_MAP = {'甲':['子','午'],'乙':['子','午'],'丙':['卯','酉'],'丁':['卯','酉'],'戊':['辰','戌','丑','未'],'己':['辰','戌','丑','未'],'庚':['寅','亥'],'辛':['寅','亥'],'壬':['巳','申'],'癸':['巳','申']}
+WC_MAP = {'甲':'巳','乙':'午','丙':'申','丁':'酉','戊':'申','己':'酉','庚':'亥','辛':'子','壬':'寅','癸':'卯'}
+GY_MAP = {'甲':'戌','乙':'亥','丙':'丑','丁':'寅','戊':'丑','己':'寅','庚':'辰','辛':'巳','壬':'未','癸':'申'}
+XT_MAP = {'金':'巳','木':'亥','水':'申','火':'寅','土':'申'}
+CG_MAP = {'甲':'庚寅','乙':'乙巳','丙':'乙巳','丁':'庚寅','戊':'丁巳','己':'庚申','庚':'壬申','辛':'壬子','壬':'壬寅','癸':'癸巳'}
+LU_MAP = {'甲':'寅','乙':'卯','丙':'巳','丁':'午','戊':'巳','己':'午','庚':'申','辛':'酉','壬':'亥','癸':'子'}
+YR_MAP = {'甲':'卯','乙':'寅','丙':'午','丁':'巳','戊':'午','己':'巳','庚':'酉','辛':'申','壬':'子','癸':'亥'}
+CLASH_MAP = {'子':'午','午':'子','丑':'未','未':'丑','寅':'申','申':'寅','卯':'酉','酉':'卯','辰':'戌','戌':'辰','巳':'亥','亥':'巳'}
+# 三合局 -> (驛馬, 咸池, 將星) / (劫煞, 災煞, 亡神)
+STAR_MAP = {('申','子','辰'): ('寅','酉','子'), ('寅','午','戌'): ('申','卯','午'), ('巳','酉','丑'): ('亥','午','酉'), ('亥','卯','未'): ('巳','子','卯')}
+JIE_SHA_MAP = {('申','子','辰'): ('巳','午','亥'), ('寅','午','戌'): ('亥','子','巳'), ('巳','酉','丑'): ('寅','卯','申'), ('亥','卯','未'): ('申','酉','寅')}
+HG_MAP = {'寅':'戌', '午':'戌', '戌':'戌', '巳':'丑', '酉':'丑', '丑':'丑', '申':'辰', '子':'辰', '辰':'辰', '亥':'未', '卯':'未', '未':'未'}
+HL_MAP = {'子':'卯','丑':'寅','寅':'丑','卯':'子','辰':'亥','巳':'戌','午':'酉','未':'申','申':'未','酉':'午','戌':'巳','亥':'辰'}
+TX_MAP = {'子':'酉','丑':'申','寅':'未','卯':'午','辰':'巳','巳':'辰','午':'卯','未':'寅','申':'丑','酉':'子','戌':'亥','亥':'戌'}
+FX_MAP = {'甲':['寅','子'],'丙':['寅','子'],'乙':['亥','丑'],'丁':['亥','丑'],'戊':'申','己':'未','庚':'午','辛':'巳','壬':'辰','癸':'卯'}
+TC_MAP = {'丙':'巳', '丁':'午', '戊':'申', '己':'酉', '庚':'亥', '辛':'子', '壬':'寅', '癸':'卯'}
+DX_RULES = [(['寅','午','戌'], ['丙','丁','戊','癸']), (['申','子','辰'], ['壬','癸','戊','己']), (['申','子','辰'], ['丙','辛','甲','乙']),
+            (['巳','酉','丑'], ['庚','辛','乙']), (['亥','卯','未'], ['甲','乙','丁','壬'])]
+# 血刃口訣：寅月丑，卯月未，辰月寅，巳月申，午月卯，未月酉，申月辰，酉月戌，戌月巳，亥月亥，子月午，丑月子
+XR_MAP = {'寅':'丑', '卯':'未', '辰':'寅', '巳':'申', '午':'卯', '未':'酉', '申':'辰', '酉':'戌', '戌':'巳', '亥':'亥', '子':'午', '丑':'子'}
+YDH_MAP = {'寅': '辛', '午': '辛', '戌': '辛', '申': '丁', '子': '丁', '辰': '丁', '巳': '乙', '酉': '乙', '丑': '乙', '亥': '己', '卯': '己', '未': '己'}
+TDH_MAP = {'寅': '壬', '卯': '巳', '辰': '丁', '巳': '丙', '午': '寅', '未': '己', '申': '戊', '酉': '亥', '戌': '辛', '亥': '庚', '子': '申', '丑': '乙'}
+SAN_QI = ["甲戊庚", "乙丙丁", "壬癸辛"]
+HY_MAP = {'甲':'午','乙':'午','丙':'寅','丁':'未','戊':'辰','己':'辰','庚':'戌','辛':'酉','壬':'子','癸':'申'}
+LX_MAP = {'甲':'酉','乙':'戌','丙':'未','丁':'申','戊':'巳','己':'午','庚':'午','辛':'卯','壬':'亥','癸':'子'}
+YC_MAP = {'子':'未','丑':'申','寅':'酉','卯':'戌','辰':'亥','巳':'子','午':'丑','未':'寅','申':'卯','酉':'辰','戌':'巳','亥':'午'}
+# 日柱專屬神煞
+DAY_PILLAR_SETS = {
+    "魁罡": ['壬辰','庚戌','庚辰','戊戌'],
+    "十靈日": ['甲辰','乙亥','丙辰','丁酉','庚戌','庚寅','癸未','癸亥','辛亥','壬寅'],
+    "八專日": ['甲寅','乙卯','己未','丁未','庚申','辛酉','戊戌','癸丑'],
+    "六秀日": ['丙午','丁未','戊子','戊午','己丑','己未'],
+    "九醜日": ['乙卯','乙酉','己卯','己酉','辛卯','辛酉','壬子','壬午','戊子'],
+    "十惡大敗": ['甲辰','乙巳','丙申','丁亥','戊戌','己丑','庚辰','辛巳','壬申','癸亥'],
+    "陰差陽錯": ['丙子','丁丑','戊寅','辛卯','壬辰','癸巳','丙午','丁未','戊申','辛酉','壬戌','癸亥'],
+    "孤鸞煞": ['乙巳','丁巳','辛亥','丙午','戊午','甲子'],
+}
+# 季節 (月支) -> 四廢日 / 天赦日
+SI_FEI_MAP = {('寅','卯','辰'): ['庚申','辛酉'], ('巳','午','未'): ['壬子','癸亥'], ('申','酉','戌'): ['甲寅','乙卯'], ('亥','子','丑'): ['丙午','丁未']}
+TIAN_SHE_MAP = {('寅','卯','辰'): '戊寅', ('巳','午','未'): '甲午', ('申','酉','戌'): '戊申', ('亥','子','丑'): '甲子'}
+GONG_LU_MAP = {('癸亥','癸丑'): "拱祿(子)", ('癸丑','癸亥'): "拱祿(子)", ('丁巳','丁未'): "拱祿(午)", ('丁未','丁巳'): "拱祿(午)",
+               ('戊辰','戊午'): "拱祿(巳)", ('戊午','戊辰'): "拱祿(巳)"}
+
+SHEN_SHA_NAMES = sorted([
+    "天乙貴人", "天德貴人", "月德貴人", "太極貴人", "文昌貴人", "國印貴人", "學堂", "正學堂", "詞館", "正詞館",
+    "祿神", "羊刃", "飛刃", "驛馬", "咸池", "將星", "華蓋", "紅鸞", "天喜", "劫煞", "災煞", "亡神",
+    "福星貴人", "天廚貴人", "空亡", "德秀貴人", "天醫", "血刃", "月德合", "天德合", "三奇貴人", "魁罡",
+    "紅艷煞", "金輿", "流霞", "勾絞煞", "元辰", "孤辰", "寡宿", "喪門", "弔客", "披麻", "童子煞",
+    "十靈日", "八專日", "六秀日", "九醜日", "四廢日", "十惡大敗", "陰差陽錯", "孤鸞煞", "天赦日",
+    "天羅", "地網", "拱祿(子)", "拱祿(午)", "拱祿(巳)",
+])
+# 位元順序即名稱排序順序，由低位解碼即得排序後的列表
+SHEN_SHA_BIT = {name: 1 << i for i, name in enumerate(SHEN_SHA_NAMES)}
+
+def rules_by_year_pillar(y_p, t_b):
+    """以年柱為基準、只看目標地支的神煞"""
+    y_s, y_b = y_p[0], y_p[1]
+    found = []
+    if t_b in TY_MAP.get(y_s, []): found.append("天乙貴人")
+    if t_b in TJ_MAP.get(y_s, []): found.append("太極貴人")
+    if t_b == WC_MAP.get(y_s): found.append("文昌貴人")
+    if t_b == GY_MAP.get(y_s): found.append("國印貴人")
+    if t_b in FX_MAP.get(y_s, []): found.append("福星貴人")
+    if t_b == TC_MAP.get(y_s): found.append("天廚貴人")
+    for group, (yi_ma, xian_chi, jiang_xing) in STAR_MAP.items():
+        if y_b in group:
+            if t_b == yi_ma: found.append("驛馬")
+            if t_b == xian_chi: found.append("咸池")
+            if t_b == jiang_xing: found.append("將星")
+    if t_b == HL_MAP.get(y_b): found.append("紅鸞")
+    if t_b == TX_MAP.get(y_b): found.append("天喜")
+    for group, (jie, zai, wang) in JIE_SHA_MAP.items():
+        if y_b in group:
+            if t_b == jie: found.append("劫煞")
+            if t_b == zai: found.append("災煞")
+            if t_b == wang: found.append("亡神")
+    if t_b in get_xun_kong(y_p): found.append("空亡")
+    y_idx = BRANCHES.index(y_b)
+    if t_b == BRANCHES[(y_idx+3)%12] or t_b == BRANCHES[(y_idx-3)%12]: found.append("勾絞煞")
+    if t_b == YC_MAP.get(y_b): found.append("元辰")
+    if y_b in ['寅','卯','辰'] and t_b == '巳': found.append("孤辰")
+    if y_b in ['寅','卯','辰'] and t_b == '丑': found.append("寡宿")
+    if y_b in ['巳','午','未'] and t_b == '申': found.append("孤辰")
+    if y_b in ['巳','午','未'] and t_b == '辰': found.append("寡宿")
+    if t_b == BRANCHES[(y_idx+2)%12]: found.append("喪門")
+    if t_b == BRANCHES[(y_idx-2)%12]: found.append("弔客")
+    if t_b == BRANCHES[(y_idx+3)%12]: found.append("披麻")
+    # 童子煞 B. 納音/年干查法
+    y_nayin = NAYIN_DATA.get(y_p, "")
+    y_ele = y_nayin[-1] if y_nayin else ""
+    if (y_ele in ['金','木']) and t_b in ['午','卯']: found.append("童子煞")
+    if (y_ele in ['水','火']) and t_b in ['酉','戌']: found.append("童子煞")
+    if y_ele == '土' and t_b in ['辰','巳']: found.append("童子煞")
+    return found
+
+def rules_by_day_pillar(d_p, t_p):
+    """以日柱為基準、看目標干支的神煞"""
+    d_s, d_b = d_p[0], d_p[1]
+    t_s, t_b = t_p[0], t_p[1]
+    found = []
+    if t_b in TY_MAP.get(d_s, []): found.append("天乙貴人")
+    if t_b in TJ_MAP.get(d_s, []): found.append("太極貴人")
+    if t_b == WC_MAP.get(d_s): found.append("文昌貴人")
+    if t_b == GY_MAP.get(d_s): found.append("國印貴人")
+    if t_b == XT_MAP.get(get_nayin_element(d_p)):
+        found.append("學堂")
+        if get_ten_god(d_s, t_s) == "偏印": found.append("正學堂")
+    if t_p == CG_MAP.get(d_s):
+        found.append("詞館")
+        if get_ten_god(d_s, t_s) in ["正官", "正印"]: found.append("正詞館")
+    if t_b == LU_MAP.get(d_s): found.append("祿神")
+    if t_b == YR_MAP.get(d_s): found.append("羊刃")
+    if t_b == CLASH_MAP.get(YR_MAP.get(d_s)): found.append("飛刃")
+    for group, (yi_ma, xian_chi, jiang_xing) in STAR_MAP.items():
+        if d_b in group:
+            if t_b == yi_ma: found.append("驛馬")
+            if t_b == xian_chi: found.append("咸池")
+            if t_b == jiang_xing: found.append("將星")
+    if t_b in FX_MAP.get(d_s, []): found.append("福星貴人")
+    if t_b == TC_MAP.get(d_s): found.append("天廚貴人")
+    if t_b in get_xun_kong(d_p): found.append("空亡")
+    if t_b == HY_MAP.get(d_s): found.append("紅艷煞")
+    if t_b == BRANCHES[(BRANCHES.index(LU_MAP.get(d_s))+2)%12]: found.append("金輿")
+    if t_b == LX_MAP.get(d_s): found.append("流霞")
+    return found
+
+def rules_by_month_branch(m_b, t_p):
+    """以月支為基準、看目標干支的神煞"""
+    t_s, t_b = t_p[0], t_p[1]
+    found = []
+    if t_s == TD_MAP.get(m_b) or t_b == TD_MAP.get(m_b): found.append("天德貴人")
+    if t_s == YD_MAP.get(m_b): found.append("月德貴人")
+    if any(m_b in months and t_s in stems for months, stems in DX_RULES): found.append("德秀貴人")
+    if t_b == BRANCHES[(BRANCHES.index(m_b)-1)%12]: found.append("天醫")
+    if t_b == XR_MAP.get(m_b): found.append("血刃")
+    if t_s == YDH_MAP.get(m_b): found.append("月德合")
+    if t_s == TDH_MAP.get(m_b) or t_b == TDH_MAP.get(m_b): found.append("天德合")
+    # 童子煞 A. 季節查法 (以月支為主)
+    if m_b in ['寅','卯','辰','申','酉','戌'] and t_b in ['寅','子']: found.append("童子煞")
+    if m_b in ['巳','午','未','亥','子','丑'] and t_b in ['卯','未','辰']: found.append("童子煞")
+    return found
+
+def rules_for_day(m_b, d_p):
+    """日柱專屬神煞 (十靈、八專、六秀、九醜、四廢、十惡大敗、陰差陽錯、孤鸞、魁罡、天赦)"""
+    found = [name for name, pillars in DAY_PILLAR_SETS.items() if d_p in pillars]
+    for months, pillars in SI_FEI_MAP.items():
+        if m_b in months and d_p in pillars: found.append("四廢日")
+    for months, pillar in TIAN_SHE_MAP.items():
+        if m_b in months and d_p == pillar: found.append("天赦日")
+    return found
+
+def shen_sha_mask(names):
+    mask = 0
+    for name in names:
+        mask |= SHEN_SHA_BIT[name]
+    return mask
+
+# 干支以 天干索引 * 12 + 地支索引 編碼 (0-119，含不成對的組合，保證任意輸入皆可查表)
+GANZHI_120 = [s + b for s in STEMS for b in BRANCHES]
+GANZHI_INDEX = {p: i for i, p in enumerate(GANZHI_120)}
+SS_YEAR_TABLE = tuple(tuple(shen_sha_mask(rules_by_year_pillar(p, b)) for b in BRANCHES) for p in GANZHI_120)
+SS_DAY_TABLE = tuple(tuple(shen_sha_mask(rules_by_day_pillar(p, t)) for t in GANZHI_120) for p in GANZHI_120)
+SS_MONTH_TABLE = tuple(tuple(shen_sha_mask(rules_by_month_branch(m, t)) for t in GANZHI_120) for m in BRANCHES)
+SS_DAY_ONLY_TABLE = tuple(tuple(shen_sha_mask(rules_for_day(m, p)) for p in GANZHI_120) for m in BRANCHES)
+HG_INDEX = tuple(BRANCH_INDEX[HG_MAP[b]] for b in BRANCHES)
+# 天羅 (火命) / 地網 (水土命) 的年柱判定
+YEAR_FIRE_LIFE = tuple(get_nayin_element(p) == '火' or p[0] in ['丙', '丁'] for p in GANZHI_120)
+YEAR_WATER_EARTH_LIFE = tuple(get_nayin_element(p) in ['水', '土'] or p[0] in ['壬', '癸', '戊', '己'] for p in GANZHI_120)
+SAN_QI_INDEX = {tuple(STEM_INDEX[s] for s in combo) for combo in SAN_QI}
+GONG_LU_INDEX = {(STEM_INDEX[d[0]] * 12 + BRANCH_INDEX[d[1]], STEM_INDEX[h[0]] * 12 + BRANCH_INDEX[h[1]]): SHEN_SHA_BIT[name]
+                 for (d, h), name in GONG_LU_MAP.items()}
+XU_HAI = (1 << BRANCH_INDEX['戌']) | (1 << BRANCH_INDEX['亥'])
+CHEN_SI = (1 << BRANCH_INDEX['辰']) | (1 << BRANCH_INDEX['巳'])
+BIT_HUA_GAI, BIT_SAN_QI = SHEN_SHA_BIT["華蓋"], SHEN_SHA_BIT["三奇貴人"]
+BIT_TIAN_LUO, BIT_DI_WANG = SHEN_SHA_BIT["天羅"], SHEN_SHA_BIT["地網"]
+
+def shen_sha_masks(bazi):
+    """一次計算四柱神煞，回傳 (年, 月, 日, 時) 四個 64 位元遮罩"""
+    b = bazi.branch_idx
+    p = [s * 12 + x for s, x in zip(bazi.stem_idx, b)]
+    y_b, m_b, d_b = b[0], b[1], b[2]
+    row_y, row_d, row_m = SS_YEAR_TABLE[p[0]], SS_DAY_TABLE[p[2]], SS_MONTH_TABLE[m_b]
+    hg_y, hg_d = HG_INDEX[y_b], HG_INDEX[d_b]
+
+    common = BIT_SAN_QI if (p[0] // 12, p[1] // 12, p[2] // 12) in SAN_QI_INDEX else 0
+    b_set = (1 << y_b) | (1 << m_b) | (1 << d_b) | (1 << b[3])
+    luo = (b_set & XU_HAI == XU_HAI) and (YEAR_FIRE_LIFE[p[0]] or bazi.gender_code == 0)
+    wang = (b_set & CHEN_SI == CHEN_SI) and (YEAR_WATER_EARTH_LIFE[p[0]] or bazi.gender_code == 1)
+
+    masks = []
+    for i in range(4):
+        t_b, t_p = b[i], p[i]
+        m = row_y[t_b] | row_d[t_p] | row_m[t_p] | common
+        # 華蓋 (年日互查，排除自身)
+        if (i != 0 and t_b == hg_y) or (i != 2 and t_b == hg_d): m |= BIT_HUA_GAI
+        if luo and (XU_HAI >> t_b) & 1: m |= BIT_TIAN_LUO
+        if wang and (CHEN_SI >> t_b) & 1: m |= BIT_DI_WANG
+        masks.append(m)
+    masks[2] |= SS_DAY_ONLY_TABLE[m_b][p[2]]
+    masks[3] |= GONG_LU_INDEX.get((p[2], p[3]), 0)
+    return masks
+
+# 每 8 位元一張解碼表：SHEN_SHA_BYTE_NAMES[k][byte] 為該位元組對應的名稱 tuple
+SHEN_SHA_BYTE_NAMES = tuple(
+    tuple(tuple(SHEN_SHA_NAMES[k * 8 + j] for j in range(8) if (v >> j) & 1 and k * 8 + j < len(SHEN_SHA_NAMES)) for v in range(256))
+    for k in range(8)
+)
+
+def shen_sha_names(mask):
+    """將神煞遮罩解碼為排序後的名稱列表"""
+    names = []
+    k = 0
+    while mask:
+        byte = mask & 255
+        if byte: names.extend(SHEN_SHA_BYTE_NAMES[k][byte])
+        mask >>= 8
+        k += 1
+    return names
+
+def get_55_shen_sha(bazi, pillar_idx):
+    return shen_sha_names(shen_sha_masks(bazi)[pillar_idx])
+
+
+# --- 4. 五行旺衰分析引擎 ---
+
+# 年、月、日、時柱的天干與地支藏干計分權重
+ELEMENT_STEM_WEIGHTS = (8, 10, 12, 8)
+ELEMENT_BRANCH_WEIGHTS = (6, 10, 8, 6)
+
+def analyze_five_elements(bazi):
+    """計算五行強弱及分佈"""
+    element_scores = {'木': 0, '火': 0, '土': 0, '金': 0, '水': 0}
+
+    # 天干五行計分 (每個天干 10 分)
+    for i, stem in enumerate(bazi.stems):
+        ele = ELEMENTS_MAP.get(stem, '')
+        if ele:
+            weight = ELEMENT_STEM_WEIGHTS[i]
+            element_scores[ele] += weight
+
+    # 地支藏干計分
+    for i, branch in enumerate(bazi.branches):
+        hidden = HIDDEN_STEMS_DATA.get(branch, [])
+        weight = ELEMENT_BRANCH_WEIGHTS[i]
+        for h_stem, percentage in hidden:
+            ele = ELEMENTS_MAP.get(h_stem, '')
+            if ele:
+                element_scores[ele] += weight * (percentage / 100)
+
+    # 計算日主五行
+    day_master = bazi.stems[2]
+    day_element = ELEMENTS_MAP.get(day_master, '')
+
+    # 判斷日主強弱
+    helping_elements = {
+        '木': ['木', '水'], '火': ['火', '木'], '土': ['土', '火'],
+        '金': ['金', '土'], '水': ['水', '金']
+    }
+    weakening_elements = {
+        '木': ['金', '火', '土'], '火': ['水', '土', '金'], '土': ['木', '金', '水'],
+        '金': ['火', '水', '木'], '水': ['土', '木', '火']
+    }
+
+    help_score = sum(element_scores[e] for e in helping_elements.get(day_element, []))
+    weaken_score = sum(element_scores[e] for e in weakening_elements.get(day_element, []))
+
+    total = sum(element_scores.values())
+
+    # 判斷身強身弱
+    if help_score > weaken_score * 1.3:
+        strength = "身強"
+        strength_desc = "日主得令得地，元氣充沛"
+    elif weaken_score > help_score * 1.3:
+        strength = "身弱"
+        strength_desc = "日主失令失地，需要扶助"
+    else:
+        strength = "中和"
+        strength_desc = "日主不強不弱，命局平衡"
+
+    # 找出過旺與不足的五行
+    avg = total / 5
+    excess = [e for e, s in element_scores.items() if s > avg * 1.5]
+    lacking = [e for e, s in element_scores.items() if s < avg * 0.5]
+
+    return {
+        'scores': element_scores,
+        'day_element': day_element,
+        'day_master': day_master,
+        'strength': strength,
+        'strength_desc': strength_desc,
+        'help_score': help_score,
+        'weaken_score': weaken_score,
+        'excess': excess,
+        'lacking': lacking,
+        'total': total
+    }
+
+# --- 4.1 格局與用神判斷 ---
+
+def determine_pattern_and_yongshen(bazi, five_elem_result):
+    """判斷命格格局與喜用神"""
+    day_master = bazi.stems[2]
+    month_branch = bazi.branches[1]
+    day_element = five_elem_result['day_element']
+    strength = five_elem_result['strength']
+    scores = five_elem_result['scores']
+
+    # 十神統計
+    ten_gods = {}
+    for i, stem in enumerate(bazi.stems):
+        if i != 2:  # 排除日主
+            tg = get_ten_god(day_master, stem)
+            ten_gods[tg] = ten_gods.get(tg, 0) + 1
+
+    for branch in bazi.branches:
+        hidden = HIDDEN_STEMS_DATA.get(branch, [])
+        for h_stem, pct in hidden:
+            tg = get_ten_god(day_master, h_stem)
+            ten_gods[tg] = ten_gods.get(tg, 0) + (pct / 100)
+
+    # 格局判斷
+    patterns = []
+    pattern_desc = ""
+
+    # 正官格
+    if ten_gods.get('正官', 0) >= 1.5 and ten_gods.get('七殺', 0) < 1:
+        patterns.append("正官格")
+        pattern_desc = "正官透出，品性端正，適合從政或管理職位"
+
+    # 七殺格
+    if ten_gods.get('七殺', 0) >= 1.5:
+        patterns.append("七殺格")
+        pattern_desc = "七殺透出，性格剛毅，適合競爭激烈的行業"
+
+    # 正財格
+    if ten_gods.get('正財', 0) >= 1.5:
+        patterns.append("正財格")
+        pattern_desc = "正財透出，勤儉持家，財運穩定"
+
+    # 偏財格
+    if ten_gods.get('偏財', 0) >= 1.5:
+        patterns.append("偏財格")
+        pattern_desc = "偏財透出，善於投資理財，有意外之財"
+
+    # 食神格
+    if ten_gods.get('食神', 0) >= 1.5:
+        patterns.append("食神格")
+        pattern_desc = "食神透出，性格溫和，有藝術天分"
+
+    # 傷官格
+    if ten_gods.get('傷官', 0) >= 1.5:
+        patterns.append("傷官格")
+        pattern_desc = "傷官透出，才華橫溢，思維獨特"
+
+    # 正印格
+    if ten_gods.get('正印', 0) >= 1.5:
+        patterns.append("正印格")
+        pattern_desc = "正印透出，聰明好學，有長輩庇護"
+
+    # 偏印格
+    if ten_gods.get('偏印', 0) >= 1.5:
+        patterns.append("偏印格")
+        pattern_desc = "偏印透出，思想獨特，適合研究工作"
+
+    # 建祿格
+    lu_map = {'甲':'寅','乙':'卯','丙':'巳','丁':'午','戊':'巳','己':'午','庚':'申','辛':'酉','壬':'亥','癸':'子'}
+    if month_branch == lu_map.get(day_master):
+        patterns.append("建祿格")
+        pattern_desc = "月支為祿，自立能力強，事業有成"
+
+    # 羊刃格
+    yr_map = {'甲':'卯','乙':'寅','丙':'午','丁':'巳','戊':'午','己':'巳','庚':'酉','辛':'申','壬':'子','癸':'亥'}
+    if month_branch == yr_map.get(day_master):
+        patterns.append("羊刃格")
+        pattern_desc = "月支為刃，性格剛強，需防衝動"
+
+    if not patterns:
+        patterns.append("普通格局")
+        pattern_desc = "命局平和，宜穩中求進"
+
+    # 喜用神判斷
+    generating = {'木': '水', '火': '木', '土': '火', '金': '土', '水': '金'}
+    same = {'木': '木', '火': '火', '土': '土', '金': '金', '水': '水'}
+    controlling = {'木': '金', '火': '水', '土': '木', '金': '火', '水': '土'}
+    generated = {'木': '火', '火': '土', '土': '金', '金': '水', '水': '木'}
+    controlled = {'木': '土', '火': '金', '土': '水', '金': '木', '水': '火'}
+
+    if strength == "身弱":
+        xi_shen = generating.get(day_element, '')  # 喜印星（生我）
+        yong_shen = same.get(day_element, '')  # 用比劫（同我）
+        ji_shen = [controlling.get(day_element, ''), generated.get(day_element, '')]
+        advice = "宜補強日主，多接近喜用神五行"
+    elif strength == "身強":
+        xi_shen = generated.get(day_element, '')  # 喜食傷（我生）
+        yong_shen = controlling.get(day_element, '')  # 用官殺（剋我）
+        ji_shen = [generating.get(day_element, ''), same.get(day_element, '')]
+        advice = "宜洩秀日主，避免過於剛強"
+    else:
+        xi_shen = generating.get(day_element, '')
+        yong_shen = generated.get(day_element, '')
+        ji_shen = []
+        advice = "命局中和，順勢而為即可"
+
+    return {
+        'patterns': patterns,
+        'pattern_desc': pattern_desc,
+        'ten_gods': ten_gods,
+        'xi_shen': xi_shen,
+        'yong_shen': yong_shen,
+        'ji_shen': ji_shen,
+        'advice': advice,
+        'strength': strength
+    }
+
+# --- 4.2 性格特質分析 ---
+
+def analyze_personality(bazi, five_elem_result, pattern_result):
+    """根據八字分析性格特質"""
+    day_master = bazi.stems[2]
+    day_element = five_elem_result['day_element']
+    strength = five_elem_result['strength']
+    polarity = STEM_PROPS[day_master]['polarity']
+
+    # 日主性格基礎
+    stem_traits = {
+        '甲': {'base': '正直剛毅', 'positive': '有領導力、正義感強、積極進取', 'negative': '固執己見、不善變通'},
+        '乙': {'base': '柔韌靈活', 'positive': '善於適應、有藝術天分、人緣好', 'negative': '優柔寡斷、依賴心強'},
+        '丙': {'base': '熱情開朗', 'positive': '慷慨大方、光明磊落、感染力強', 'negative': '衝動急躁、不夠細心'},
+        '丁': {'base': '溫和細膩', 'positive': '心思細密、有洞察力、重感情', 'negative': '多慮敏感、容易焦慮'},
+        '戊': {'base': '穩重厚實', 'positive': '誠信可靠、包容力強、有擔當', 'negative': '保守固執、不夠靈活'},
+        '己': {'base': '謙遜務實', 'positive': '踏實認真、善於理財、有耐心', 'negative': '猜疑心重、缺乏自信'},
+        '庚': {'base': '剛毅果斷', 'positive': '意志堅定、執行力強、有魄力', 'negative': '性格急躁、容易衝突'},
+        '辛': {'base': '精明細緻', 'positive': '審美力強、善於分析、品味高', 'negative': '挑剔苛求、不夠寬容'},
+        '壬': {'base': '聰慧多謀', 'positive': '足智多謀、適應力強、有遠見', 'negative': '不夠專一、容易分心'},
+        '癸': {'base': '內斂敏銳', 'positive': '直覺敏銳、善於觀察、有智慧', 'negative': '過於低調、缺乏魄力'}
+    }
+
+    traits = stem_traits.get(day_master, {'base': '未知', 'positive': '', 'negative': ''})
+
+    # 根據身強身弱調整
+    if strength == "身強":
+        strength_trait = "自信心強，行動力佳，但需注意不要過於強勢"
+    elif strength == "身弱":
+        strength_trait = "性格較為謙和，宜多培養自信，善用他人助力"
+    else:
+        strength_trait = "性格平衡，能屈能伸，進退有度"
+
+    # 十神性格影響
+    ten_gods = pattern_result['ten_gods']
+    god_traits = []
+
+    if ten_gods.get('食神', 0) > 1:
+        god_traits.append("食神旺：為人和善，懂得享受生活，有口福")
+    if ten_gods.get('傷官', 0) > 1:
+        god_traits.append("傷官旺：才思敏捷，創意豐富，但易得罪人")
+    if ten_gods.get('正財', 0) > 1:
+        god_traits.append("正財旺：勤儉節約，理財有道，重視物質")
+    if ten_gods.get('偏財', 0) > 1:
+        god_traits.append("偏財旺：慷慨大方，人脈廣闘，善於投資")
+    if ten_gods.get('正官', 0) > 1:
+        god_traits.append("正官旺：守規矩、有責任感，適合公職")
+    if ten_gods.get('七殺', 0) > 1:
+        god_traits.append("七殺旺：有魄力、敢冒險，適合創業")
+    if ten_gods.get('正印', 0) > 1:
+        god_traits.append("正印旺：愛學習、重名聲，有長輩緣")
+    if ten_gods.get('偏印', 0) > 1:
+        god_traits.append("偏印旺：思想獨特，適合研究，但較孤僻")
+    if ten_gods.get('比肩', 0) > 1:
+        god_traits.append("比肩旺：獨立自主，重朋友，但競爭心強")
+    if ten_gods.get('劫財', 0) > 1:
+        god_traits.append("劫財旺：積極進取，但易破財，需防小人")
+
+    return {
+        'day_master': day_master,
+        'base_trait': traits['base'],
+        'positive': traits['positive'],
+        'negative': traits['negative'],
+        'strength_trait': strength_trait,
+        'god_traits': god_traits,
+        'polarity': polarity
+    }
+
+# --- 4.3 事業財運分析 ---
+
+def analyze_career_wealth(bazi, five_elem_result, pattern_result):
+    """分析事業與財運"""
+    day_element = five_elem_result['day_element']
+    strength = five_elem_result['strength']
+    ten_gods = pattern_result['ten_gods']
+
+    # 適合的行業（根據喜用神五行）
+    industry_map = {
+        '木': ['文化教育', '出版傳媒', '農林園藝', '服裝紡織', '醫藥保健', '家具木材'],
+        '火': ['電子科技', '能源電力', '餐飲美食', '娛樂表演', '廣告設計', '照明光學'],
+        '土': ['房地產', '建築工程', '農業種植', '倉儲物流', '礦業開採', '陶瓷建材'],
+        '金': ['金融投資', '機械製造', '汽車交通', '珠寶鐘錶', '法律司法', '軍警保全'],
+        '水': ['貿易商務', '物流運輸', '旅遊觀光', '水利漁業', '清潔服務', '資訊網路']
+    }
+
+    xi_shen = pattern_result['xi_shen']
+    yong_shen = pattern_result['yong_shen']
+
+    suitable_industries = []
+    if xi_shen:
+        suitable_industries.extend(industry_map.get(xi_shen, []))
+    if yong_shen and yong_shen != xi_shen:
+        suitable_industries.extend(industry_map.get(yong_shen, []))
+
+    # 財運分析
+    wealth_analysis = []
+
+    if ten_gods.get('正財', 0) > 1 and ten_gods.get('偏財', 0) > 1:
+        wealth_analysis.append("正偏財皆旺，財運亨通，正財偏財兼收")
+    elif ten_gods.get('正財', 0) > 1:
+        wealth_analysis.append("正財旺盛，適合穩定工作收入，薪資運佳")
+    elif ten_gods.get('偏財', 0) > 1:
+        wealth_analysis.append("偏財旺盛，有投資運，可獲意外之財")
+    else:
+        wealth_analysis.append("財星不顯，宜穩健理財，不宜投機")
+
+    if strength == "身強":
+        wealth_analysis.append("身強能擔財，財來能守，適合自主創業")
+    elif strength == "身弱":
+        wealth_analysis.append("身弱財多則難擔，宜合作經營，勿貪大財")
+
+    # 事業發展建議
+    if ten_gods.get('正官', 0) > 1:
+        career_advice = "正官旺，適合在大企業或政府機關任職，走正統路線"
+    elif ten_gods.get('七殺', 0) > 1:
+        career_advice = "七殺旺，適合創業或從事競爭激烈的行業，有衝勁"
+    elif ten_gods.get('食神', 0) > 1 or ten_gods.get('傷官', 0) > 1:
+        career_advice = "食傷旺，適合創意產業、自由職業或技術研發"
+    elif ten_gods.get('正印', 0) > 1 or ten_gods.get('偏印', 0) > 1:
+        career_advice = "印星旺，適合教育、學術研究或文化產業"
+    else:
+        career_advice = "命局平和，各行各業皆可發展，宜選擇喜用神相關行業"
+
+    return {
+        'suitable_industries': suitable_industries[:8],
+        'wealth_analysis': wealth_analysis,
+        'career_advice': career_advice,
+        'xi_shen': xi_shen,
+        'yong_shen': yong_shen
+    }
+
+# --- 4.4 婚姻感情分析 ---
+
+def analyze_marriage(bazi, five_elem_result, pattern_result):
+    """分析婚姻感情運勢"""
+    gender = bazi.gender
+    day_master = bazi.stems[2]
+    ten_gods = pattern_result['ten_gods']
+    strength = five_elem_result['strength']
+
+    # 配偶星分析
+    if gender == "男":
+        spouse_star = "正財"  # 男命正財為妻
+        affair_star = "偏財"
+    else:
+        spouse_star = "正官"  # 女命正官為夫
+        affair_star = "七殺"
+
+    spouse_count = ten_gods.get(spouse_star, 0)
+    affair_count = ten_gods.get(affair_star, 0)
+
+    marriage_traits = []
+
+    # 配偶星分析
+    if spouse_count >= 2:
+        marriage_traits.append(f"{spouse_star}多現，感情經歷豐富，需慎選伴侶")
+    elif spouse_count >= 1:
+        marriage_traits.append(f"{spouse_star}適中，婚姻運勢穩定")
+    else:
+        marriage_traits.append(f"{spouse_star}不顯，可能晚婚或需主動追求")
+
+    if affair_count >= 2:
+        marriage_traits.append(f"{affair_star}旺盛，異性緣佳，但需注意第三者")
+
+    # 桃花分析
+    peach_branches = ['子', '午', '卯', '酉']
+    peach_count = sum(1 for b in bazi.branches if b in peach_branches)
+
+    if peach_count >= 3:
+        marriage_traits.append("桃花旺盛，異性緣極佳，感情生活精彩")
+    elif peach_count >= 2:
+        marriage_traits.append("桃花適中，有正常的異性交往機會")
+    else:
+        marriage_traits.append("桃花較少，感情發展較為平淡穩定")
+
+    # 配偶特質推斷
+    day_branch = bazi.branches[2]
+    spouse_element = ELEMENTS_MAP.get(day_branch, '')
+
+    spouse_traits = {
+        '木': '配偶可能性格正直、有主見、注重健康',
+        '火': '配偶可能熱情開朗、積極樂觀、有表現欲',
+        '土': '配偶可能穩重踏實、顧家可靠、重視安全感',
+        '金': '配偶可能精明幹練、有原則、注重品質',
+        '水': '配偶可能聰明靈活、善於交際、適應力強'
+    }
+
+    spouse_desc = spouse_traits.get(spouse_element, '配偶特質需結合其他因素分析')
+
+    # 婚姻建議
+    if strength == "身強" and spouse_count < 1:
+        marriage_advice = "身強財弱，宜主動追求，多參加社交活動"
+    elif strength == "身弱" and spouse_count > 2:
+        marriage_advice = "身弱財多，宜晚婚，選擇能支持自己的伴侶"
+    else:
+        marriage_advice = "婚姻運勢平穩，真誠相待，自然會有良緣"
+
+    return {
+        'spouse_star': spouse_star,
+        'marriage_traits': marriage_traits,
+        'spouse_desc': spouse_desc,
+        'marriage_advice': marriage_advice,
+        'peach_count': peach_count
+    }
+
+# --- 4.5 健康養生分析 ---
+
+def analyze_health(bazi, five_elem_result):
+    """分析健康狀況與養生建議"""
+    scores = five_elem_result['scores']
+    day_element = five_elem_result['day_element']
+    excess = five_elem_result['excess']
+    lacking = five_elem_result['lacking']
+
+    # 五行對應臟腑
+    organ_map = {
+        '木': {'organs': '肝、膽、眼睛、筋腱', 'excess': '肝火旺、易怒、偏頭痛', 'lack': '肝血不足、視力問題'},
+        '火': {'organs': '心、小腸、血脈、舌', 'excess': '心火旺、失眠、焦慮', 'lack': '心血不足、健忘、心悸'},
+        '土': {'organs': '脾、胃、肌肉、口唇', 'excess': '脾胃濕熱、消化不良', 'lack': '脾虛、食慾不振、四肢無力'},
+        '金': {'organs': '肺、大腸、皮膚、鼻', 'excess': '肺熱、皮膚問題', 'lack': '肺氣虛、呼吸系統弱、易感冒'},
+        '水': {'organs': '腎、膀胱、骨骼、耳', 'excess': '腎水過旺、水腫', 'lack': '腎虛、腰膝酸軟、骨質疏鬆'}
+    }
+
+    health_warnings = []
+    health_tips = []
+
+    # 分析過旺五行
+    for elem in excess:
+        info = organ_map.get(elem, {})
+        health_warnings.append(f"【{elem}過旺】{info.get('excess', '')}")
+
+    # 分析不足五行
+    for elem in lacking:
+        info = organ_map.get(elem, {})
+        health_warnings.append(f"【{elem}不足】{info.get('lack', '')}")
+
+    if not health_warnings:
+        health_warnings.append("五行較為平衡，整體健康狀況良好")
+
+    # 養生建議
+    element_foods = {
+        '木': '綠色蔬菜、酸味食物、枸杞、菊花茶',
+        '火': '紅色食物、苦味蔬菜、蓮子、百合',
+        '土': '黃色食物、甜味適量、山藥、薏仁',
+        '金': '白色食物、辛味適量、白蘿蔔、銀耳',
+        '水': '黑色食物、鹹味適量、黑豆、海帶'
+    }
+
+    for elem in lacking:
+        foods = element_foods.get(elem, '')
+        if foods:
+            health_tips.append(f"補{elem}食物：{foods}")
+
+    # 運動建議
+    exercise_map = {
+        '木': '適合戶外活動、伸展運動、太極拳',
+        '火': '適合有氧運動、瑜伽、游泳降火',
+        '土': '適合散步、八段錦、腹部按摩',
+        '金': '適合呼吸練習、爬山、武術',
+        '水': '適合游泳、慢跑、冥想靜坐'
+    }
+
+    exercise_tips = []
+    for elem in lacking:
+        tip = exercise_map.get(elem, '')
+        if tip:
+            exercise_tips.append(f"補{elem}運動：{tip}")
+
+    if not exercise_tips:
+        exercise_tips.append(f"根據日主{day_element}：{exercise_map.get(day_element, '規律運動，保持健康')}")
+
+    return {
+        'organ_focus': organ_map.get(day_element, {}).get('organs', ''),
+        'health_warnings': health_warnings,
+        'health_tips': health_tips,
+        'exercise_tips': exercise_tips,
+        'excess': excess,
+        'lacking': lacking
+    }
+
+# --- 4.6 大運流年分析 ---
+
+def current_year():
+    """分析年的預設值 (今年)；快取的分析與渲染函式不直接讀時鐘，由呼叫端或 year_keyed 在快取外取得"""
+    return datetime.date.today().year
+
+def analyze_dayun_liunian(bazi, birth_date, five_elem_result, pattern_result, analysis_year=None):
+    """分析大運與流年 (流年取 analysis_year，預設今年)；birth_date 為含時刻的 datetime 時改用 timeline 的百年時間軸 (實際起運歲數)"""
+    if analysis_year is None:
+        analysis_year = current_year()
+    if isinstance(birth_date, datetime.datetime):
+        # 起運需要節氣表 (solar_pillars 依賴本模組)，於呼叫時才匯入
+        from timeline import life_timeline
+        return life_timeline(bazi, birth_date, pattern_result, analysis_year=analysis_year)
+
+    gender = bazi.gender
+    year_stem = bazi.stems[0]
+    month_pillar = bazi.pillars[1]
+    xi_shen = pattern_result['xi_shen']
+    yong_shen = pattern_result['yong_shen']
+
+    # 判斷大運順逆
+    yang_stems = ['甲', '丙', '戊', '庚', '壬']
+    is_yang = year_stem in yang_stems
+    is_forward = (is_yang and gender == "男") or (not is_yang and gender == "女")
+
+    direction = "順行" if is_forward else "逆行"
+
+    # 計算大運起始年齡（簡化計算）
+    month_branch = bazi.branches[1]
+    month_idx = BRANCHES.index(month_branch)
+
+    # 生成未來六步大運
+    dayun_list = []
+    month_stem = bazi.stems[1]
+    stem_idx = STEMS.index(month_stem)
+    branch_idx = BRANCHES.index(month_branch)
+
+    for i in range(1, 7):
+        if is_forward:
+            new_stem_idx = (stem_idx + i) % 10
+            new_branch_idx = (branch_idx + i) % 12
+        else:
+            new_stem_idx = (stem_idx - i) % 10
+            new_branch_idx = (branch_idx - i) % 12
+
+        dayun_stem = STEMS[new_stem_idx]
+        dayun_branch = BRANCHES[new_branch_idx]
+        dayun_pillar = dayun_stem + dayun_branch
+
+        # 判斷大運五行
+        dayun_elem = ELEMENTS_MAP.get(dayun_stem, '')
+
+        # 判斷大運吉凶
+        if dayun_elem == xi_shen or dayun_elem == yong_shen:
+            luck = "吉"
+            luck_desc = f"大運走{dayun_elem}，為喜用神，運勢較佳"
+        elif dayun_elem in pattern_result.get('ji_shen', []):
+            luck = "凶"
+            luck_desc = f"大運走{dayun_elem}，為忌神，宜謹慎行事"
+        else:
+            luck = "平"
+            luck_desc = f"大運走{dayun_elem}，運勢平穩"
+
+        start_age = i * 10  # 簡化計算
+
+        dayun_list.append({
+            'pillar': dayun_pillar,
+            'element': dayun_elem,
+            'luck': luck,
+            'luck_desc': luck_desc,
+            'age_range': f"{start_age}-{start_age+9}歲"
+        })
+
+    # 當前流年分析
+    # 計算流年干支（簡化）
+    year_offset = (analysis_year - 4) % 60
+    liunian_stem = STEMS[year_offset % 10]
+    liunian_branch = BRANCHES[year_offset % 12]
+    liunian_pillar = liunian_stem + liunian_branch
+    liunian_elem = ELEMENTS_MAP.get(liunian_stem, '')
+
+    if liunian_elem == xi_shen or liunian_elem == yong_shen:
+        liunian_luck = "今年運勢較佳，宜積極把握機會"
+    elif liunian_elem in pattern_result.get('ji_shen', []):
+        liunian_luck = "今年運勢起伏，宜保守穩健"
+    else:
+        liunian_luck = "今年運勢平穩，順勢而為"
+
+    return {
+        'direction': direction,
+        'dayun_list': dayun_list,
+        'liunian_pillar': liunian_pillar,
+        'liunian_luck': liunian_luck,
+        'analysis_year': analysis_year
+    }
+
+# --- 4.7 人生建議與開運方法 ---
+
+def get_life_advice(five_elem_result, pattern_result, career_result, marriage_result, health_result):
+    """綜合人生建議"""
+    strength = five_elem_result['strength']
+    xi_shen = pattern_result['xi_shen']
+    yong_shen = pattern_result['yong_shen']
+
+    advice_list = []
+
+    # 事業建議
+    advice_list.append({
+        'category': '事業發展',
+        'advice': career_result['career_advice'],
+        'detail': f"適合行業：{'、'.join(career_result['suitable_industries'][:4])}"
+    })
+
+    # 財運建議
+    advice_list.append({
+        'category': '財富理財',
+        'advice': career_result['wealth_analysis'][0] if career_result['wealth_analysis'] else '穩健理財',
+        'detail': '建議：量入為出，適當投資，分散風險'
+    })
+
+    # 感情建議
+    advice_list.append({
+        'category': '感情婚姻',
+        'advice': marriage_result['marriage_advice'],
+        'detail': marriage_result['spouse_desc']
+    })
+
+    # 健康建議
+    health_advice = health_result['health_warnings'][0] if health_result['health_warnings'] else '注意養生'
+    advice_list.append({
+        'category': '健康養生',
+        'advice': health_advice,
+        'detail': health_result['health_tips'][0] if health_result['health_tips'] else '均衡飲食，規律作息'
+    })
+
+    return advice_list
+
+def get_lucky_elements(pattern_result, five_elem_result):
+    """獲取開運方法"""
+    xi_shen = pattern_result['xi_shen']
+    yong_shen = pattern_result['yong_shen']
+
+    # 五行對應開運物
+    lucky_items = {
+        '木': {
+            'colors': '綠色、青色、翠色',
+            'directions': '東方',
+            'numbers': '3、8',
+            'items': '植物盆栽、木質飾品、書籍',
+            'foods': '蔬菜、水果、酸味食物'
+        },
+        '火': {
+            'colors': '紅色、紫色、橙色',
+            'directions': '南方',
+            'numbers': '2、7',
+            'items': '燈飾、電子產品、紅色飾品',
+            'foods': '紅色食物、苦味蔬菜'
+        },
+        '土': {
+            'colors': '黃色、棕色、米色',
+            'directions': '中央、東北、西南',
+            'numbers': '5、0',
+            'items': '陶瓷器皿、玉石、水晶',
+            'foods': '穀物、甜食、根莖類'
+        },
+        '金': {
+            'colors': '白色、金色、銀色',
+            'directions': '西方',
+            'numbers': '4、9',
+            'items': '金屬飾品、鐘錶、汽車',
+            'foods': '白色食物、辛辣調味'
+        },
+        '水': {
+            'colors': '黑色、藍色、灰色',
+            'directions': '北方',
+            'numbers': '1、6',
+            'items': '水族缸、噴泉、流動物品',
+            'foods': '海鮮、黑色食物、鹹味'
+        }
+    }
+
+    result = {}
+
+    if xi_shen and xi_shen in lucky_items:
+        result['喜神開運'] = lucky_items[xi_shen]
+        result['喜神'] = xi_shen
+
+    if yong_shen and yong_shen in lucky_items and yong_shen != xi_shen:
+        result['用神開運'] = lucky_items[yong_shen]
+        result['用神'] = yong_shen
+
+    return result
+
+def get_overall_rating(five_elem_result, pattern_result, all_shen_sha):
+    """命格總評"""
+    scores = {
+        '格局評分': 0,
+        '財運評分': 0,
+        '事業評分': 0,
+        '婚姻評分': 0,
+        '健康評分': 0
+    }
+
+    # 格局評分
+    patterns = pattern_result['patterns']
+    if any(p in patterns for p in ['正官格', '正財格', '正印格']):
+        scores['格局評分'] = 85
+    elif any(p in patterns for p in ['食神格', '偏財格']):
+        scores['格局評分'] = 80
+    elif any(p in patterns for p in ['建祿格', '七殺格']):
+        scores['格局評分'] = 75
+    else:
+        scores['格局評分'] = 70
+
+    # 神煞加成
+    good_sha = ['天乙貴人', '天德貴人', '月德貴人', '文昌貴人', '太極貴人', '祿神', '將星', '紅鸞', '天喜']
+    bad_sha = ['羊刃', '劫煞', '災煞', '空亡', '血刃', '孤辰', '寡宿']
+
+    good_count = sum(1 for sha in all_shen_sha if sha in good_sha)
+    bad_count = sum(1 for sha in all_shen_sha if sha in bad_sha)
+
+    sha_bonus = good_count * 2 - bad_count * 2
+
+    # 其他評分
+    ten_gods = pattern_result['ten_gods']
+
+    # 財運
+    scores['財運評分'] = min(90, 65 + ten_gods.get('正財', 0) * 8 + ten_gods.get('偏財', 0) * 6 + sha_bonus)
+
+    # 事業
+    scores['事業評分'] = min(90, 65 + ten_gods.get('正官', 0) * 8 + ten_gods.get('七殺', 0) * 5 + sha_bonus)
+
+    # 婚姻
+    scores['婚姻評分'] = min(90, 70 + sha_bonus)
+    if '紅鸞' in all_shen_sha or '天喜' in all_shen_sha:
+        scores['婚姻評分'] += 5
+    if '孤辰' in all_shen_sha or '寡宿' in all_shen_sha or '孤鸞煞' in all_shen_sha:
+        scores['婚姻評分'] -= 5
+
+    # 健康
+    scores['健康評分'] = min(90, 75 + sha_bonus)
+    if '血刃' in all_shen_sha or '流霞' in all_shen_sha:
+        scores['健康評分'] -= 3
+
+    # 計算總評
+    total = sum(scores.values()) / len(scores)
+
+    if total >= 85:
+        overall = "上上格局，命帶貴氣，一生順遂"
+    elif total >= 75:
+        overall = "上等格局，福祿兼備，事業有成"
+    elif total >= 65:
+        overall = "中上格局，平穩發展，小富即安"
+    elif total >= 55:
+        overall = "中等格局，需要努力，可期成就"
+    else:
+        overall = "普通格局，逆境求存，貴在堅持"
+
+    return {
+        'scores': scores,
+        'total': round(total, 1),
+        'overall': overall,
+        'good_sha_count': good_count,
+        'bad_sha_count': bad_count
+    }
+
+
+# --- 5. 深度交互分析引擎 ---
+
+# 干支關係表 (鍵為排序後的兩字)，命盤內交互與合婚配對共用
+STEM_COMBOS = {tuple(sorted(('甲','己'))): '甲己合土', tuple(sorted(('乙','庚'))): '乙庚合金', tuple(sorted(('丙','辛'))): '丙辛合水', tuple(sorted(('丁','壬'))): '丁壬合木', tuple(sorted(('戊','癸'))): '戊癸合火'}
+STEM_CLASHES = {tuple(sorted(('甲','庚'))): '甲庚相衝', tuple(sorted(('乙','辛'))): '乙辛相衝', tuple(sorted(('丙','壬'))): '丙壬相衝', tuple(sorted(('丁','癸'))): '丁癸相衝'}
+
+# 地支六合 (重要修復點)
+BRANCH_SIX_COMBOS = {tuple(sorted(('子','丑'))): '子丑合土', tuple(sorted(('寅','亥'))): '寅亥合木', tuple(sorted(('卯','戌'))): '卯戌合火', tuple(sorted(('辰','酉'))): '辰酉合金', tuple(sorted(('巳','申'))): '巳申合水', tuple(sorted(('午','未'))): '午未合火'}
+
+BRANCH_CLASHES = {tuple(sorted(('子','午'))): '子午相衝', tuple(sorted(('丑','未'))): '丑未相衝', tuple(sorted(('寅','申'))): '寅申相衝', tuple(sorted(('卯','酉'))): '卯酉相衝', tuple(sorted(('辰','戌'))): '辰戌相衝', tuple(sorted(('巳','亥'))): '巳亥相衝'}
+
+BRANCH_SEMI_COMBOS = {tuple(sorted(('申','子'))): '申子半合水局', tuple(sorted(('子','辰'))): '子辰半合水局', tuple(sorted(('寅','午'))): '寅午半合火局', tuple(sorted(('午','戌'))): '午戌半合火局', tuple(sorted(('亥','卯'))): '亥卯半合木局', tuple(sorted(('卯','未'))): '卯未半合木局', tuple(sorted(('巳','酉'))): '巳酉半合金局', tuple(sorted(('酉','丑'))): '酉丑半合金局'}
+
+SELF_PUNISH_BRANCHES = ('辰', '午', '酉', '亥')
+
+def analyze_all_interactions(bazi):
+    s, b = bazi.stems, bazi.branches
+    p_names = ["年", "月", "日", "時"]
+    res = {"天干合衝": [], "地支合化": [], "地支刑衝害": []}
+
+    for i in range(4):
+        for j in range(i+1, 4):
+            ps, pb = tuple(sorted((s[i], s[j]))), tuple(sorted((b[i], b[j])))
+            if ps in STEM_COMBOS: res["天干合衝"].append(f"{p_names[i]}{p_names[j]} {STEM_COMBOS[ps]}")
+            if ps in STEM_CLASHES: res["天干合衝"].append(f"{p_names[i]}{p_names[j]} {STEM_CLASHES[ps]}")
+            
+            # 修復：比對六合與半合
+            if pb in BRANCH_SIX_COMBOS: res["地支合化"].append(f"{p_names[i]}{p_names[j]} {BRANCH_SIX_COMBOS[pb]}")
+            if pb in BRANCH_SEMI_COMBOS: res["地支合化"].append(f"{p_names[i]}{p_names[j]} {BRANCH_SEMI_COMBOS[pb]}")
+            
+            if pb in BRANCH_CLASHES: res["地支刑衝害"].append(f"{p_names[i]}{p_names[j]} {BRANCH_CLASHES[pb]}")
+            if b[i] == b[j] and b[i] in SELF_PUNISH_BRANCHES: res["地支刑衝害"].append(f"{p_names[i]}{p_names[j]} {b[i]}自刑")
+    return res
+
+# --- 5.1 完整分析鏈 ---
+
+# 分析鏈各步驟：結果鍵 -> (相依結果鍵, 計算函式 (bazi, birth_date, *相依結果))，依相依順序排列。
+# 'analysis_year' 不是計算步驟，而是建立結果表時填入的分析年 (流年)，大運步驟以相依結果的方式取用
+ANALYSIS_STEPS = {
+    'shen_sha_masks': ((), lambda bazi, birth_date: shen_sha_masks(bazi)),
+    'shen_sha': (('shen_sha_masks',), lambda bazi, birth_date, masks: [shen_sha_names(m) for m in masks]),
+    'all_shen_sha': (('shen_sha_masks',), lambda bazi, birth_date, masks: shen_sha_names(masks[0] | masks[1] | masks[2] | masks[3])),
+    'interactions': ((), lambda bazi, birth_date: analyze_all_interactions(bazi)),
+    'five_elements': ((), lambda bazi, birth_date: analyze_five_elements(bazi)),
+    'pattern': (('five_elements',), lambda bazi, birth_date, fe: determine_pattern_and_yongshen(bazi, fe)),
+    'personality': (('five_elements', 'pattern'), lambda bazi, birth_date, fe, pt: analyze_personality(bazi, fe, pt)),
+    'career': (('five_elements', 'pattern'), lambda bazi, birth_date, fe, pt: analyze_career_wealth(bazi, fe, pt)),
+    'marriage': (('five_elements', 'pattern'), lambda bazi, birth_date, fe, pt: analyze_marriage(bazi, fe, pt)),
+    'health': (('five_elements',), lambda bazi, birth_date, fe: analyze_health(bazi, fe)),
+    'dayun': (('five_elements', 'pattern', 'analysis_year'), lambda bazi, birth_date, fe, pt, year: analyze_dayun_liunian(bazi, birth_date, fe, pt, year)),
+    'life_advice': (('five_elements', 'pattern', 'career', 'marriage', 'health'), lambda bazi, birth_date, *deps: get_life_advice(*deps)),
+    'lucky': (('pattern', 'five_elements'), lambda bazi, birth_date, pt, fe: get_lucky_elements(pt, fe)),
+    'rating': (('five_elements', 'pattern', 'all_shen_sha'), lambda bazi, birth_date, fe, pt, ss: get_overall_rating(fe, pt, ss)),
+}
+# 設定 BAZI_TIMING 時各步驟以 analysis.<結果鍵> 計時 (未設定時 timed 原樣回傳，無額外成本)
+ANALYSIS_STEPS = {name: (deps, timed(f'analysis.{name}', func)) for name, (deps, func) in ANALYSIS_STEPS.items()}
+
+def resolve_analysis(bazi, results, name, birth_date=None):
+    """取得單一分析結果並寫入 results；尚未計算的相依步驟會先遞迴補齊"""
+    if name not in results:
+        deps, func = ANALYSIS_STEPS[name]
+        results[name] = func(bazi, birth_date, *(resolve_analysis(bazi, results, d, birth_date) for d in deps))
+    return results[name]
+
+def analyze_bazi(bazi, birth_date=None, analysis_year=None):
+    """執行完整分析鏈 (神煞 → 五行 → 格局 → 性格/事業/婚姻/健康 → 大運 → 總評)，回傳結構化結果；analysis_year 預設今年"""
+    results = {'pillars': list(bazi.pillars), 'gender': bazi.gender, 'analysis_year': analysis_year or current_year()}
+    for name in ANALYSIS_STEPS:
+        resolve_analysis(bazi, results, name, birth_date)
+    return results
+
+# 命盤結果取決於四柱、性別與分析年 (流年)，以 (年柱, 月柱, 日柱, 時柱, 性別, 分析年) 為鍵做 LRU 快取。
+# 快取的結果會被共用，呼叫端不可修改。
+ANALYSIS_CACHE_SIZE = 4096
+
+def year_keyed(func):
+    """快取函式的 analysis_year (僅限關鍵字) 未給時在快取外補上今年，分析年一定是快取鍵的一部分；跨年後自然改用新鍵"""
+    @wraps(func)
+    def wrapper(*args, analysis_year=None, **kwargs):
+        return func(*args, analysis_year=analysis_year or current_year(), **kwargs)
+    wrapper.cache_info, wrapper.cache_clear = func.cache_info, func.cache_clear
+    return wrapper
+
+@year_keyed
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def lazy_analysis(year, month, day, hour, gender, *, analysis_year):
+    """命盤的分析結果表：各步驟在第一次被需要時才由 resolve_analysis 計算並留存"""
+    return {'pillars': [year, month, day, hour], 'gender': gender, 'analysis_year': analysis_year}
+
+@year_keyed
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def cached_analysis(year, month, day, hour, gender, *, analysis_year):
+    bazi = Bazi(year, month, day, hour, gender)
+    results = lazy_analysis(year, month, day, hour, gender, analysis_year=analysis_year)
+    for name in ANALYSIS_STEPS:
+        resolve_analysis(bazi, results, name)
+    return results
+
+# --- 6. 渲染 ---
+# 報告共用一份樣式表 (REPORT_STYLE)，各段只輸出短 class 名稱；HTML 模板在載入時檢查語法並綁定 str.format_map，渲染時直接填值。
+
+REPORT_CSS = """
+.bz-wrap{overflow-x:auto;font-family:'標楷體';text-align:center}
+.bz-pt{width:100%;border-collapse:collapse;border:2.5px solid #333}
+.bz-pt td{border:1px solid #ccc}
+.bz-pt td:first-child{background:#e8e8e8}
+.bz-pt .hd{background:#f2f2f2;font-size:20px;font-weight:bold}
+.bz-pt .hd td:first-child{width:150px;padding:15px}
+.bz-pt .tg{font-size:18px}
+.bz-pt .tg td+td,.bz-pt .st td+td{color:#c0392b}
+.bz-pt .big{font-size:42px;font-weight:bold}
+.bz-pt .hs{font-size:20px;font-weight:bold;color:#16a085}
+.bz-pt .hr{font-size:14px;color:#555}
+.bz-pt .hs td+td,.bz-pt .hr td+td{padding:10px}
+.bz-pt .ss{font-size:14px;color:#8e44ad}
+.bz-pt .ss td+td{font-weight:bold}
+.bz-sec{margin-top:35px;font-family:'標楷體';padding:25px;border:2.5px solid var(--c);border-radius:15px;background:var(--bg)}
+.bz-sec>h2{color:var(--c);text-align:center;border-bottom:2px solid var(--c);padding-bottom:10px}
+.s-rel{--c:#2c3e50;--bg:#fff;text-align:left}
+.s-ss{--c:#8e44ad;--bg:#fdfbff;--th:#f4f0ff;text-align:center}
+.s-basic{--c:#3498db;--bg:#f8fbff}
+.s-full{--c:#9b59b6;--bg:#fdf8ff;--th:#f0e6f6}
+.s-five{--c:#27ae60;--bg:#f8fff8}
+.s-pat{--c:#e74c3c;--bg:#fff8f8}
+.s-per{--c:#f39c12;--bg:#fffef8}
+.s-car{--c:#2980b9;--bg:#f8faff}
+.s-mar{--c:#e91e63;--bg:#fff8fa}
+.s-hea{--c:#00bcd4;--bg:#f8ffff}
+.s-dy{--c:#673ab7;--bg:#faf8ff;--th:#ede7f6}
+.s-life{--c:#009688;--bg:#f8fffd}
+.s-luck{--c:#ff5722;--bg:#fffaf8}
+.s-rate{--c:#795548;--bg:#faf8f5}
+.bz-g2,.bz-g3{display:grid;grid-template-columns:1fr 1fr;gap:20px;margin-top:15px}
+.bz-g3{grid-template-columns:1fr 1fr 1fr}
+.bz-g2.g25{gap:25px;margin-top:0}
+.bz-card{padding:20px;background:#fff;border-radius:10px}
+.bz-card.p15{padding:15px}
+.bz-sh{box-shadow:0 2px 5px rgba(0,0,0,0.1)}
+.bz-t{width:100%;border-collapse:collapse}
+.bz-t td,.bz-t th{border:1px solid #ccc;padding:10px}
+.bz-t th{background:var(--th)}
+.s-full th{padding:12px}
+.bz-t .none{border:0;padding:20px}
+.s-ss .nm{font-weight:bold;color:#8e44ad;width:150px}
+.bz-t .gz{font-size:24px}
+.bz-bar{display:flex;align-items:center;margin:10px 0}
+.bz-bar>span:first-child{width:40px;font-weight:bold}
+.bz-bar>span:last-child{width:60px;text-align:right}
+.bz-track{flex:1;background:#eee;border-radius:10px;height:25px;margin:0 10px}
+.bz-fill{height:100%;border-radius:10px;transition:width 0.5s}
+.bz-bar.sm{margin:8px 0}
+.bz-bar.sm>span:first-child{width:80px;font-weight:normal}
+.bz-bar.sm>span:last-child{width:50px;font-weight:bold}
+.sm .bz-track{height:20px}
+.sm .bz-fill{transition:none}
+.e0{background:#27ae60}.e1{background:#e74c3c}.e2{background:#f39c12}.e3{background:#bdc3c7}.e4{background:#3498db}
+.b{font-weight:bold}.tc{text-align:center}.p20{padding:20px}.f14{font-size:14px}.f18{font-size:18px}.f20{font-size:20px}.f48{font-size:48px}
+.mt5{margin-top:5px}.mt10{margin-top:10px}.mt15{margin-top:15px}.mt20{margin-top:20px}.mb10{margin-bottom:10px}.mb15{margin-bottom:15px}.my20{margin:20px 0}
+.c-ink{color:#2c3e50}.c-red{color:#c0392b}.c-crim{color:#e74c3c}.c-or{color:#d35400}.c-amb{color:#f39c12}.c-grn{color:#27ae60}
+.c-teal{color:#16a085}.c-pur{color:#8e44ad}.c-blu{color:#3498db}.c-pink{color:#c2185b}.c-cor{color:#ff5722}.c-brn{color:#5d4037}
+.c-vio{color:#673ab7}.c-gry{color:#666}
+"""
+REPORT_STYLE = "<style>" + "".join(line.strip() for line in REPORT_CSS.splitlines()) + "</style>"
+
+def compile_template(template):
+    """str.format 語法的模板 -> 以關鍵字參數填值的函式 (多餘的參數忽略)；載入時先檢查模板語法"""
+    list(string.Formatter().parse(template))
+    fill = template.format_map
+    return lambda **fields: fill(fields)
+
+TPL_PILLARS = compile_template('<div class="bz-wrap"><table class="bz-pt">'
+                               '<tr class="hd"><td>位置</td>{titles}</tr><tr class="tg"><td>十神</td>{ten_gods}</tr>'
+                               '<tr class="big st"><td>天干</td>{stems}</tr><tr class="big"><td>地支</td>{branches}</tr>'
+                               '<tr class="hs"><td>地支藏干</td>{hidden}</tr><tr class="hr"><td>藏干比例</td>{ratios}</tr>'
+                               '<tr class="ss"><td>神煞</td>{shen_sha}</tr></table></div>')
+TPL_INTERACTIONS = compile_template('<div class="bz-sec s-rel"><h2>📜 四柱干支交互關係詳解</h2><div class="bz-g2 g25">'
+                                    '<div><h4 class="c-or">【天干合衝】</h4><ul>{stems}</ul></div>'
+                                    '<div><h4 class="c-grn">【地支合化】</h4><ul>{combos}</ul><h4 class="c-red">【地支刑衝害】</h4><ul>{clashes}</ul></div>'
+                                    '</div></div>')
+TPL_SHEN_SHA = compile_template('<div class="bz-sec s-ss"><h2>🔮 命盤神煞深度解析</h2><table class="bz-t mt15">'
+                                '<tr><th>神煞名稱</th><th>綜合特徵</th><th>實際作用</th></tr>{rows}</table></div>')
+TPL_SHEN_SHA_ROW = compile_template('<tr><td class="nm">{name}</td><td>{feature}</td><td class="c-or">{effect}</td></tr>')
+TPL_BASIC = compile_template('<div class="bz-sec s-basic"><h2>📋 一、基本資料</h2><div class="bz-g2">'
+                             '<div class="bz-card p15 bz-sh"><p><b>性別：</b>{gender}</p><p><b>日主：</b>{day_master}（{day_element}）</p>'
+                             '<p><b>日主陰陽：</b>{polarity}{day_element}</p></div>'
+                             '<div class="bz-card p15 bz-sh"><p><b>身強身弱：</b>{strength}</p><p><b>格局：</b>{patterns}</p>'
+                             '<p><b>納音：</b>{nayin}</p></div></div></div>')
+TPL_FULL_BAZI = compile_template('<div class="bz-sec s-full"><h2>🔍 二、完整八字命盤</h2><div class="tc mt20"><table class="bz-t">'
+                                 '<tr><th>柱位</th><th>年柱</th><th>月柱</th><th>日柱</th><th>時柱</th></tr>'
+                                 '<tr><td class="b">干支</td><td class="gz b">{p0}</td><td class="gz b">{p1}</td><td class="gz b c-red">{p2}</td><td class="gz b">{p3}</td></tr>'
+                                 '<tr><td class="b">納音</td><td>{n0}</td><td>{n1}</td><td>{n2}</td><td>{n3}</td></tr>'
+                                 '<tr><td class="b">五行</td><td>{e0}</td><td>{e1}</td><td>{e2}</td><td>{e3}</td></tr>'
+                                 '</table></div></div>')
+TPL_ELEMENT_BAR = compile_template('<div class="bz-bar"><span>{elem}</span><div class="bz-track">'
+                                   '<div class="bz-fill e{idx}" style="width:{pct:.1f}%"></div></div><span>{score:.1f}分</span></div>')
+TPL_FIVE_ELEMENTS = compile_template('<div class="bz-sec s-five"><h2>⚖️ 三、五行旺衰分析</h2><div class="mt20">{bars}</div>'
+                                     '<div class="bz-card p15 mt20"><p><b>日主五行：</b>{day_element} | <b>身強身弱：</b><span class="c-red b">{strength}</span></p>'
+                                     '<p><b>分析：</b>{strength_desc}</p><p><b>扶助力量：</b>{help_score:.1f}分 | <b>剋洩力量：</b>{weaken_score:.1f}分</p>'
+                                     '{extra}</div></div>')
+TPL_PATTERN = compile_template('<div class="bz-sec s-pat"><h2>🎯 四、格局與用神</h2><div class="bz-g2">'
+                               '<div class="bz-card bz-sh"><h4 class="c-red mb15">【命格格局】</h4><p class="f20 b c-ink">{patterns}</p>'
+                               '<p class="mt10 c-gry">{pattern_desc}</p></div>'
+                               '<div class="bz-card bz-sh"><h4 class="c-grn mb15">【喜用神】</h4>'
+                               '<p><b>喜神：</b><span class="f18 c-grn b">{xi_shen}</span></p>'
+                               '<p><b>用神：</b><span class="f18 c-blu b">{yong_shen}</span></p>'
+                               '<p><b>忌神：</b><span class="c-crim">{ji_shen}</span></p><p class="mt10 c-gry">{advice}</p></div></div></div>')
+TPL_PERSONALITY = compile_template('<div class="bz-sec s-per"><h2>🌟 五、性格特質深度分析</h2><div class="mt15">'
+                                   '<div class="bz-card mb15"><h4 class="c-or">【日主 {day_master} 的基本性格】</h4>'
+                                   '<p class="f18 b c-ink">{base_trait}</p><p class="mt10"><b>優點：</b>{positive}</p><p><b>缺點：</b>{negative}</p></div>'
+                                   '<div class="bz-card mb15"><h4 class="c-pur">【身強身弱影響】</h4><p>{strength_trait}</p></div>'
+                                   '<div class="bz-card"><h4 class="c-teal">【十神性格特點】</h4><ul>{god_traits}</ul></div></div></div>')
+TPL_CAREER = compile_template('<div class="bz-sec s-car"><h2>💼 六、事業財運分析</h2><div class="bz-g2">'
+                              '<div class="bz-card bz-sh"><h4 class="c-ink">【事業發展】</h4><p>{career_advice}</p>'
+                              '<h4 class="c-grn mt15">【適合行業】</h4><p>{industries}</p></div>'
+                              '<div class="bz-card bz-sh"><h4 class="c-amb">【財運分析】</h4><ul>{wealth}</ul>'
+                              '<p class="mt10"><b>喜用五行行業：</b>{xi_shen}、{yong_shen}</p></div></div></div>')
+TPL_MARRIAGE = compile_template('<div class="bz-sec s-mar"><h2>💑 七、婚姻感情分析</h2><div class="bz-g2">'
+                                '<div class="bz-card bz-sh"><h4 class="c-pink">【感情特質】</h4><ul>{traits}</ul>'
+                                '<p class="mt10"><b>配偶星：</b>{spouse_star}</p></div>'
+                                '<div class="bz-card bz-sh"><h4 class="c-pur">【配偶特質】</h4><p>{spouse_desc}</p>'
+                                '<h4 class="c-grn mt15">【婚姻建議】</h4><p>{marriage_advice}</p></div></div></div>')
+TPL_HEALTH = compile_template('<div class="bz-sec s-hea"><h2>🏥 八、健康養生指南</h2><div class="bz-g3">'
+                              '<div class="bz-card bz-sh"><h4 class="c-crim">【健康注意】</h4><ul>{warnings}</ul>'
+                              '<p class="mt10"><b>重點臟腑：</b>{organ_focus}</p></div>'
+                              '<div class="bz-card bz-sh"><h4 class="c-grn">【飲食建議】</h4><ul>{tips}</ul></div>'
+                              '<div class="bz-card bz-sh"><h4 class="c-blu">【運動養生】</h4><ul>{exercise}</ul></div></div></div>')
+TPL_DAYUN_ROW = compile_template('<tr><td>{age_range}</td><td class="f18 b">{pillar}</td><td>{element}</td>'
+                                 '<td class="b {luck_class}">{luck}</td><td>{luck_desc}</td></tr>')
+TPL_DAYUN = compile_template('<div class="bz-sec s-dy"><h2>🔮 九、大運流年分析</h2><div class="mt15">'
+                             '<p class="tc mb15"><b>大運方向：</b><span class="c-vio b">{direction}</span></p>'
+                             '<table class="bz-t"><tr><th>年齡段</th><th>大運</th><th>五行</th><th>吉凶</th><th>運勢說明</th></tr>{rows}</table>'
+                             '<div class="bz-card p15 mt20"><h4 class="c-or">【{analysis_year}年流年分析】</h4>'
+                             '<p><b>流年干支：</b>{liunian_pillar}</p><p>{liunian_luck}</p></div></div></div>')
+TPL_ADVICE_CARD = compile_template('<div class="bz-card p15 bz-sh"><h4 class="c-ink mb10">{category}</h4><p class="b">{advice}</p>'
+                                   '<p class="c-gry f14 mt5">{detail}</p></div>')
+TPL_LIFE_ADVICE = compile_template('<div class="bz-sec s-life"><h2>💡 十、人生總體建議</h2><div class="bz-g2">{cards}</div></div>')
+TPL_LUCKY_CARD = compile_template('<div class="bz-card bz-sh"><h4 class="c-cor">{shen_type}（{shen_elem}）開運法</h4>'
+                                  '<p><b>幸運顏色：</b>{colors}</p><p><b>吉利方位：</b>{directions}</p><p><b>幸運數字：</b>{numbers}</p>'
+                                  '<p><b>開運物品：</b>{items}</p><p><b>補運食物：</b>{foods}</p></div>')
+TPL_LUCKY = compile_template('<div class="bz-sec s-luck"><h2>🌈 十一、開運方法</h2><div class="bz-g2">{cards}</div></div>')
+TPL_SCORE_BAR = compile_template('<div class="bz-bar sm"><span>{category}</span><div class="bz-track">'
+                                 '<div class="bz-fill {level}" style="width:{score}%"></div></div><span>{score:.0f}</span></div>')
+TPL_RATING = compile_template('<div class="bz-sec s-rate"><h2>📊 十二、命格總評</h2><div class="bz-g2">'
+                              '<div class="bz-card"><h4 class="c-brn">【各項評分】</h4>{bars}</div>'
+                              '<div class="bz-card"><h4 class="c-brn">【綜合評價】</h4>'
+                              '<div class="tc my20"><span class="f48 b c-cor">{total}</span><span class="f20 c-gry">分</span></div>'
+                              '<p class="tc f18 c-ink b">{overall}</p><p class="mt15 tc c-gry">吉神：{good}個 | 凶煞：{bad}個</p></div></div></div>')
+
+LUCK_CLASS = {'吉': 'c-grn', '凶': 'c-crim', '平': 'c-amb'}
+
+# 只取決於日主與地支的片段，載入時先渲染好
+HIDDEN_STEMS_TEXT = {b: "、".join(x[0] for x in HIDDEN_STEMS_DATA.get(b, [])) for b in BRANCHES}
+HIDDEN_RATIO_TEXT = {(me, b): "<br>".join(f"{x[0]}({get_ten_god(me, x[0])}) {x[1]}%" for x in HIDDEN_STEMS_DATA.get(b, []))
+                     for me in STEMS for b in BRANCHES}
+SHEN_SHA_ROWS = {
+    name: TPL_SHEN_SHA_ROW(name=name, **SHEN_SHA_INFO.get(name, {'feature': '暫無資料', 'effect': '暫無資料'}))
+    for name in SHEN_SHA_NAMES
+}
+
+def li_items(items, empty=""):
+    return "".join(f"<li>{x}</li>" for x in items) if items else empty
+
+def cells(items):
+    return "".join(f"<td>{x}</td>" for x in items)
+
+PILLAR_TITLE_CELLS = cells(['年柱', '月柱', '日柱', '時柱'])
+
+def section_pillars(bazi, a):
+    """四柱命盤表 (十神、藏干、各柱神煞)"""
+    me_stem = bazi.stems[2]
+    return TPL_PILLARS(
+        titles=PILLAR_TITLE_CELLS,
+        ten_gods=cells([get_ten_god(me_stem, s) if i != 2 else "日主" for i, s in enumerate(bazi.stems)]),
+        stems=cells(bazi.stems),
+        branches=cells(bazi.branches),
+        hidden=cells([HIDDEN_STEMS_TEXT[b] for b in bazi.branches]),
+        ratios=cells([HIDDEN_RATIO_TEXT[me_stem, b] for b in bazi.branches]),
+        shen_sha=cells(["<br>".join(s) if s else "—" for s in a['shen_sha']]),
+    )
+
+def section_interactions(bazi, a):
+    """四柱干支交互關係"""
+    rels = a['interactions']
+    return TPL_INTERACTIONS(
+        stems=li_items(rels['天干合衝'], "<li>無顯著合衝</li>"),
+        combos=li_items(rels['地支合化'], "<li>無顯著合化</li>"),
+        clashes=li_items(rels['地支刑衝害'], "<li>無顯著刑衝害</li>"),
+    )
+
+def section_shen_sha(bazi, a):
+    """神煞深度解析"""
+    rows = [SHEN_SHA_ROWS[ss] for ss in sorted(set().union(*a['shen_sha']))]
+    return TPL_SHEN_SHA(rows="".join(rows) if rows else "<tr><td colspan='3' class='none'>本命盤無特殊神煞解析</td></tr>")
+
+def section_basic(bazi, a):
+    """一、基本資料"""
+    five_elem_result, pattern_result = a['five_elements'], a['pattern']
+    return TPL_BASIC(
+        gender=bazi.gender, day_master=bazi.stems[2], day_element=five_elem_result['day_element'],
+        polarity=STEM_PROPS[bazi.stems[2]]['polarity'], strength=five_elem_result['strength'],
+        patterns='、'.join(pattern_result['patterns']), nayin=NAYIN_DATA.get(bazi.pillars[2], ''),
+    )
+
+def section_full_bazi(bazi, a):
+    """二、完整八字命盤"""
+    fields = {}
+    for i, (p, s, b) in enumerate(zip(bazi.pillars, bazi.stems, bazi.branches)):
+        fields[f'p{i}'], fields[f'n{i}'] = p, NAYIN_DATA.get(p, '')
+        fields[f'e{i}'] = f"{ELEMENTS_MAP.get(s, '')}、{ELEMENTS_MAP.get(b, '')}"
+    return TPL_FULL_BAZI(**fields)
+
+def section_five_elements(bazi, a):
+    """三、五行旺衰分析"""
+    five_elem_result = a['five_elements']
+    scores = five_elem_result['scores']
+    max_score = max(scores.values()) if scores.values() else 1
+    bars = "".join(
+        TPL_ELEMENT_BAR(elem=elem, idx=i, score=scores.get(elem, 0),
+                               pct=(scores.get(elem, 0) / max_score) * 100 if max_score > 0 else 0)
+        for i, elem in enumerate(FIVE_ELEMENTS)
+    )
+    extra = ""
+    if five_elem_result['excess']: extra += f"<p><b>過旺五行：</b>{'、'.join(five_elem_result['excess'])}</p>"
+    if five_elem_result['lacking']: extra += f"<p><b>不足五行：</b>{'、'.join(five_elem_result['lacking'])}</p>"
+    return TPL_FIVE_ELEMENTS(
+        bars=bars, day_element=five_elem_result['day_element'], strength=five_elem_result['strength'],
+        strength_desc=five_elem_result['strength_desc'], help_score=five_elem_result['help_score'],
+        weaken_score=five_elem_result['weaken_score'], extra=extra,
+    )
+
+def section_pattern(bazi, a):
+    """四、格局與用神"""
+    pattern_result = a['pattern']
+    return TPL_PATTERN(
+        patterns='、'.join(pattern_result['patterns']), pattern_desc=pattern_result['pattern_desc'],
+        xi_shen=pattern_result['xi_shen'], yong_shen=pattern_result['yong_shen'],
+        ji_shen='、'.join(pattern_result['ji_shen']) if pattern_result['ji_shen'] else '無明顯忌神',
+        advice=pattern_result['advice'],
+    )
+
+def section_personality(bazi, a):
+    """五、性格特質深度分析"""
+    personality_result = a['personality']
+    return TPL_PERSONALITY(
+        day_master=personality_result['day_master'], base_trait=personality_result['base_trait'],
+        positive=personality_result['positive'], negative=personality_result['negative'],
+        strength_trait=personality_result['strength_trait'],
+        god_traits=li_items(personality_result['god_traits'], "<li>十神分佈平均</li>"),
+    )
+
+def section_career(bazi, a):
+    """六、事業財運分析"""
+    career_result = a['career']
+    return TPL_CAREER(
+        career_advice=career_result['career_advice'],
+        industries="、".join(career_result['suitable_industries']) if career_result['suitable_industries'] else "需結合大運流年分析",
+        wealth=li_items(career_result['wealth_analysis']),
+        xi_shen=career_result['xi_shen'], yong_shen=career_result['yong_shen'],
+    )
+
+def section_marriage(bazi, a):
+    """七、婚姻感情分析"""
+    marriage_result = a['marriage']
+    return TPL_MARRIAGE(
+        traits=li_items(marriage_result['marriage_traits']), spouse_star=marriage_result['spouse_star'],
+        spouse_desc=marriage_result['spouse_desc'], marriage_advice=marriage_result['marriage_advice'],
+    )
+
+def section_health(bazi, a):
+    """八、健康養生指南"""
+    health_result = a['health']
+    return TPL_HEALTH(
+        warnings=li_items(health_result['health_warnings']), organ_focus=health_result['organ_focus'],
+        tips=li_items(health_result['health_tips'], "<li>五行平衡，注意日常保健即可</li>"),
+        exercise=li_items(health_result['exercise_tips']),
+    )
+
+def section_dayun(bazi, a):
+    """九、大運流年分析"""
+    dayun_result = a['dayun']
+    rows = "".join(
+        TPL_DAYUN_ROW(age_range=dy['age_range'], pillar=dy['pillar'], element=dy['element'],
+                             luck=dy['luck'], luck_class=LUCK_CLASS.get(dy['luck'], 'c-gry'), luck_desc=dy['luck_desc'])
+        for dy in dayun_result['dayun_list']
+    )
+    direction = dayun_result['direction']
+    if 'start_text' in dayun_result:
+        direction += f"，{dayun_result['start_text']}起運"
+    return TPL_DAYUN(
+        direction=direction, rows=rows, analysis_year=dayun_result['analysis_year'],
+        liunian_pillar=dayun_result['liunian_pillar'], liunian_luck=dayun_result['liunian_luck'],
+    )
+
+def section_life_advice(bazi, a):
+    """十、人生總體建議"""
+    return TPL_LIFE_ADVICE(cards="".join(
+        TPL_ADVICE_CARD(category=adv['category'], advice=adv['advice'], detail=adv['detail'])
+        for adv in a['life_advice']
+    ))
+
+def section_lucky(bazi, a):
+    """十一、開運方法"""
+    lucky_result = a['lucky']
+    cards = ""
+    for key in ['喜神開運', '用神開運']:
+        if key in lucky_result:
+            shen_type = '喜神' if key == '喜神開運' else '用神'
+            cards += TPL_LUCKY_CARD(shen_type=shen_type, shen_elem=lucky_result.get(shen_type, ''), **lucky_result[key])
+    return TPL_LUCKY(cards=cards or "<div class='tc p20'>命局中和，各類開運方法皆可嘗試</div>")
+
+def section_rating(bazi, a):
+    """十二、命格總評"""
+    rating_result = a['rating']
+    bars = "".join(
+        TPL_SCORE_BAR(category=category, score=score, level='e0' if score >= 80 else 'e2' if score >= 70 else 'e1')
+        for category, score in rating_result['scores'].items()
+    )
+    return TPL_RATING(
+        bars=bars, total=rating_result['total'], overall=rating_result['overall'],
+        good=rating_result['good_sha_count'], bad=rating_result['bad_sha_count'],
+    )
+
+# 分析規則或報告模板改變時遞增，持久快取 (report_cache) 中舊版本的報告即不再命中
+RULES_VERSION = 1
+
+# 報告段落：(段落鍵, 標題, 所需分析結果, 渲染函式)，依顯示順序排列
+REPORT_SECTIONS = [
+    ('pillars', '四柱命盤', ('shen_sha',), section_pillars),
+    ('interactions', '干支交互關係', ('interactions',), section_interactions),
+    ('shen_sha', '神煞解析', ('shen_sha',), section_shen_sha),
+    ('basic', '一、基本資料', ('five_elements', 'pattern'), section_basic),
+    ('full_bazi', '二、完整八字命盤', (), section_full_bazi),
+    ('five_elements', '三、五行旺衰分析', ('five_elements',), section_five_elements),
+    ('pattern', '四、格局與用神', ('pattern',), section_pattern),
+    ('personality', '五、性格特質深度分析', ('personality',), section_personality),
+    ('career', '六、事業財運分析', ('career',), section_career),
+    ('marriage', '七、婚姻感情分析', ('marriage',), section_marriage),
+    ('health', '八、健康養生指南', ('health',), section_health),
+    ('dayun', '九、大運流年分析', ('dayun',), section_dayun),
+    ('life_advice', '十、人生總體建議', ('life_advice',), section_life_advice),
+    ('lucky', '十一、開運方法', ('lucky',), section_lucky),
+    ('rating', '十二、命格總評', ('rating',), section_rating),
+]
+REPORT_SECTIONS = [(key, title, needs, timed(f'render.{key}', render)) for key, title, needs, render in REPORT_SECTIONS]
+
+def render_sections(bazi, birth_date=None, analysis=None, analysis_year=None):
+    """依報告順序逐段產出 (段落鍵, HTML)，第一筆為共用樣式表；每段只先算出自己需要的分析結果，第一段 (四柱命盤) 不必等整條分析鏈"""
+    yield 'style', REPORT_STYLE
+    results = analysis if analysis is not None else {'analysis_year': analysis_year or current_year()}
+    for key, _, needs, render in REPORT_SECTIONS:
+        for name in needs:
+            resolve_analysis(bazi, results, name, birth_date)
+        yield key, render(bazi, results)
+
+def birth_analysis(bazi, results, birth_date):
+    """出生時刻只影響大運 (實際起運歲數)：有時刻時回傳另含該時刻大運的副本，其餘結果仍與 lazy_analysis 共用"""
+    if not isinstance(birth_date, datetime.datetime):
+        return results
+    deps, func = ANALYSIS_STEPS['dayun']
+    return {**results, 'dayun': func(bazi, birth_date, *(resolve_analysis(bazi, results, d) for d in deps))}
+
+def render_chart(bazi, birth_date=None, analysis_year=None):
+    """整份報告 HTML；birth_date 為含時刻的 datetime 時大運段落使用實際起運歲數，流年取 analysis_year (預設今年)"""
+    analysis = birth_analysis(bazi, cached_analysis(*bazi.pillars, bazi.gender, analysis_year=analysis_year), birth_date)
+    return "".join(html for _, html in render_sections(bazi, analysis=analysis))
+
+# 整份報告 (含樣式表) 的 UTF-8 大小預算。實測 2000 個隨機命盤平均約 16.9 KB、最大約 18.7 KB (改用樣式表前平均約 37 KB)
+REPORT_PAYLOAD_BUDGET = 20 * 1024
+
+def report_payload_size(bazi):
+    return len(render_chart(bazi).encode('utf-8'))
+
+def check_payload_budget(charts, budget=REPORT_PAYLOAD_BUDGET):
+    """量測一批命盤的報告大小，回傳 {'max', 'mean', 'budget', 'over': [(Bazi, 位元組數)]}"""
+    sizes = [(bazi, report_payload_size(bazi)) for bazi in charts]
+    values = [size for _, size in sizes]
+    return {
+        'max': max(values, default=0),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'budget': budget,
+        'over': [(bazi, size) for bazi, size in sizes if size > budget],
+    }
+
+@year_keyed
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def render_chart_cached(year, month, day, hour, gender, birth=None, *, analysis_year):
+    return render_chart(Bazi(year, month, day, hour, gender), birth, analysis_year)
+
+SECTION_INDEX = {section[0]: section for section in REPORT_SECTIONS}
+
+@year_keyed
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE * 4)
+def render_section_cached(year, month, day, hour, gender, key, birth=None, *, analysis_year):
+    """只渲染單一段落；分析鏈只補算此段需要的步驟，結果留在 lazy_analysis 供其他段落共用。
+    birth (含時刻的 datetime) 只影響大運段落，呼叫端對其他段落應傳 None 以共用快取"""
+    bazi = Bazi(year, month, day, hour, gender)
+    results = lazy_analysis(year, month, day, hour, gender, analysis_year=analysis_year)
+    _, _, needs, render = SECTION_INDEX[key]
+    if 'dayun' in needs:
+        results = birth_analysis(bazi, results, birth)
+    for name in needs:
+        resolve_analysis(bazi, results, name)
+    return render(bazi, results)
+
+def cache_stats():
+    """分析、整份 HTML 與單段 HTML 快取的命中 / 未命中統計"""
+    stats = {}
+    for name, func in (('analysis', cached_analysis), ('html', render_chart_cached), ('section', render_section_cached)):
+        info = func.cache_info()
+        lookups = info.hits + info.misses
+        stats[name] = {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0
+        }
+    return stats
+
+def clear_caches():
+    lazy_analysis.cache_clear()
+    cached_analysis.cache_clear()
+    render_chart_cached.cache_clear()
+    render_section_cached.cache_clear()
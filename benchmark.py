@@ -0,0 +1,197 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+from bazi_core import (
+    Bazi, get_ten_god, get_55_shen_sha, analyze_five_elements, determine_pattern_and_yongshen,
+    analyze_all_interactions, analyze_dayun_liunian, render_chart, clear_caches, check_payload_budget,
+)
+from solar_pillars import solar_to_pillars
+
+# --- 效能基準 ---
+# 以固定亂數種子在 1900-2100 年、男女之間抽樣命盤，逐階段量測單次呼叫延遲分位數、每秒盤數與記憶體峰值，
+# 並與存檔的基準比較：任何階段的 p50 延遲退步超過門檻即以非零結束碼失敗。
+# 用法：python benchmark.py --save-baseline；之後 python benchmark.py 比較 (預設門檻 25%)
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_CORPUS_SIZE = 2000
+DEFAULT_THRESHOLD = 0.25
+MEMORY_SAMPLE = 200
+
+
+def build_corpus(size=DEFAULT_CORPUS_SIZE, seed=0):
+    """固定種子的命盤樣本：[(出生時間, Bazi)]"""
+    rng = random.Random(seed)
+    start = datetime.datetime(1900, 1, 1)
+    span = int((datetime.datetime(2100, 12, 31, 23) - start).total_seconds() // 60)
+    corpus = []
+    for _ in range(size):
+        dt = start + datetime.timedelta(minutes=rng.randrange(span))
+        pillars = solar_to_pillars(dt.year, dt.month, dt.day, dt.hour, dt.minute)
+        corpus.append((dt, Bazi(*pillars, rng.choice(['男', '女']))))
+    return corpus
+
+
+def lunar_pillars(dt):
+    from lunar_python import Solar
+    ec = Solar.fromYmdHms(dt.year, dt.month, dt.day, dt.hour, dt.minute, 0).getLunar().getEightChar()
+    return ec.getYear(), ec.getMonth(), ec.getDay(), ec.getTime()
+
+
+def stage_calls():
+    """階段名稱 -> 以 (出生時間, Bazi) 執行一次的函式；每個函式代表「一盤」的工作量"""
+    def ten_gods(dt, bazi):
+        me = bazi.stems[2]
+        for s in bazi.stems:
+            get_ten_god(me, s)
+
+    def shen_sha(dt, bazi):
+        for i in range(4):
+            get_55_shen_sha(bazi, i)
+
+    def pattern(dt, bazi):
+        determine_pattern_and_yongshen(bazi, analyze_five_elements(bazi))
+
+    def dayun(dt, bazi):
+        fe = analyze_five_elements(bazi)
+        analyze_dayun_liunian(bazi, dt.date(), fe, determine_pattern_and_yongshen(bazi, fe))
+
+    def timeline(dt, bazi):
+        # 傳入含時刻的 datetime：實際起運的百年時間軸
+        fe = analyze_five_elements(bazi)
+        analyze_dayun_liunian(bazi, dt, fe, determine_pattern_and_yongshen(bazi, fe))
+
+    return {
+        'get_ten_god': ten_gods,
+        'get_55_shen_sha': shen_sha,
+        'analyze_five_elements': lambda dt, bazi: analyze_five_elements(bazi),
+        'determine_pattern_and_yongshen': pattern,
+        'analyze_all_interactions': lambda dt, bazi: analyze_all_interactions(bazi),
+        'analyze_dayun_liunian': dayun,
+        'life_timeline': timeline,
+        # 傳入含時刻的 datetime：與 App 相同，大運段落使用實際起運歲數
+        'render_chart': lambda dt, bazi: render_chart(bazi, dt),
+        'solar_to_pillars': lambda dt, bazi: solar_to_pillars(dt.year, dt.month, dt.day, dt.hour, dt.minute),
+        'lunar_python': lambda dt, bazi: lunar_pillars(dt),
+    }
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def time_stage(func, corpus):
+    """逐次計時；render_chart 等有快取的階段先清空快取，量的是未命中成本"""
+    clear_caches()
+    gc.collect()
+    timings = []
+    clock = time.perf_counter_ns
+    gc.disable()  # 避免回收週期落在個別呼叫上造成假性尾端延遲
+    try:
+        for dt, bazi in corpus:
+            t0 = clock()
+            func(dt, bazi)
+            timings.append(clock() - t0)
+    finally:
+        gc.enable()
+    timings.sort()
+    total = sum(timings) / 1e9
+    return {
+        'p50_us': percentile(timings, 50) / 1e3,
+        'p90_us': percentile(timings, 90) / 1e3,
+        'p99_us': percentile(timings, 99) / 1e3,
+        'mean_us': total / len(timings) * 1e6,
+        'charts_per_s': len(timings) / total if total else 0.0,
+    }
+
+
+def peak_memory(func, corpus):
+    """以 tracemalloc 另跑一輪 (計時不受影響)，回傳此階段的配置峰值 (KiB)"""
+    clear_caches()
+    gc.collect()
+    tracemalloc.start()
+    for dt, bazi in corpus:
+        func(dt, bazi)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def run_benchmark(size=DEFAULT_CORPUS_SIZE, seed=0, stages=None, log=sys.stderr):
+    corpus = build_corpus(size, seed)
+    calls = stage_calls()
+    results = {}
+    for name in stages or calls:
+        func = calls[name]
+        func(*corpus[0])  # 暖機 (載入表格、lunar_python 等)
+        results[name] = time_stage(func, corpus)
+        results[name]['peak_kib'] = peak_memory(func, corpus[:MEMORY_SAMPLE])
+        if log:
+            r = results[name]
+            print(f"{name:32s} p50 {r['p50_us']:9.1f}µs  p90 {r['p90_us']:9.1f}µs  p99 {r['p99_us']:9.1f}µs  "
+                  f"{r['charts_per_s']:11,.0f} 盤/s  峰值 {r['peak_kib']:8.1f} KiB", file=log)
+    payload = check_payload_budget([bazi for _, bazi in corpus[:MEMORY_SAMPLE]])
+    return {
+        'corpus': {'size': size, 'seed': seed},
+        'python': sys.version.split()[0],
+        'stages': results,
+        'payload': {'max': payload['max'], 'mean': payload['mean'], 'budget': payload['budget'], 'over': len(payload['over'])},
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """回傳退步清單 [(階段, 基準 p50, 目前 p50, 變化比例)]；報告大小超出預算也視為退步"""
+    regressions = []
+    for name, current in report['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            continue
+        change = current['p50_us'] / base['p50_us'] - 1 if base['p50_us'] else 0.0
+        if change > threshold:
+            regressions.append((name, base['p50_us'], current['p50_us'], change))
+    if report['payload']['over']:
+        regressions.append(('payload', report['payload']['budget'], report['payload']['max'], report['payload']['max'] / report['payload']['budget'] - 1))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="八字引擎效能基準")
+    parser.add_argument('--size', type=int, default=DEFAULT_CORPUS_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stage', action='append', choices=list(stage_calls()), help="只跑指定階段 (可重複)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="把這次結果存為基準")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="p50 延遲允許的退步比例")
+    parser.add_argument('--json', action='store_true', help="結果以 JSON 輸出到 stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.size, args.seed, args.stage)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"報告大小：平均 {report['payload']['mean']:,.0f} B，最大 {report['payload']['max']:,} B (預算 {report['payload']['budget']:,} B)", file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"已存基準：{args.baseline}", file=sys.stderr)
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        # 沒有基準就無法檢查退步，不可當作通過 (結束碼 2 與退步的 1 區分)
+        print(f"找不到基準 {args.baseline}，請先在同一台機器上以 --save-baseline 建立", file=sys.stderr)
+        sys.exit(2)
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('corpus') != report['corpus']:
+        print(f"警告：基準樣本 {baseline.get('corpus')} 與本次 {report['corpus']} 不同", file=sys.stderr)
+    regressions = compare(report, baseline, args.threshold)
+    for name, base, current, change in regressions:
+        print(f"退步：{name} {base:,.1f} → {current:,.1f} ({change:+.0%})", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
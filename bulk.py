@@ -0,0 +1,121 @@
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+
+from bazi_core import Bazi
+from batch import map_chunks, record_pillars
+from chart_store import chart_summary, open_store
+
+# --- 大量排盤 CLI ---
+# 逐列讀入 CSV / JSONL (檔案或 stdin)，以程序池分 chunk 計算，依輸入順序每筆輸出一行 JSON 到 stdout。
+# 格式錯誤的列跳過並在 stderr 回報；輸入以串流處理，記憶體用量不隨筆數成長。
+# 用法：python bulk.py clients.csv > out.jsonl，或 cat clients.jsonl | python bulk.py --format jsonl
+
+PROGRESS_EVERY = 10000
+MAX_ERROR_LINES = 20
+
+
+@lru_cache(maxsize=1)
+def worker_store():
+    """每個工作程序各自開啟一次結果庫 (不存在時為 None，改為即時計算)"""
+    return open_store()
+
+
+def chart_line(row_no, record):
+    """單筆紀錄轉為輸出物件；錯誤時回傳 {'row', 'error'}"""
+    try:
+        if isinstance(record, str):
+            record = json.loads(record)
+        pillars = record_pillars(record)
+        bazi = Bazi(*pillars, record['gender'])
+    except (KeyError, TypeError, ValueError) as e:
+        return {'row': row_no, 'error': f"{type(e).__name__}: {e}"}
+    summary = chart_summary(bazi, worker_store())
+    out = {'row': row_no}
+    if isinstance(record, dict) and 'id' in record:
+        out['id'] = record['id']
+    out.update({
+        'pillars': pillars,
+        'gender': bazi.gender,
+        'scores': summary['scores'],
+        'strength': summary['strength'],
+        'pattern': summary['patterns'],
+        'xi_shen': summary['xi_shen'],
+        'yong_shen': summary['yong_shen'],
+        'ji_shen': summary['ji_shen'],
+        'shen_sha': summary['shen_sha'],
+    })
+    return out
+
+
+def chart_lines_chunk(rows):
+    return [chart_line(row_no, record) for row_no, record in rows]
+
+
+def read_rows(stream, fmt):
+    """產出 (列號, 紀錄)；JSONL 的每行留給工作程序解析，壞行才能逐行回報"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for row_no, line in enumerate(stream, 1):
+            if line.strip():
+                yield row_no, line
+
+
+def detect_format(stream, path):
+    """依副檔名判斷格式；stdin 則看第一個非空白字元是否為 '{'，回傳 (格式, 可重新讀取的串流)"""
+    if path and path != '-':
+        return ('csv' if path.lower().endswith('.csv') else 'jsonl'), stream
+    head = stream.readline()
+    fmt = 'jsonl' if head.lstrip().startswith('{') else 'csv'
+    return fmt, itertools.chain([head], stream)
+
+
+def run(stream, fmt, out=sys.stdout, log=sys.stderr, workers=None, chunksize=512):
+    """處理整個輸入串流，回傳 (輸出筆數, 略過筆數)"""
+    ok = failed = 0
+    reasons = Counter()
+    start = time.perf_counter()
+    for result in map_chunks(chart_lines_chunk, read_rows(stream, fmt), workers=workers, chunksize=chunksize):
+        if 'error' in result:
+            failed += 1
+            reasons[result['error'].split(':', 1)[0]] += 1
+            if failed <= MAX_ERROR_LINES:
+                print(f"略過第 {result['row']} 列：{result['error']}", file=log)
+        else:
+            out.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n')
+            ok += 1
+        if (ok + failed) % PROGRESS_EVERY == 0:
+            print(f"{ok + failed:,} 筆，{(ok + failed) / (time.perf_counter() - start):,.0f} 筆/s，略過 {failed:,}", file=log)
+    elapsed = time.perf_counter() - start
+    rate = (ok + failed) / elapsed if elapsed else 0.0
+    print(f"完成：輸出 {ok:,} 筆，略過 {failed:,} 筆，{elapsed:.1f}s ({rate:,.0f} 筆/s)", file=log)
+    if reasons:
+        print("略過原因：" + "，".join(f"{name} × {count:,}" for name, count in reasons.most_common()), file=log)
+    return ok, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="由 CSV / JSONL 大量排盤，每筆輸出一行 JSON")
+    parser.add_argument('input', nargs='?', default='-', help="輸入檔 (預設 stdin)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help="預設依副檔名或內容判斷")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=512)
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    if args.input == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        stream = open(args.input, encoding='utf-8-sig', newline='')
+    with stream:
+        fmt, rows = detect_format(stream, args.input) if args.format is None else (args.format, stream)
+        run(rows, fmt, workers=args.workers, chunksize=args.chunksize)
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bazi_core import (
+    Bazi, FIVE_ELEMENTS, TEN_GODS, TEN_GOD_TABLE, HIDDEN_STEMS_DATA, SHEN_SHA_NAMES, STEM_INDEX, BRANCHES,
+)
+from batch import record_pillars
+from chart_store import CHART_COUNT, chart_arrays, chart_from_index, chart_index
+from matcher import element_shares
+from shensha_batch import shen_sha_batch
+
+# --- 命盤相似度搜尋 (k-NN) ---
+# 特徵向量 = 五行佔比 (analyze_five_elements) + 十神權重 (determine_pattern_and_yongshen) + 神煞位元 (shen_sha_masks 聯集)。
+# 索引為 KD 樹：以稠密特徵 (五行、十神) 遞迴切半，葉節點與葉節點群各存方盒與神煞 AND/OR 遮罩；查詢以距離下界剪枝並依序分批掃描，
+# 下界超過目前第 k 近距離即停止，結果為精確 k-NN。葉內資料連續存放，以記憶體映射在第一次查詢時載入。
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"chart_knn_v{INDEX_VERSION}")
+
+# 各區塊的縮放：五行佔比總和為 1，放大後與十神權重 (總和 7) 同一量級；每個不同的神煞計 0.25 (距離平方)
+ELEMENT_WEIGHT = 10.0
+TEN_GOD_WEIGHT = 1.0
+SHEN_SHA_WEIGHT = 0.5
+DENSE_DIMS = len(FIVE_ELEMENTS) + len(TEN_GODS)
+FEATURE_NAMES = ([f"五行:{e}" for e in FIVE_ELEMENTS] + [f"十神:{t}" for t in TEN_GODS]
+                 + [f"神煞:{n}" for n in SHEN_SHA_NAMES])
+
+# (日干, 地支) -> 藏干的十神權重 (比例 / 100)
+HIDDEN_TEN_GODS = np.zeros((10, 12, 10), dtype=np.float32)
+for me in range(10):
+    for b, branch in enumerate(BRANCHES):
+        for h_stem, pct in HIDDEN_STEMS_DATA.get(branch, []):
+            HIDDEN_TEN_GODS[me, b, TEN_GOD_TABLE[me][STEM_INDEX[h_stem]]] += pct / 100
+TEN_GOD_ARRAY = np.array(TEN_GOD_TABLE, dtype=np.int64)
+BIT_VALUES = np.uint64(1) << np.arange(len(SHEN_SHA_NAMES), dtype=np.uint64)
+
+
+def ten_god_weights(stems, branches):
+    """(N, 4) 天干、地支索引 -> (N, 10) 十神權重，算法同 determine_pattern_and_yongshen 的十神統計"""
+    me = stems[:, 2]
+    weights = HIDDEN_TEN_GODS[me, branches[:, 0]] + HIDDEN_TEN_GODS[me, branches[:, 1]]
+    weights += HIDDEN_TEN_GODS[me, branches[:, 2]] + HIDDEN_TEN_GODS[me, branches[:, 3]]
+    rows = np.arange(len(stems))
+    for pos in (0, 1, 3):  # 排除日主
+        weights[rows, TEN_GOD_ARRAY[me, stems[:, pos]]] += 1
+    return weights
+
+
+def compact_features(stems, branches, gender):
+    """N 個命盤的緊湊特徵：(稠密部分 (N, 15) float32, 神煞聯集遮罩 (N,) uint64)"""
+    stems, branches = np.asarray(stems, dtype=np.int64), np.asarray(branches, dtype=np.int64)
+    dense = np.empty((len(stems), DENSE_DIMS), dtype=np.float32)
+    dense[:, :5] = element_shares(stems, branches) * ELEMENT_WEIGHT
+    dense[:, 5:] = ten_god_weights(stems, branches) * TEN_GOD_WEIGHT
+    masks = np.bitwise_or.reduce(shen_sha_batch(stems, branches, gender), axis=1)
+    return dense, masks
+
+
+def expand(dense, masks):
+    """緊湊特徵展開為完整特徵向量 (N, 15 + 神煞數)"""
+    bits = ((masks[:, None] & BIT_VALUES) != 0).astype(np.float32) * SHEN_SHA_WEIGHT
+    return np.hstack([dense, bits])
+
+
+def chart_features(bazi):
+    """單一命盤的完整特徵向量"""
+    dense, masks = compact_features([bazi.stem_idx], [bazi.branch_idx], [bazi.gender_code])
+    return expand(dense, masks)[0]
+
+
+def all_compact_features(chunk=1 << 17):
+    dense = np.empty((CHART_COUNT, DENSE_DIMS), dtype=np.float32)
+    masks = np.empty(CHART_COUNT, dtype=np.uint64)
+    for start in range(0, CHART_COUNT, chunk):
+        sl = slice(start, min(start + chunk, CHART_COUNT))
+        dense[sl], masks[sl] = compact_features(*chart_arrays(np.arange(sl.start, sl.stop)))
+    return dense, masks
+
+
+def kd_partition(dense, leaf_size):
+    """KD 樹切分：反覆沿分布最寬的維度於中位數切半，回傳 (排列順序, 葉節點起點)"""
+    order = np.arange(len(dense))
+    stack, starts = [(0, len(dense))], []
+    while stack:
+        lo, hi = stack.pop()
+        x = dense[order[lo:hi]]
+        spread = x.max(axis=0) - x.min(axis=0)
+        if hi - lo <= leaf_size or spread.max() == 0:
+            starts.append(lo)
+            continue
+        mid = (hi - lo) // 2
+        order[lo:hi] = order[lo:hi][np.argpartition(x[:, spread.argmax()], mid)]
+        # 先推右半再推左半，葉節點依位置順序產生
+        stack += [(lo + mid, hi), (lo, lo + mid)]
+    return order, np.array(starts + [len(dense)], dtype=np.int64)
+
+
+def box_arrays(dense, masks, starts):
+    """各節點 (起點為 starts 的連續區段) 的方盒與神煞 AND/OR 遮罩"""
+    return (np.minimum.reduceat(dense, starts), np.maximum.reduceat(dense, starts),
+            np.bitwise_and.reduceat(masks, starts), np.bitwise_or.reduceat(masks, starts))
+
+
+def box_bounds(boxes, q, q_mask):
+    """查詢點到各節點的距離平方下界：到方盒的距離 + 節點內必定不同的神煞數"""
+    lower, upper, mask_and, mask_or = boxes
+    gap = np.maximum(np.maximum(lower - q, q - upper), 0)
+    must_differ = (mask_and & ~q_mask) | (q_mask & ~mask_or)
+    return (gap * gap).sum(axis=1) + SHEN_SHA_WEIGHT ** 2 * np.bitwise_count(must_differ)
+
+
+def ranges(starts, stops):
+    """多個 [start, stop) 區段串接成的位置陣列"""
+    lengths = stops - starts
+    shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(lengths.sum()) + shift
+
+
+def build_index(path=DEFAULT_INDEX_PATH, leaf_size=16, group_leaves=64, log=sys.stderr):
+    """計算全命盤特徵、建立 KD 樹 (葉節點與葉節點群兩層方盒) 並寫入索引目錄"""
+    start_time = time.perf_counter()
+    dense, masks = all_compact_features()
+    if log:
+        print(f"特徵 {CHART_COUNT:,} 盤，{time.perf_counter() - start_time:.1f}s", file=log)
+
+    order, offsets = kd_partition(dense, leaf_size)
+    dense, masks = dense[order], masks[order]
+    # 相鄰的 group_leaves 個葉節點為一群 (KD 樹的上層節點)
+    group_offsets = np.append(np.arange(0, len(offsets) - 1, group_leaves), len(offsets) - 1)
+    leaf_boxes = box_arrays(dense, masks, offsets[:-1])
+    group_boxes = box_arrays(dense, masks, offsets[group_offsets[:-1]])
+    arrays = {'dense': dense, 'masks': masks, 'ids': order.astype(np.uint32),
+              'offsets': offsets, 'group_offsets': group_offsets}
+    for prefix, boxes in (('leaf', leaf_boxes), ('group', group_boxes)):
+        arrays.update({f'{prefix}_{name}': a for name, a in zip(('lower', 'upper', 'mask_and', 'mask_or'), boxes)})
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), array)
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'count': CHART_COUNT, 'leaves': len(offsets) - 1,
+                   'weights': [ELEMENT_WEIGHT, TEN_GOD_WEIGHT, SHEN_SHA_WEIGHT]}, f)
+    if log:
+        print(f"完成：{path}，{len(offsets) - 1} 個葉節點，{time.perf_counter() - start_time:.1f}s", file=log)
+    return path
+
+
+class ChartKnnIndex:
+    """唯讀 k-NN 索引；建立物件時不讀檔，第一次查詢才以記憶體映射載入"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.loaded = False
+
+    def load(self):
+        if not self.loaded:
+            with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['version'] != INDEX_VERSION or meta['weights'] != [ELEMENT_WEIGHT, TEN_GOD_WEIGHT, SHEN_SHA_WEIGHT]:
+                raise ValueError(f"{self.path} 不是 v{INDEX_VERSION} 索引或特徵權重不同，請重建")
+            array = lambda name, mode=None: np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode=mode)
+            self.dense, self.masks, self.ids = array('dense', 'r'), array('masks', 'r'), array('ids', 'r')
+            self.offsets, self.group_offsets = array('offsets'), array('group_offsets')
+            box = lambda prefix: tuple(array(f'{prefix}_{name}') for name in ('lower', 'upper', 'mask_and', 'mask_or'))
+            self.leaf_boxes, self.group_boxes = box('leaf'), box('group')
+            self.loaded = True
+        return self
+
+    def query(self, bazi, k=10, include_self=False):
+        """與 bazi 最相近的 k 個命盤：[(結果庫編號, 距離)]，距離由小到大"""
+        if k < 1:
+            raise ValueError(f"k 需為正整數：{k}")
+        self.load()
+        dense, masks = compact_features([bazi.stem_idx], [bazi.branch_idx], [bazi.gender_code])
+        q, q_mask = dense[0], masks[0]
+        self_index = None if include_self else chart_index(bazi)
+        best_d = np.full(k, np.inf)
+        best_ids = np.full(k, -1, dtype=np.int64)
+
+        def scan(leaves):
+            nonlocal best_d, best_ids
+            positions = ranges(self.offsets[leaves], self.offsets[leaves + 1])
+            diff = self.dense[positions] - q
+            d = (diff * diff).sum(axis=1) + SHEN_SHA_WEIGHT ** 2 * np.bitwise_count(self.masks[positions] ^ q_mask)
+            ids = self.ids[positions].astype(np.int64)
+            if self_index is not None:
+                d[ids == self_index] = np.inf
+            all_d, all_ids = np.concatenate([best_d, d]), np.concatenate([best_ids, ids])
+            keep = np.argpartition(all_d, k - 1)[:k]
+            keep = keep[np.argsort(all_d[keep], kind='stable')]
+            best_d, best_ids = all_d[keep], all_ids[keep]
+            # 下界超過第 k 近距離的節點都不可能更近 (留浮點誤差餘裕)
+            return best_d[-1] * (1 + 1e-6) + 1e-6
+
+        # 依下界由小到大分批展開葉節點群，每批後以新的第 k 近距離剪掉其餘的群與葉節點
+        group_bounds = box_bounds(self.group_boxes, q, q_mask)
+        group_order = np.argsort(group_bounds)
+        limit, done, batch = np.inf, 0, 1
+        while done < len(group_order) and group_bounds[group_order[done]] <= limit:
+            groups = group_order[done:done + batch]
+            groups = groups[group_bounds[groups] <= limit]
+            leaves = ranges(self.group_offsets[groups], self.group_offsets[groups + 1])
+            leaves = leaves[box_bounds(tuple(a[leaves] for a in self.leaf_boxes), q, q_mask) <= limit]
+            if len(leaves):
+                limit = scan(leaves)
+            done, batch = done + batch, batch * 2
+        found = best_ids >= 0
+        return list(zip(best_ids[found].tolist(), np.sqrt(best_d[found]).tolist()))
+
+
+def open_index(path=DEFAULT_INDEX_PATH):
+    """索引存在時回傳 ChartKnnIndex (尚未載入)，否則回傳 None"""
+    return ChartKnnIndex(path) if os.path.exists(os.path.join(path, 'meta.json')) else None
+
+
+def feature_differences(a, b, top=5):
+    """兩個命盤差異最大的特徵：[(特徵名稱, a 值, b 值)]"""
+    fa, fb = chart_features(a), chart_features(b)
+    order = np.argsort(-np.abs(fa - fb), kind='stable')[:top]
+    return [(FEATURE_NAMES[i], round(float(fa[i]), 2), round(float(fb[i]), 2)) for i in order if fa[i] != fb[i]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="命盤相似度索引：建立 (--build) 或查詢最相近的 k 個命盤")
+    parser.add_argument('--path', default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--build', action='store_true')
+    parser.add_argument('--leaf-size', type=int, default=16)
+    parser.add_argument('--datetime', help="查詢命盤的出生時刻 (ISO 8601)")
+    parser.add_argument('--pillars', help="查詢命盤四柱，以逗號分隔")
+    parser.add_argument('--gender', default='男')
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.build:
+        build_index(args.path, leaf_size=args.leaf_size)
+        sys.exit(0)
+    sys.stdout.reconfigure(encoding='utf-8')
+    bazi = Bazi(*record_pillars({'datetime': args.datetime, 'pillars': args.pillars}), args.gender)
+    index = open_index(args.path)
+    if index is None:
+        sys.exit(f"找不到索引 {args.path}，請先執行 python chart_knn.py --build")
+    start = time.perf_counter()
+    neighbours = index.query(bazi, args.k)
+    print(f"查詢 {(time.perf_counter() - start) * 1000:.1f} ms (含載入)", file=sys.stderr)
+    for idx, dist in neighbours:
+        other = chart_from_index(idx)
+        print(json.dumps({'pillars': other.pillars, 'gender': other.gender, 'distance': round(dist, 3),
+                          'differences': feature_differences(bazi, other)}, ensure_ascii=False))
@@ -0,0 +1,253 @@
+import argparse
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from bazi_core import (
+    Bazi, FIVE_ELEMENTS, shen_sha_masks, shen_sha_names,
+    analyze_five_elements, determine_pattern_and_yongshen, get_overall_rating,
+)
+from batch import map_chunks
+
+# --- 全命盤預算結果庫 ---
+# 有效命盤空間：年柱 60 × 月支 12 (月干由年干決定) × 日柱 60 × 時辰 13 (含晚子時，時干取次日) × 性別 2，
+# 共 1,123,200 盤。以混合進位制編號即為此空間的最小完美雜湊：查詢為 O(1)，
+# 結果以固定寬度紀錄存成 .npy，啟動時以記憶體映射載入，不複製資料。
+
+STORE_VERSION = 1
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"chart_store_v{STORE_VERSION}.npy")
+
+HOUR_SLOTS = 13  # 子 ~ 亥 + 晚子時
+LATE_ZI = 12
+CHART_COUNT = 60 * 12 * 60 * HOUR_SLOTS * 2
+BLOCK_SIZE = 60 * HOUR_SLOTS * 2  # 同一 (年柱, 月支) 的所有命盤，為建庫與續建的單位
+BLOCK_COUNT = CHART_COUNT // BLOCK_SIZE
+
+STRENGTHS = ['身強', '身弱', '中和']
+PATTERN_NAMES = ['正官格', '七殺格', '正財格', '偏財格', '食神格', '傷官格', '正印格', '偏印格', '建祿格', '羊刃格', '普通格局']
+NO_ELEMENT = 255
+
+BUILT = 1
+RECORD_DTYPE = np.dtype([
+    ('flags', 'u1'),           # bit0 = 已計算
+    ('strength', 'u1'),        # STRENGTHS 索引
+    ('xi_shen', 'u1'),         # FIVE_ELEMENTS 索引
+    ('yong_shen', 'u1'),
+    ('ji_shen', 'u1', (2,)),   # 五行索引，依原順序，不足補 NO_ELEMENT
+    ('patterns', '<u2'),       # PATTERN_NAMES 位元
+    ('rating', '<u2'),         # 命格總評 × 10
+    ('scores', '<u2', (5,)),   # 五行分數 × 10 (木火土金水)
+    ('shen_sha', '<u8', (4,)), # 四柱神煞遮罩
+])
+# 與 RECORD_DTYPE 相同的緊密排列，查詢時直接從映射緩衝區解包，避免建立 numpy 純量
+RECORD_STRUCT = struct.Struct('<BBBB2BHH5H4Q')
+
+
+def jiazi_index(code):
+    """120 編碼 (天干 * 12 + 地支) 轉六十甲子序號；陰陽不符時回傳 None"""
+    s, b = divmod(code, 12)
+    if (s - b) % 2:
+        return None
+    return (6 * s - 5 * b) % 60
+
+
+def month_stem(y_s, m_b):
+    """五虎遁：由年干推月干"""
+    return (y_s % 5 * 2 + (m_b - 2) % 12 + 2) % 10
+
+
+def hour_stem(d_s, h_b):
+    """五鼠遁：由日干推時干"""
+    return (d_s % 5 * 2 + h_b) % 10
+
+
+def chart_index(bazi):
+    """命盤在結果庫中的編號；不在有效空間內 (如月干與年干不符) 時回傳 None"""
+    (y_s, m_s, d_s, h_s), (y_b, m_b, d_b, h_b) = bazi.stem_idx, bazi.branch_idx
+    y, d = jiazi_index(y_s * 12 + y_b), jiazi_index(d_s * 12 + d_b)
+    if y is None or d is None:
+        return None
+    if m_s != month_stem(y % 10, m_b):
+        return None
+    if h_s == hour_stem(d % 10, h_b):
+        slot = h_b
+    elif h_b == 0 and h_s == hour_stem((d + 1) % 10, 0):
+        slot = LATE_ZI
+    else:
+        return None
+    return (((y * 12 + m_b) * 60 + d) * HOUR_SLOTS + slot) * 2 + bazi.gender_code
+
+
+def chart_from_index(index):
+    rest, g = divmod(index, 2)
+    rest, slot = divmod(rest, HOUR_SLOTS)
+    rest, d = divmod(rest, 60)
+    y, m_b = divmod(rest, 12)
+    if slot == LATE_ZI:
+        h_s, h_b = hour_stem((d + 1) % 10, 0), 0
+    else:
+        h_s, h_b = hour_stem(d % 10, slot), slot
+    return Bazi.from_indices((y % 10, month_stem(y % 10, m_b), d % 10, h_s), (y % 12, m_b, d % 12, h_b), g)
+
+
+def chart_arrays(indices):
+    """chart_from_index 的陣列版本：編號陣列 -> (天干 (N,4), 地支 (N,4), 性別 (N,))"""
+    rest, g = np.divmod(np.asarray(indices, dtype=np.int64), 2)
+    rest, slot = np.divmod(rest, HOUR_SLOTS)
+    rest, d = np.divmod(rest, 60)
+    y, m_b = np.divmod(rest, 12)
+    late = slot == LATE_ZI
+    h_b = np.where(late, 0, slot)
+    h_s = hour_stem(np.where(late, d + 1, d) % 10, h_b)
+    stems = np.stack([y % 10, month_stem(y % 10, m_b), d % 10, h_s], axis=1)
+    branches = np.stack([y % 12, m_b, d % 12, h_b], axis=1)
+    return stems, branches, g
+
+
+def chart_indices(jiazi, gender_codes):
+    """chart_index 的陣列版本：四柱六十甲子序號 (N,4) (如 pillar_indices_batch 的輸出) + 性別 -> 編號 (N,)"""
+    y, m, d, h = np.asarray(jiazi, dtype=np.int64).T
+    h_b = h % 12
+    # 子時的時干不是由當日日干推得者為晚子時
+    slot = np.where((h_b == 0) & (h % 10 != hour_stem(d % 10, 0)), LATE_ZI, h_b)
+    return (((y * 12 + m % 12) * 60 + d) * HOUR_SLOTS + slot) * 2 + np.asarray(gender_codes, dtype=np.int64)
+
+
+def summarize(bazi):
+    """計算結果庫所存的摘要欄位 (神煞、五行分數、強弱、格局、喜用忌神、總評)"""
+    masks = shen_sha_masks(bazi)
+    five_elem_result = analyze_five_elements(bazi)
+    pattern_result = determine_pattern_and_yongshen(bazi, five_elem_result)
+    all_shen_sha = shen_sha_names(masks[0] | masks[1] | masks[2] | masks[3])
+    rating_result = get_overall_rating(five_elem_result, pattern_result, all_shen_sha)
+    return {
+        'shen_sha_masks': masks,
+        'shen_sha': [shen_sha_names(m) for m in masks],
+        'scores': {e: round(five_elem_result['scores'][e], 1) for e in FIVE_ELEMENTS},
+        'strength': five_elem_result['strength'],
+        'patterns': pattern_result['patterns'],
+        'xi_shen': pattern_result['xi_shen'],
+        'yong_shen': pattern_result['yong_shen'],
+        'ji_shen': pattern_result['ji_shen'],
+        'rating': rating_result['total'],
+    }
+
+
+def element_code(elem):
+    return FIVE_ELEMENTS.index(elem) if elem in FIVE_ELEMENTS else NO_ELEMENT
+
+
+def encode_summary(summary):
+    return (
+        0,
+        STRENGTHS.index(summary['strength']),
+        element_code(summary['xi_shen']),
+        element_code(summary['yong_shen']),
+        ([element_code(e) for e in summary['ji_shen']] + [NO_ELEMENT, NO_ELEMENT])[:2],
+        sum(1 << PATTERN_NAMES.index(p) for p in summary['patterns']),
+        round(summary['rating'] * 10),
+        [round(summary['scores'][e] * 10) for e in FIVE_ELEMENTS],
+        summary['shen_sha_masks'],
+    )
+
+
+def decode_record(fields):
+    """由 RECORD_STRUCT 解包後的欄位還原摘要"""
+    _, strength, xi, yong, ji_1, ji_2, patterns, rating = fields[:8]
+    masks = list(fields[13:17])
+    return {
+        'shen_sha_masks': masks,
+        'shen_sha': [shen_sha_names(m) for m in masks],
+        'scores': {e: v / 10 for e, v in zip(FIVE_ELEMENTS, fields[8:13])},
+        'strength': STRENGTHS[strength],
+        'patterns': [p for i, p in enumerate(PATTERN_NAMES) if (patterns >> i) & 1],
+        'xi_shen': FIVE_ELEMENTS[xi] if xi != NO_ELEMENT else '',
+        'yong_shen': FIVE_ELEMENTS[yong] if yong != NO_ELEMENT else '',
+        'ji_shen': [FIVE_ELEMENTS[e] for e in (ji_1, ji_2) if e != NO_ELEMENT],
+        'rating': rating / 10,
+    }
+
+
+def build_block_chunk(block_ids):
+    """在工作程序中計算一批區塊，回傳 [(區塊編號, 紀錄陣列)]"""
+    out = []
+    for block_id in block_ids:
+        start = block_id * BLOCK_SIZE
+        records = np.array([encode_summary(summarize(chart_from_index(start + i))) for i in range(BLOCK_SIZE)], dtype=RECORD_DTYPE)
+        out.append((block_id, records))
+    return out
+
+
+def build_store(path=DEFAULT_STORE_PATH, workers=None, chunksize=4, log=sys.stderr):
+    """平行建立結果庫；中斷後重跑會從未完成的區塊接續"""
+    if os.path.exists(path):
+        data = open_memmap(path, mode='r+')
+        if data.dtype != RECORD_DTYPE or data.shape != (CHART_COUNT,):
+            raise ValueError(f"{path} 不是 v{STORE_VERSION} 結果庫")
+    else:
+        data = open_memmap(path, mode='w+', dtype=RECORD_DTYPE, shape=(CHART_COUNT,))
+
+    built = (data['flags'].reshape(BLOCK_COUNT, BLOCK_SIZE) & BUILT).astype(bool).all(axis=1)
+    todo = np.flatnonzero(~built).tolist()
+    done = BLOCK_COUNT - len(todo)
+    start_time = time.perf_counter()
+    for block_id, records in map_chunks(build_block_chunk, todo, workers=workers, chunksize=chunksize):
+        sl = slice(block_id * BLOCK_SIZE, (block_id + 1) * BLOCK_SIZE)
+        # 先寫資料再標記完成，中途中斷的區塊下次會整塊重算
+        data[sl] = records
+        data['flags'][sl] = BUILT
+        done += 1
+        if done % 32 == 0 or done == BLOCK_COUNT:
+            data.flush()
+            if log:
+                print(f"{done}/{BLOCK_COUNT} 區塊，{time.perf_counter() - start_time:.1f}s", file=log)
+    data.flush()
+    return path
+
+
+class ChartStore:
+    """唯讀結果庫：np.load(mmap_mode='r') 零複製載入，lookup 為 O(1)"""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self.data = np.load(path, mmap_mode='r')
+        if self.data.dtype != RECORD_DTYPE or self.data.shape != (CHART_COUNT,):
+            raise ValueError(f"{path} 不是 v{STORE_VERSION} 結果庫")
+        self.raw = self.data.view(np.uint8)
+
+    def lookup(self, bazi):
+        """查詢命盤摘要；不在有效空間內或尚未建庫的命盤回傳 None"""
+        index = chart_index(bazi)
+        if index is None:
+            return None
+        fields = RECORD_STRUCT.unpack_from(self.raw, index * RECORD_STRUCT.size)
+        if not fields[0] & BUILT:
+            return None
+        return decode_record(fields)
+
+    def records(self, indices):
+        """批次取出紀錄陣列 (RECORD_DTYPE)；尚未建庫的紀錄 flags 無 BUILT 位元"""
+        return self.data[np.asarray(indices, dtype=np.int64)]
+
+
+def open_store(path=DEFAULT_STORE_PATH):
+    """結果庫存在時回傳 ChartStore，否則回傳 None"""
+    return ChartStore(path) if os.path.exists(path) else None
+
+
+def chart_summary(bazi, store=None):
+    """優先查結果庫，查不到時即時計算"""
+    summary = store.lookup(bazi) if store is not None else None
+    return summary if summary is not None else summarize(bazi)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="建立全命盤預算結果庫 (可中斷續建)")
+    parser.add_argument('path', nargs='?', default=DEFAULT_STORE_PATH)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    build_store(args.path, workers=args.workers)
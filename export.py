@@ -0,0 +1,487 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from functools import lru_cache, partial
+from html.parser import HTMLParser
+
+from PIL import Image, ImageDraw, ImageFont
+
+from bazi_core import Bazi, REPORT_CSS, year_keyed
+from batch import map_chunks, record_datetime, record_pillars
+from report_cache import report_html
+
+# --- 報告匯出 (PDF / PNG) ---
+# 以 Pillow 在本機把完整報告 HTML (與 App / API 相同、經持久快取的 report_html) 排版成圖片，不需網路與瀏覽器：
+# 段落、標題、表格、清單與長條圖依報告樣式表 (REPORT_CSS) 的顏色與字級繪製，多欄格線改為單欄。
+# 排版結果是 (高度, 繪圖指令) 的項目列表：PDF 依頁高分頁，PNG 接成一張長圖。
+# 批次匯出走 map_chunks 程序池，每份報告在工作程序內直接寫檔，只回傳檔名；工作程序處理固定 chunk 數後重啟，記憶體不累積。
+
+FORMATS = {'pdf': 'application/pdf', 'png': 'image/png'}
+PAGE_SIZE = (1240, 1754)  # A4，150 dpi
+DPI = 150
+MARGIN = 90
+SCALE = 1.25              # 樣式表的 px -> 頁面像素
+BASE_SIZE = 16
+LINE_SPACING = 1.5
+TAG_SIZES = {'h2': 24, 'h4': 18}
+TEXT_COLOR = '#333333'
+BORDER_COLOR = '#cccccc'
+HEADER_FILL = '#f2f2f2'
+TRACK_FILL = '#eeeeee'
+CELL_PADDING = 8
+FONT_CANDIDATES = (
+    'C:/Windows/Fonts/kaiu.ttf',   # 標楷體，與報告樣式表相同
+    'C:/Windows/Fonts/msjh.ttc',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+)
+EXPORT_CHUNKSIZE = 4
+MAX_TASKS_PER_CHILD = 50  # 每個工作程序處理的 chunk 數上限，之後換新程序
+RETRIES = 2
+PROGRESS_EVERY = 25
+
+
+@lru_cache(maxsize=1)
+def font_path():
+    """中文字型：環境變數 BAZI_FONT_PATH，否則依序找常見的系統字型"""
+    path = os.environ.get('BAZI_FONT_PATH') or next((p for p in FONT_CANDIDATES if os.path.exists(p)), None)
+    if path is None:
+        raise RuntimeError("找不到中文字型，請以環境變數 BAZI_FONT_PATH 指定 .ttf / .ttc 字型檔")
+    return path
+
+
+@lru_cache(maxsize=64)
+def font(size):
+    return ImageFont.truetype(font_path(), round(size * SCALE))
+
+
+@lru_cache(maxsize=65536)
+def char_width(size, ch):
+    return font(size).getlength(ch)
+
+
+# --- 樣式表 -> 排版樣式 ---
+# 只取單一 class (或「祖先 class + class」) 選擇器的顏色、背景、字級、粗體與對齊；段落的 --c / --th 變數直接當作強調色與表頭底色。
+
+CSS_PROPERTIES = {'color': 'color', 'background': 'fill', '--c': 'accent', '--th': 'th', 'text-align': 'align'}
+
+
+def parse_css(css):
+    styles = {}
+    for selectors, body in re.findall(r'([^{}]+)\{([^}]*)\}', css):
+        props = {}
+        for decl in body.split(';'):
+            name, _, value = decl.partition(':')
+            name, value = name.strip(), value.strip()
+            if name in CSS_PROPERTIES and (value.startswith('#') or name == 'text-align'):
+                props[CSS_PROPERTIES[name]] = value
+            elif name == 'font-size' and value.endswith('px'):
+                props['size'] = int(value[:-2])
+            elif name == 'font-weight':
+                props['bold'] = value == 'bold'
+        for selector in selectors.split(','):
+            match = re.fullmatch(r'(?:\.[\w-]+\s+)?\.([\w-]+)', selector.strip())
+            if match and props:
+                styles.setdefault(match.group(1), {}).update(props)
+    return styles
+
+
+CLASS_STYLES = parse_css(REPORT_CSS)
+BASE_STYLE = {'color': TEXT_COLOR, 'size': BASE_SIZE, 'bold': False, 'align': 'left'}
+
+
+def clean_text(text):
+    """去掉中文字型沒有的表情符號"""
+    return ''.join(c for c in text if unicodedata.category(c) != 'So' and c != '\ufe0f')
+
+
+# --- 排版 ---
+# 每個項目是 (高度, [繪圖指令])，指令的 y 座標相對於項目頂端：
+# ('text', x, y, 文字, 字級, 顏色, 粗體) / ('rect', x0, y0, x1, y1, 填色, 框線色)
+
+class Layout:
+    def __init__(self, width):
+        self.width = width
+        self.items = []
+
+    def space(self, px):
+        self.items.append((round(px * SCALE), []))
+
+    def wrap(self, runs, width):
+        """[(文字, 樣式)] 依寬度逐字換行 (中文無詞間空白)，回傳 [(行高, [(x, 文字, 樣式)])]"""
+        lines, segments, x = [], [], 0.0
+
+        def flush():
+            size = max((style['size'] for _, _, style in segments), default=BASE_SIZE)
+            lines.append((round(size * SCALE * LINE_SPACING), segments))
+
+        for text, style in runs:
+            for ch in text:
+                if ch == '\n':
+                    flush()
+                    segments, x = [], 0.0
+                    continue
+                w = char_width(style['size'], ch)
+                if x + w > width and segments:
+                    flush()
+                    segments, x = [], 0.0
+                if segments and segments[-1][2] is style:
+                    segments[-1] = (segments[-1][0], segments[-1][1] + ch, style)
+                else:
+                    segments.append((x, ch, style))
+                x += w
+        if segments:
+            flush()
+        return lines
+
+    def text_ops(self, lines, left, top, width, align):
+        ops, y = [], top
+        for height, segments in lines:
+            if segments:
+                last_x, last_text, last_style = segments[-1]
+                line_width = last_x + font(last_style['size']).getlength(last_text)
+                shift = left + ((width - line_width) / 2 if align == 'center' else width - line_width if align == 'right' else 0)
+                ops += [('text', round(shift + x), y + height // 6, text, style['size'], style['color'], style['bold'])
+                        for x, text, style in segments]
+            y += height
+        return ops, y - top
+
+    def paragraph(self, runs, style):
+        runs = [(clean_text(text), s) for text, s in runs]
+        if not ''.join(text for text, _ in runs).strip():
+            return
+        for line in self.wrap(runs, self.width):
+            ops, height = self.text_ops([line], 0, 0, self.width, style['align'])
+            self.items.append((height, ops))
+
+    def heading(self, runs, style, rule):
+        self.space(12)
+        self.paragraph(runs, style)
+        if rule:
+            self.items.append((round(8 * SCALE), [('rect', 0, 0, self.width, 2, style['color'], None)]))
+
+    def table(self, rows):
+        """rows：[(儲存格列表, 是否表頭)]，儲存格為 (runs, 樣式)；欄寬平均分配，每列一個項目 (可在列之間分頁)"""
+        columns = max((len(cells) for cells, _ in rows), default=0)
+        if not columns:
+            return
+        col_width = self.width / columns
+        pad = round(CELL_PADDING * SCALE)
+        for cells, header in rows:
+            wrapped = [self.wrap([(clean_text(t), s) for t, s in runs], col_width - 2 * pad) for runs, _ in cells]
+            height = max(sum(h for h, _ in lines) for lines in wrapped) + 2 * pad
+            ops = []
+            for i, ((runs, style), lines) in enumerate(zip(cells, wrapped)):
+                x0, x1 = round(i * col_width), round((i + 1) * col_width)
+                fill = style.get('th', HEADER_FILL) if header else None
+                ops.append(('rect', x0, 0, x1, height, fill, BORDER_COLOR))
+                text_height = sum(h for h, _ in lines)
+                text, _ = self.text_ops(lines, x0 + pad, (height - text_height) // 2, x1 - x0 - 2 * pad,
+                                        'center' if header else style['align'])
+                ops += text
+            self.items.append((height, ops))
+
+    def bar(self, label, value, fraction, fill, small):
+        """五行 / 評分長條：標籤、軌道與填色、數值"""
+        label_width, value_width, track = (80, 50, 20) if small else (40, 60, 25)
+        label_width, value_width, track = (round(v * SCALE) for v in (label_width, value_width, track))
+        gap = round(10 * SCALE)
+        height = track + gap
+        x0, x1 = label_width + gap, self.width - value_width - gap
+        style = dict(BASE_STYLE, bold=not small)
+        ops = [('text', 0, gap // 2, clean_text(label), style['size'], style['color'], style['bold']),
+               ('rect', x0, gap // 2, x1, gap // 2 + track, TRACK_FILL, None)]
+        if fraction > 0:
+            ops.append(('rect', x0, gap // 2, x0 + round((x1 - x0) * min(fraction, 1.0)), gap // 2 + track, fill, None))
+        value_x = self.width - font(style['size']).getlength(value)
+        ops.append(('text', round(value_x), gap // 2, value, style['size'], style['color'], True))
+        self.items.append((height, ops))
+
+
+class ReportParser(HTMLParser):
+    """報告 HTML -> Layout 項目；只處理報告模板用到的標籤"""
+
+    BLOCKS = ('h2', 'h4', 'p', 'li')
+
+    def __init__(self, layout):
+        super().__init__()
+        self.layout = layout
+        self.stack = [('', (), BASE_STYLE)]
+        self.runs = None      # 目前段落
+        self.cell = None      # 目前儲存格
+        self.row = None
+        self.header_row = False
+        self.rows = None
+        self.bar = None
+        self.in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = tuple(attrs.get('class', '').split())
+        style = dict(self.stack[-1][2])
+        for name in classes:
+            style.update(CLASS_STYLES.get(name, {}))
+        if tag in TAG_SIZES:
+            style.update(size=TAG_SIZES[tag], bold=True)
+        if tag == 'h2':
+            style.update(color=style.get('accent', TEXT_COLOR), align='center')
+        if tag == 'b':
+            style['bold'] = True
+
+        if tag == 'br':
+            target = self.cell if self.cell is not None else self.runs
+            if target is not None:
+                target.append(('\n', style))
+            return
+        if tag == 'style':
+            self.in_style = True
+        elif 'bz-sec' in classes:
+            self.layout.space(24)
+        elif 'bz-bar' in classes:
+            self.bar = {'texts': [], 'small': 'sm' in classes, 'fill': TRACK_FILL, 'fraction': 0.0}
+        elif 'bz-fill' in classes and self.bar is not None:
+            width = re.search(r'width:\s*([\d.]+)%', attrs.get('style', ''))
+            self.bar['fraction'] = float(width.group(1)) / 100 if width else 0.0
+            self.bar['fill'] = style.get('fill', TRACK_FILL)
+        elif tag == 'table':
+            self.rows = []
+        elif tag == 'tr':
+            self.row, self.header_row = [], False
+        elif tag in ('td', 'th'):
+            self.cell = []
+            self.header_row = self.header_row or tag == 'th'
+        elif tag in self.BLOCKS:
+            self.runs = [('• ', style)] if tag == 'li' else []
+        self.stack.append((tag, classes, style))
+
+    def handle_endtag(self, tag):
+        if tag == 'br':
+            return
+        _, classes, style = self.stack.pop()
+        if tag == 'style':
+            self.in_style = False
+        elif 'bz-bar' in classes and self.bar is not None:
+            texts = self.bar['texts']
+            self.layout.bar(texts[0] if texts else '', texts[-1] if len(texts) > 1 else '',
+                            self.bar['fraction'], self.bar['fill'], self.bar['small'])
+            self.bar = None
+        elif tag in ('td', 'th') and self.row is not None:
+            self.row.append((self.cell, style))
+            self.cell = None
+        elif tag == 'tr' and self.rows is not None:
+            self.rows.append((self.row, self.header_row))
+            self.row = None
+        elif tag == 'table':
+            self.layout.table(self.rows or [])
+            self.rows = None
+        elif tag in self.BLOCKS and self.runs is not None:
+            if tag == 'h2':
+                self.layout.heading(self.runs, style, rule=True)
+            elif tag == 'h4':
+                self.layout.heading(self.runs, style, rule=False)
+            else:
+                self.layout.paragraph(self.runs, style)
+            self.runs = None
+
+    def handle_data(self, data):
+        if self.in_style:
+            return
+        style = self.stack[-1][2]
+        if self.bar is not None:
+            if data.strip():
+                self.bar['texts'].append(data.strip())
+        elif self.cell is not None:
+            self.cell.append((data, style))
+        elif self.runs is not None:
+            self.runs.append((data, style))
+        elif data.strip():
+            self.layout.paragraph([(data.strip(), style)], style)
+
+
+# --- 繪製 ---
+
+def paint(image, ops, left, top):
+    draw = ImageDraw.Draw(image)
+    for op in ops:
+        if op[0] == 'text':
+            _, x, y, text, size, color, bold = op
+            draw.text((left + x, top + y), text, font=font(size), fill=color,
+                      stroke_width=1 if bold else 0, stroke_fill=color)
+        else:
+            _, x0, y0, x1, y1, fill, outline = op
+            draw.rectangle((left + x0, top + y0, left + x1, top + y1), fill=fill, outline=outline)
+
+
+def report_layout(html, width=PAGE_SIZE[0] - 2 * MARGIN):
+    layout = Layout(width)
+    parser = ReportParser(layout)
+    parser.feed(html)
+    parser.close()
+    return layout.items
+
+
+def paginate(items, page_height=PAGE_SIZE[1] - 2 * MARGIN):
+    """項目依序放入頁面，放不下時換頁 (頁首的空白項目略過)，回傳 [[(y, 繪圖指令)]]"""
+    pages, page, y = [], [], 0
+    for height, ops in items:
+        if y + height > page_height and page:
+            pages.append(page)
+            page, y = [], 0
+        if not ops and not page:
+            continue
+        page.append((y, ops))
+        y += height
+    if page:
+        pages.append(page)
+    return pages
+
+
+def render_pages(items):
+    for page in paginate(items):
+        image = Image.new('RGB', PAGE_SIZE, 'white')
+        for y, ops in page:
+            paint(image, ops, MARGIN, MARGIN + y)
+        yield image
+
+
+def render_report(html, fmt, stream):
+    """報告 HTML 排版後以 fmt ('pdf' 多頁 / 'png' 單張長圖) 寫入 stream"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的格式：{fmt} (可用：{'、'.join(FORMATS)})")
+    items = report_layout(html)
+    if fmt == 'png':
+        image = Image.new('RGB', (PAGE_SIZE[0], sum(h for h, _ in items) + 2 * MARGIN), 'white')
+        y = MARGIN
+        for height, ops in items:
+            paint(image, ops, MARGIN, y)
+            y += height
+        image.save(stream, 'PNG', optimize=True, dpi=(DPI, DPI))
+    else:
+        first, *rest = render_pages(items)
+        first.save(stream, 'PDF', save_all=True, append_images=rest, resolution=DPI)
+
+
+@year_keyed
+@lru_cache(maxsize=16)
+def report_bytes(year, month, day, hour, gender, fmt='pdf', birth=None, *, analysis_year):
+    """單一命盤的匯出檔內容 (App 下載按鈕使用)；birth 為含時刻的 datetime 時大運段落使用實際起運歲數"""
+    stream = io.BytesIO()
+    render_report(report_html(year, month, day, hour, gender, birth, analysis_year=analysis_year), fmt, stream)
+    return stream.getvalue()
+
+
+def report_filename(pillars, gender, fmt, name=None, row=None):
+    """檔名：[列號_][名稱_]四柱_性別.副檔名；批次匯出一律帶列號，同命盤或同 id 的紀錄不會互相覆蓋"""
+    parts = [f"{row:06d}"] if row is not None else []
+    if name not in (None, ''):
+        parts.append(re.sub(r'[^\w.-]+', '_', str(name)))
+    return '_'.join(parts + [''.join(pillars), gender]) + f".{fmt}"
+
+
+# --- 批次匯出 ---
+# 每筆紀錄在工作程序內單獨 try：格式錯誤的紀錄記為略過，排版 / 寫檔失敗的記為失敗，主程序跑完後逐筆單獨重試，不中斷整批。
+
+def export_record(row_no, record, out_dir, fmt):
+    """單筆紀錄匯出到 out_dir，回傳 {'row', 'path'}；錯誤時回傳 {'row', 'error', 'retry'}"""
+    try:
+        if isinstance(record, str):
+            record = json.loads(record)
+        pillars = record_pillars(record)
+        bazi = Bazi(*pillars, record['gender'])
+        # 有出生時刻 (datetime 或 date 欄位) 時大運使用實際起運歲數；只給四柱時為 None
+        birth = record_datetime(record) if record.get('datetime') or record.get('date') else None
+    except (KeyError, TypeError, ValueError) as e:
+        return {'row': row_no, 'error': f"{type(e).__name__}: {e}", 'retry': False}
+    path = os.path.join(out_dir, report_filename(pillars, bazi.gender, fmt, record.get('id'), row_no))
+    try:
+        with open(path + '.part', 'wb') as f:
+            render_report(report_html(*pillars, bazi.gender, birth), fmt, f)
+        os.replace(path + '.part', path)
+    except Exception as e:
+        if os.path.exists(path + '.part'):
+            os.remove(path + '.part')
+        return {'row': row_no, 'error': f"{type(e).__name__}: {e}", 'retry': True, 'record': record}
+    return {'row': row_no, 'path': path}
+
+
+def export_chunk(rows, out_dir, fmt):
+    return [export_record(row_no, record, out_dir, fmt) for row_no, record in rows]
+
+
+def export_many(rows, out_dir, fmt='pdf', workers=None, chunksize=EXPORT_CHUNKSIZE, retries=RETRIES, log=sys.stderr):
+    """(列號, 紀錄) 串流逐筆匯出，回傳 (成功筆數, 失敗結果列表)；進度每 PROGRESS_EVERY 筆寫到 log"""
+    os.makedirs(out_dir, exist_ok=True)
+    font_path()  # 缺字型時在啟動程序池前就失敗
+    ok, failed, retry = 0, [], []
+    start = time.perf_counter()
+
+    def progress(done, final=False):
+        if log and (final or done % PROGRESS_EVERY == 0):
+            elapsed = time.perf_counter() - start
+            print(f"{'完成' if final else '進度'}：{done:,} 筆 (成功 {ok:,}，失敗 {len(failed) + len(retry):,})，"
+                  f"{elapsed:.1f}s，{done / elapsed if elapsed else 0:.1f} 份/s", file=log)
+
+    done = 0
+    for result in map_chunks(partial(export_chunk, out_dir=out_dir, fmt=fmt), rows, workers=workers,
+                             chunksize=chunksize, max_tasks_per_child=MAX_TASKS_PER_CHILD):
+        done += 1
+        if 'path' in result:
+            ok += 1
+        elif result['retry']:
+            retry.append(result)
+        else:
+            failed.append(result)
+        progress(done)
+
+    # 失敗的紀錄各自單獨重試 (chunksize=1)，一筆的錯誤不會再連帶同一 chunk 的其他紀錄
+    for attempt in range(1, retries + 1):
+        if not retry:
+            break
+        if log:
+            print(f"第 {attempt} 次重試：{len(retry):,} 筆", file=log)
+        pending, retry = retry, []
+        for result in map_chunks(partial(export_chunk, out_dir=out_dir, fmt=fmt),
+                                 [(r['row'], r['record']) for r in pending], workers=workers, chunksize=1):
+            if 'path' in result:
+                ok += 1
+            else:
+                retry.append(result)
+    failed += retry
+    retry = []
+    progress(done, final=True)
+    for result in failed:
+        if log:
+            print(f"失敗第 {result['row']} 列：{result['error']}", file=log)
+    return ok, failed
+
+
+if __name__ == "__main__":
+    from bulk import detect_format, read_rows
+
+    parser = argparse.ArgumentParser(description="由 CSV / JSONL 客戶名冊批次匯出完整報告 (PDF / PNG)")
+    parser.add_argument('input', nargs='?', default='-', help="輸入檔 (預設 stdin)；紀錄需有出生時刻或 pillars，以及 gender，可選 id 作為檔名前綴")
+    parser.add_argument('-o', '--output', default='reports', help="輸出目錄")
+    parser.add_argument('--format', dest='fmt', choices=list(FORMATS), default='pdf')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'], default=None, help="預設依副檔名或內容判斷")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=EXPORT_CHUNKSIZE)
+    parser.add_argument('--retries', type=int, default=RETRIES)
+    args = parser.parse_args()
+
+    if args.input == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        stream = open(args.input, encoding='utf-8-sig', newline='')
+    with stream:
+        input_format, rows = detect_format(stream, args.input) if args.input_format is None else (args.input_format, stream)
+        _, failed = export_many(read_rows(rows, input_format), args.output, args.fmt, workers=args.workers,
+                                chunksize=args.chunksize, retries=args.retries)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+import argparse
+import sys
+from functools import lru_cache
+
+import numpy as np
+import plotly.graph_objects as go
+
+from bazi_core import Bazi, FIVE_ELEMENTS, TEN_GODS, RULES_VERSION, cached_analysis, year_keyed
+from report_cache import chart_key, default_cache
+
+# --- 互動圖表 (Plotly) ---
+# 五行分數、十神分布與大運 / 流年吉凶曲線。數值以 numpy 小型別 (int8 / int16 / float32) 傳入，
+# Plotly 會編碼成 base64 型別陣列；逐年的 x 軸用 x0 + dx 表示不送陣列，樣板用 'none'，讓每張圖的 JSON 維持在 1-2 KB。
+# 圖表 JSON 依命盤鍵只產生一次：程序內 LRU，另寫入持久快取 (report_cache) 供其他程序與重啟後使用。
+
+FIGURE_VERSION = 1
+ELEMENT_COLORS = ('#27ae60', '#e74c3c', '#f39c12', '#bdc3c7', '#3498db')  # 與報告樣式表 .e0-.e4 相同
+LUCK_SCORES = {'吉': 1, '平': 0, '凶': -1}
+LAYOUT = dict(template='none', height=320, margin=dict(l=40, r=20, t=50, b=40), font=dict(family='標楷體'))
+
+
+def element_figure(analysis, dayun=None):
+    fe = analysis['five_elements']
+    scores = np.array([fe['scores'][e] for e in FIVE_ELEMENTS], dtype=np.float32).round(1)
+    fig = go.Figure(go.Bar(x=FIVE_ELEMENTS, y=scores, marker_color=ELEMENT_COLORS, hovertemplate='%{x}：%{y:.1f}<extra></extra>'))
+    fig.update_layout(title=f"五行分數 (日主{fe['day_master']}{fe['day_element']}，{fe['strength']})", **LAYOUT)
+    return fig
+
+
+def ten_god_figure(analysis, dayun=None):
+    pattern = analysis['pattern']
+    weights = np.array([pattern['ten_gods'].get(t, 0) for t in TEN_GODS], dtype=np.float32).round(2)
+    fig = go.Figure(go.Bar(x=TEN_GODS, y=weights, marker_color='#9b59b6', hovertemplate='%{x}：%{y:.2f}<extra></extra>'))
+    fig.update_layout(title=f"十神分布 ({'、'.join(pattern['patterns'])})", **LAYOUT)
+    return fig
+
+
+def luck_figure(analysis, dayun=None):
+    """大運吉凶為階梯線；有百年時間軸 (含出生時刻) 時另畫逐年流年，並標出分析年"""
+    dayun = dayun or analysis['dayun']
+    steps = dayun['dayun_list']
+    fig = go.Figure()
+    if 'liunian' in dayun:
+        liunian = dayun['liunian']
+        first_year = liunian['year'][0]
+        step_luck = {d['pillar']: LUCK_SCORES[d['luck']] for d in steps}
+        fig.add_trace(go.Scatter(
+            x0=first_year, dx=1, y=np.array([step_luck.get(p, 0) for p in liunian['dayun']], dtype=np.int8),
+            name='大運', mode='lines', line=dict(shape='hv', width=3, color='#2c3e50'),
+            text=[p or '起運前' for p in liunian['dayun']], hovertemplate='%{x} 大運%{text}<extra></extra>',
+        ))
+        fig.add_trace(go.Scatter(
+            x0=first_year, dx=1, y=np.array([LUCK_SCORES[v] for v in liunian['luck']], dtype=np.int8),
+            name='流年', mode='markers', marker=dict(size=5, color='#e67e22'),
+            text=liunian['pillar'], hovertemplate='%{x} 流年%{text}<extra></extra>',
+        ))
+        fig.add_vline(x=dayun['analysis_year'], line_dash='dot', line_color='#c0392b')
+        fig.update_xaxes(title='年份')
+    else:
+        fig.add_trace(go.Scatter(
+            x=[d['age_range'] for d in steps], y=np.array([LUCK_SCORES[d['luck']] for d in steps], dtype=np.int8),
+            name='大運', mode='lines+markers', line=dict(shape='hv', width=3, color='#2c3e50'),
+            text=[d['pillar'] for d in steps], hovertemplate='%{x} 大運%{text}<extra></extra>',
+        ))
+    fig.update_yaxes(range=[-1.5, 1.5], tickvals=[-1, 0, 1], ticktext=['凶', '平', '吉'])
+    fig.update_layout(title=f"大運流年吉凶 ({dayun['direction']})", **LAYOUT)
+    return fig
+
+
+# 圖表名稱 -> 建圖函式 (analysis, dayun)；報告段落鍵 -> 該段落下方顯示的圖表
+FIGURES = {'elements': element_figure, 'ten_gods': ten_god_figure, 'luck': luck_figure}
+SECTION_FIGURES = {'five_elements': 'elements', 'pattern': 'ten_gods', 'dayun': 'luck'}
+
+
+def build_figure_json(name, pillars, gender, birth=None, analysis_year=None):
+    """建圖並輸出 JSON 字串；luck 圖有出生時刻時使用百年時間軸，並標出 analysis_year (預設今年)"""
+    analysis = cached_analysis(*pillars, gender, analysis_year=analysis_year)
+    dayun = None
+    if name == 'luck' and birth is not None:
+        from timeline import life_timeline
+        dayun = life_timeline(Bazi(*pillars, gender), birth, analysis['pattern'], analysis_year=analysis['analysis_year'])
+    return FIGURES[name](analysis, dayun).to_json()
+
+
+@year_keyed
+@lru_cache(maxsize=1024)
+def figure_json(name, pillars, gender, birth=None, cache=None, *, analysis_year):
+    """圖表 JSON；pillars 為 tuple，birth 為 datetime 或 None。先查程序內 LRU (含分析年)，再查持久快取"""
+    cache = cache or default_cache()
+    build = lambda: build_figure_json(name, pillars, gender, birth, analysis_year)
+    if cache is None:
+        return build()
+    # 出生時刻只影響 luck 圖，放進版本欄位區分
+    version = f"f{FIGURE_VERSION}r{RULES_VERSION}" + (f"@{birth.isoformat()}" if birth is not None and name == 'luck' else '')
+    return cache.get_or_create(f'figure:{name}', chart_key(pillars, gender, analysis_year, version=version), build)
+
+
+def chart_figures(pillars, gender, birth=None, analysis_year=None):
+    """所有圖表組成的 JSON 物件字串 (直接拼接快取的圖表 JSON，不重新序列化)"""
+    return '{' + ','.join(f'"{name}":{figure_json(name, tuple(pillars), gender, birth, analysis_year=analysis_year)}'
+                          for name in FIGURES) + '}'
+
+
+if __name__ == "__main__":
+    from batch import record_datetime, record_pillars
+
+    parser = argparse.ArgumentParser(description="輸出命盤的 Plotly 圖表 JSON")
+    parser.add_argument('--datetime', help="出生時刻 (ISO 8601)；有出生時刻時流年曲線使用百年時間軸")
+    parser.add_argument('--pillars', help="四柱，以逗號分隔")
+    parser.add_argument('--gender', default='男')
+    args = parser.parse_args()
+
+    record = {'datetime': args.datetime, 'pillars': args.pillars}
+    birth = record_datetime(record) if args.datetime else None
+    sys.stdout.reconfigure(encoding='utf-8')
+    print(chart_figures(record_pillars(record), args.gender, birth))
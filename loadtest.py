@@ -0,0 +1,96 @@
+import argparse
+import datetime
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# --- API 壓力測試 (對本機 api.py) ---
+# 每個執行緒保持一條 keep-alive 連線；請求內容由固定亂數種子產生，結果可重現。
+
+
+def sample_records(count, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(1900, 1, 1)
+    span = int((datetime.datetime(2100, 12, 31, 23) - start).total_seconds() // 3600)
+    for _ in range(count):
+        dt = start + datetime.timedelta(hours=rng.randrange(span))
+        yield {'datetime': dt.isoformat(), 'gender': rng.choice(['男', '女'])}
+
+
+def build_requests(endpoint, count, batch_size, seed):
+    """回傳 [(method, path, body)]"""
+    if endpoint == 'batch':
+        records = list(sample_records(count * batch_size, seed))
+        return [('POST', '/batch', json.dumps(records[i:i + batch_size], ensure_ascii=False).encode())
+                for i in range(0, len(records), batch_size)]
+    return [('POST', f'/{endpoint}', json.dumps(r, ensure_ascii=False).encode()) for r in sample_records(count, seed)]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def run(url, requests, concurrency):
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    queue = iter(enumerate(requests))
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        while True:
+            with lock:
+                item = next(queue, None)
+            if item is None:
+                break
+            _, (method, path, body) = item
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+                ok, resp = False, e
+            elapsed = time.perf_counter() - t0
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(getattr(resp, 'status', resp))
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="對本機八字 API 做壓力測試")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--endpoint', choices=['chart', 'analysis', 'batch'], default='analysis')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=100, help="/batch 每個請求的紀錄數")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    requests = build_requests(args.endpoint, args.requests, args.batch_size, args.seed)
+    elapsed, latencies, errors = run(args.url, requests, args.concurrency)
+    charts = len(requests) * (args.batch_size if args.endpoint == 'batch' else 1)
+    print(f"{args.endpoint}: {len(requests)} 請求 / {elapsed:.2f}s = {len(requests) / elapsed:,.1f} req/s，{charts / elapsed:,.0f} 盤/s")
+    print("延遲 (ms)：p50 {:.1f} / p90 {:.1f} / p99 {:.1f} / max {:.1f}".format(
+        *(percentile(latencies, q) * 1000 for q in (50, 90, 99)), latencies[-1] * 1000 if latencies else 0.0))
+    print(f"錯誤：{len(errors)}", file=sys.stderr if errors else sys.stdout)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,233 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from bazi_core import (
+    Bazi, STEMS, BRANCHES, FIVE_ELEMENTS, ELEMENTS_MAP, GENDERS, HIDDEN_STEMS_DATA,
+    ELEMENT_STEM_WEIGHTS, ELEMENT_BRANCH_WEIGHTS, STEM_COMBOS, STEM_CLASHES,
+    BRANCH_SIX_COMBOS, BRANCH_SEMI_COMBOS, BRANCH_CLASHES, SELF_PUNISH_BRANCHES, cached_analysis,
+)
+from batch import record_pillars
+
+# --- 合婚配對 (一個命盤對大量候選人) ---
+# 合婚分數 = 干支關係分數 (日支夫妻宮、日干、年支的合沖刑，關係表與 analyze_all_interactions 共用)
+#          + 五行互補分數 (雙方五行合起來越均衡越高) + 喜用加分 (對方最旺的五行為我的喜神或用神)。
+# 關係分數只取決於候選人的 (日柱, 年支)，候選人依 (性別, 日柱, 年支) 排成連續的桶；
+# 每桶上限 = 關係分數 + 互補與加分上限，先由上限最高的桶定出第 k 名門檻，上限不到門檻的桶整桶略過不計分。
+
+DAY_BRANCH_SCORES = {'六合': 30, '半合': 15, '沖': -30, '自刑': -15}
+YEAR_BRANCH_SCORES = {'六合': 10, '半合': 5, '沖': -10, '自刑': -5}
+DAY_STEM_SCORES = {'合': 20, '沖': -15}
+COMPLEMENT_MAX = 40
+USEFUL_BONUS = 10
+# 五行佔比與均分 (0.2) 的絕對差總和，最大值為五行全集中於一行時的 1.6
+MAX_IMBALANCE = 1.6
+
+BUCKETS_PER_GENDER = 60 * 12
+BUCKET_COUNT = 2 * BUCKETS_PER_GENDER
+
+
+def branch_relations(a, b):
+    """兩個地支之間的關係：[(種類, 名稱)]"""
+    pair = tuple(sorted((a, b)))
+    found = []
+    if pair in BRANCH_SIX_COMBOS:
+        found.append(('六合', BRANCH_SIX_COMBOS[pair]))
+    if pair in BRANCH_SEMI_COMBOS:
+        found.append(('半合', BRANCH_SEMI_COMBOS[pair]))
+    if pair in BRANCH_CLASHES:
+        found.append(('沖', BRANCH_CLASHES[pair]))
+    if a == b and a in SELF_PUNISH_BRANCHES:
+        found.append(('自刑', f"{a}自刑"))
+    return found
+
+
+def stem_relations(a, b):
+    pair = tuple(sorted((a, b)))
+    found = []
+    if pair in STEM_COMBOS:
+        found.append(('合', STEM_COMBOS[pair]))
+    if pair in STEM_CLASHES:
+        found.append(('沖', STEM_CLASHES[pair]))
+    return found
+
+
+def relation_matrix(items, relations, scores):
+    return np.array([[sum(scores[kind] for kind, _ in relations(a, b)) for b in items] for a in items], dtype=np.float32)
+
+
+DAY_BRANCH_MATRIX = relation_matrix(BRANCHES, branch_relations, DAY_BRANCH_SCORES)
+YEAR_BRANCH_MATRIX = relation_matrix(BRANCHES, branch_relations, YEAR_BRANCH_SCORES)
+DAY_STEM_MATRIX = relation_matrix(STEMS, stem_relations, DAY_STEM_SCORES)
+
+# 與 analyze_five_elements 相同的計分：(柱位, 天干 / 地支) -> 五行分數向量
+STEM_ELEMENT_SCORES = np.zeros((4, 10, 5), dtype=np.float32)
+BRANCH_ELEMENT_SCORES = np.zeros((4, 12, 5), dtype=np.float32)
+for pos in range(4):
+    for s, stem in enumerate(STEMS):
+        STEM_ELEMENT_SCORES[pos, s, FIVE_ELEMENTS.index(ELEMENTS_MAP[stem])] += ELEMENT_STEM_WEIGHTS[pos]
+    for b, branch in enumerate(BRANCHES):
+        for h_stem, percentage in HIDDEN_STEMS_DATA.get(branch, []):
+            BRANCH_ELEMENT_SCORES[pos, b, FIVE_ELEMENTS.index(ELEMENTS_MAP[h_stem])] += ELEMENT_BRANCH_WEIGHTS[pos] * percentage / 100
+
+
+def element_shares(stem_idx, branch_idx):
+    """(N, 4) 天干、地支索引 -> (N, 5) 五行佔比"""
+    scores = sum(STEM_ELEMENT_SCORES[pos, stem_idx[:, pos]] + BRANCH_ELEMENT_SCORES[pos, branch_idx[:, pos]] for pos in range(4))
+    return scores / scores.sum(axis=1, keepdims=True)
+
+
+def useful_elements(bazi):
+    """命盤的喜神、用神五行索引"""
+    pattern = cached_analysis(*bazi.pillars, bazi.gender)['pattern']
+    return [FIVE_ELEMENTS.index(e) for e in (pattern['xi_shen'], pattern['yong_shen']) if e in FIVE_ELEMENTS]
+
+
+class CandidatePool:
+    """候選命盤池：依 (性別, 日柱, 年支) 排序成連續的桶，查詢時整桶剪枝、桶內以陣列計分"""
+
+    def __init__(self, ids, stem_idx, branch_idx, gender_codes):
+        stem_idx = np.asarray(stem_idx, dtype=np.int8).reshape(-1, 4)
+        branch_idx = np.asarray(branch_idx, dtype=np.int8).reshape(-1, 4)
+        gender_codes = np.asarray(gender_codes, dtype=np.int8)
+        day_jz = (6 * stem_idx[:, 2].astype(np.int64) - 5 * branch_idx[:, 2]) % 60
+        bucket = (gender_codes * 60 + day_jz) * 12 + branch_idx[:, 0]
+        order = np.argsort(bucket, kind='stable')
+        self.ids = [ids[i] for i in order.tolist()]
+        self.stem_idx = stem_idx[order]
+        self.branch_idx = branch_idx[order]
+        self.gender_codes = gender_codes[order]
+        self.shares = element_shares(self.stem_idx, self.branch_idx)
+        self.dominant = self.shares.argmax(axis=1).astype(np.int8)
+        # 第 i 桶為 offsets[i]:offsets[i + 1]
+        self.offsets = np.searchsorted(bucket[order], np.arange(BUCKET_COUNT + 1))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_charts(cls, charts, ids=None):
+        charts = list(charts)
+        return cls(
+            list(range(len(charts))) if ids is None else list(ids),
+            [bazi.stem_idx for bazi in charts],
+            [bazi.branch_idx for bazi in charts],
+            [bazi.gender_code for bazi in charts],
+        )
+
+    @classmethod
+    def from_records(cls, records, errors=None):
+        """由外部紀錄 (dict 或 JSON 字串；pillars 或出生時刻、gender、可選 id) 建立；無法解析的紀錄略過，(序號, 訊息) 記入 errors"""
+        charts, ids = [], []
+        for i, record in enumerate(records):
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                charts.append(Bazi(*record_pillars(record), record['gender']))
+            except (KeyError, TypeError, ValueError) as e:
+                if errors is not None:
+                    errors.append((i, f"{type(e).__name__}: {e}"))
+                continue
+            ids.append(record.get('id', i))
+        return cls.from_charts(charts, ids)
+
+    def bucket_relations(self, bazi):
+        """查詢命盤對每個 (日柱, 年支) 桶的關係分數，形狀 (60, 12)"""
+        d_s, d_b, y_b = bazi.stem_idx[2], bazi.branch_idx[2], bazi.branch_idx[0]
+        jz = np.arange(60)
+        day = DAY_STEM_MATRIX[d_s, jz % 10] + DAY_BRANCH_MATRIX[d_b, jz % 12]
+        return day[:, None] + YEAR_BRANCH_MATRIX[y_b][None, :]
+
+    def score_rows(self, rows, relation, query_shares, useful):
+        """候選人列的總分 = 關係分數 + 五行互補 + 喜用加分"""
+        imbalance = np.abs((self.shares[rows] + query_shares) / 2 - 0.2).sum(axis=1)
+        complement = COMPLEMENT_MAX * (1 - imbalance / MAX_IMBALANCE)
+        bonus = np.isin(self.dominant[rows], useful) * USEFUL_BONUS
+        return relation + complement + bonus
+
+    def top_matches(self, bazi, k=10, gender=None):
+        """與 bazi 最相配的 k 位候選人，分數由高到低；gender 預設為異性"""
+        target = 1 - bazi.gender_code if gender is None else GENDERS.index(gender)
+        relations = self.bucket_relations(bazi).ravel()
+        first = target * BUCKETS_PER_GENDER
+        starts = self.offsets[first:first + BUCKETS_PER_GENDER]
+        ends = self.offsets[first + 1:first + BUCKETS_PER_GENDER + 1]
+        sizes = ends - starts
+        upper = relations + COMPLEMENT_MAX + USEFUL_BONUS
+        order = np.argsort(-upper, kind='stable')
+        order = order[sizes[order] > 0]
+        if not len(order) or k <= 0:
+            return []
+
+        query_shares = element_shares(np.array([bazi.stem_idx]), np.array([bazi.branch_idx]))[0]
+        useful = useful_elements(bazi)
+
+        def gather(buckets):
+            rows = np.concatenate([np.arange(starts[b], ends[b]) for b in buckets.tolist()])
+            relation = np.repeat(relations[buckets], sizes[buckets])
+            return rows, self.score_rows(rows, relation, query_shares, useful)
+
+        # 上限最高的幾桶湊滿 k 人，定出第 k 名門檻；其餘桶只有上限達門檻才需要計分
+        enough = int(np.searchsorted(np.cumsum(sizes[order]), k)) + 1
+        rows, scores = gather(order[:enough])
+        if enough < len(order) and len(scores) >= k:
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            rest = order[enough:]
+            rest = rest[upper[rest] >= threshold]
+            if len(rest):
+                more_rows, more_scores = gather(rest)
+                rows, scores = np.concatenate([rows, more_rows]), np.concatenate([scores, more_scores])
+
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [self.describe(bazi, int(rows[i]), float(scores[i]), query_shares, useful) for i in top]
+
+    def describe(self, bazi, row, score, query_shares, useful):
+        """單一配對結果與理由"""
+        stems, branches = self.stem_idx[row].tolist(), self.branch_idx[row].tolist()
+        reasons = [f"日干 {name}" for _, name in stem_relations(bazi.stems[2], STEMS[stems[2]])]
+        reasons += [f"日支 {name}" for _, name in branch_relations(bazi.branches[2], BRANCHES[branches[2]])]
+        reasons += [f"年支 {name}" for _, name in branch_relations(bazi.branches[0], BRANCHES[branches[0]])]
+        imbalance = float(np.abs((self.shares[row] + query_shares) / 2 - 0.2).sum())
+        dominant = int(self.dominant[row])
+        if dominant in useful:
+            reasons.append(f"對方{FIVE_ELEMENTS[dominant]}旺，為我之喜用")
+        return {
+            'id': self.ids[row],
+            'pillars': [STEMS[s] + BRANCHES[b] for s, b in zip(stems, branches)],
+            'gender': GENDERS[int(self.gender_codes[row])],
+            'score': round(score, 1),
+            'complement': round(COMPLEMENT_MAX * (1 - imbalance / MAX_IMBALANCE), 1),
+            'reasons': reasons,
+        }
+
+
+if __name__ == "__main__":
+    import time
+
+    from bulk import detect_format, read_rows
+
+    parser = argparse.ArgumentParser(description="由候選名冊 (CSV / JSONL) 找出與指定命盤最相配的 k 位")
+    parser.add_argument('pool', help="候選名冊，欄位同 bulk.py (pillars 或出生時刻、gender、id)")
+    parser.add_argument('--datetime', help="查詢者出生時刻 (ISO 8601)")
+    parser.add_argument('--pillars', help="查詢者四柱，以逗號分隔")
+    parser.add_argument('--gender', choices=GENDERS, required=True)
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    query = {'gender': args.gender, 'datetime': args.datetime, 'pillars': args.pillars}
+    bazi = Bazi(*record_pillars(query), args.gender)
+    with open(args.pool, encoding='utf-8-sig', newline='') as stream:
+        fmt, rows = detect_format(stream, args.pool)
+        errors = []
+        start = time.perf_counter()
+        pool = CandidatePool.from_records((record for _, record in read_rows(rows, fmt)), errors)
+    print(f"候選池 {len(pool):,} 人 (略過 {len(errors):,} 筆)，建立 {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    start = time.perf_counter()
+    matches = pool.top_matches(bazi, args.k)
+    print(f"配對 {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    for match in matches:
+        print(json.dumps(match, ensure_ascii=False))
@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from bazi_core import FIVE_ELEMENTS, cached_analysis
+from report_cache import chart_key, default_cache
+
+# --- AI 命理解讀 ---
+# 由結構化分析結果 (cached_analysis) 組成提示詞，交給可替換的生成後端 (gemini / stub) 以串流方式產生解讀。
+# NarrativeService 在單一事件迴圈中限制同時呼叫數，同一命盤鍵的進行中請求只呼叫一次、其餘訂閱同一串流；每次呼叫皆有逾時。
+# 後端由環境變數 BAZI_NARRATIVE_BACKEND 選擇 (未設定時有 GOOGLE_API_KEY 才啟用 gemini)；stub 不連網，供測試與壓測。
+# 指定持久快取 (report_cache) 時，完整生成的解讀會寫入快取，之後同鍵的請求不再呼叫後端。
+
+PROMPT_VERSION = 1
+DEFAULT_MODEL = os.environ.get('BAZI_NARRATIVE_MODEL', 'gemini-1.5-flash')
+DEFAULT_CONCURRENCY = int(os.environ.get('BAZI_NARRATIVE_CONCURRENCY', 4))
+DEFAULT_TIMEOUT = float(os.environ.get('BAZI_NARRATIVE_TIMEOUT', 60))
+
+SYSTEM_INSTRUCTION = (
+    "你是資深的八字命理師。請只根據使用者提供的排盤與分析結果，以繁體中文寫一篇約 600 字的命理解讀，"
+    "分為整體格局、性格、事業財運、感情婚姻、健康、大運建議六段；語氣溫和具體，不要捏造資料中沒有的神煞或運勢。"
+)
+
+
+def narrative_key(analysis):
+    """解讀的快取 / 去重鍵：四柱|性別|分析年|提示詞版本 (提示詞含流年，分析年不同內容即不同)"""
+    return chart_key(analysis['pillars'], analysis['gender'], analysis['dayun']['analysis_year'], f"p{PROMPT_VERSION}")
+
+
+def chart_prompt(analysis):
+    """由 cached_analysis 的結果組成提示詞"""
+    fe, pattern, rating = analysis['five_elements'], analysis['pattern'], analysis['rating']
+    interactions = [item for items in analysis['interactions'].values() for item in items]
+    dayun = analysis['dayun']
+    lines = [
+        f"四柱：{' '.join(analysis['pillars'])}（{analysis['gender']}命）",
+        f"日主：{fe['day_master']}{fe['day_element']}，{fe['strength']}（{fe['strength_desc']}）",
+        "五行分數：" + "、".join(f"{e}{fe['scores'][e]:.1f}" for e in FIVE_ELEMENTS),
+        f"格局：{'、'.join(pattern['patterns'])}（{pattern['pattern_desc']}）",
+        f"喜神：{pattern['xi_shen']}；用神：{pattern['yong_shen']}；忌神：{'、'.join(pattern['ji_shen']) or '無'}",
+        "十神：" + "、".join(f"{name}{weight:.1f}" for name, weight in sorted(pattern['ten_gods'].items(), key=lambda kv: -kv[1])),
+        f"神煞：{'、'.join(analysis['all_shen_sha']) or '無'}",
+        f"干支關係：{'、'.join(interactions) or '無'}",
+        f"性格：{analysis['personality']['base_trait']}；{analysis['personality']['strength_trait']}",
+        f"事業建議：{analysis['career']['career_advice']}",
+        f"婚姻：{analysis['marriage']['marriage_advice']}",
+        f"健康提醒：{'；'.join(analysis['health']['health_warnings']) or '無'}",
+        f"大運（{dayun['direction']}）：" + "、".join(f"{d['age_range']}{d['pillar']}{d['luck']}" for d in dayun['dayun_list']),
+        f"命格總評：{rating['total']} 分，{rating['overall']}",
+    ]
+    return "\n".join(lines)
+
+
+class StubBackend:
+    """不連網的假後端：依提示詞產生固定內容，延遲可調，供測試與壓測"""
+    name = 'stub'
+
+    def __init__(self, first_chunk_delay=0.2, chunk_delay=0.02, chunks=12):
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+
+    async def stream(self, prompt, timeout):
+        digest = hashlib.sha1(prompt.encode()).hexdigest()[:8]
+        await asyncio.sleep(self.first_chunk_delay)
+        for i in range(self.chunks):
+            yield f"【測試解讀 {digest}】第 {i + 1} 段：{prompt.splitlines()[0]}\n\n"
+            await asyncio.sleep(self.chunk_delay)
+
+
+class GeminiBackend:
+    """google-generativeai 非同步串流後端 (套件在建立後端時才載入，未使用 AI 解讀時不付出匯入成本)"""
+    name = 'gemini'
+
+    def __init__(self, model_name=DEFAULT_MODEL, api_key=None):
+        try:
+            import google.generativeai as genai
+        except ImportError:
+            raise RuntimeError("需要 google-generativeai：pip install google-generativeai") from None
+        genai.configure(api_key=api_key or os.environ['GOOGLE_API_KEY'])
+        self.model = genai.GenerativeModel(model_name, system_instruction=SYSTEM_INSTRUCTION)
+
+    async def stream(self, prompt, timeout):
+        response = await self.model.generate_content_async(prompt, stream=True, request_options={'timeout': timeout})
+        async for chunk in response:
+            # 被安全過濾或沒有文字的片段 .text 會丟出 ValueError
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+
+BACKENDS = {'gemini': GeminiBackend, 'stub': StubBackend}
+
+
+def backend_from_env():
+    """依環境變數建立後端；未設定任何後端時回傳 None (不提供 AI 解讀)"""
+    name = os.environ.get('BAZI_NARRATIVE_BACKEND') or ('gemini' if os.environ.get('GOOGLE_API_KEY') else None)
+    if name is None:
+        return None
+    if name not in BACKENDS:
+        raise ValueError(f"未知的解讀後端：{name} (可用：{', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+class Generation:
+    """一次進行中的生成：由一個任務寫入片段，任意數量的訂閱者從頭依序讀取"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, chunk):
+        async with self.changed:
+            self.chunks.append(chunk)
+            self.changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self.changed:
+            self.done, self.error = True, error
+            self.changed.notify_all()
+
+    async def follow(self):
+        read = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: read < len(self.chunks) or self.done)
+                new, done = self.chunks[read:], self.done
+            for chunk in new:
+                yield chunk
+            read += len(new)
+            if done and read == len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class NarrativeService:
+    """限制同時呼叫數、合併同鍵的進行中請求、每次呼叫有逾時；須在同一個事件迴圈中使用"""
+
+    def __init__(self, backend, max_concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, cache=None):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = {}
+        self.stats = Counter()
+
+    async def stream(self, key, prompt):
+        """逐段產出解讀文字；快取命中時一次產出全文，同鍵已有進行中的生成時直接訂閱它"""
+        if self.cache is not None and key not in self.in_flight:
+            # SQLite 讀寫在執行緒中進行，不阻塞事件迴圈
+            text = await asyncio.to_thread(self.cache.get, 'narrative', key)
+            if text is not None:
+                self.stats['cache_hits'] += 1
+                yield text
+                return
+        generation = self.in_flight.get(key)
+        if generation is None:
+            generation = self.in_flight[key] = Generation()
+            generation.task = asyncio.get_running_loop().create_task(self.run(key, prompt, generation))
+            self.stats['calls'] += 1
+        else:
+            self.stats['deduplicated'] += 1
+        async for chunk in generation.follow():
+            yield chunk
+
+    async def generate(self, key, prompt):
+        return ''.join([chunk async for chunk in self.stream(key, prompt)])
+
+    async def run(self, key, prompt, generation):
+        error = None
+        try:
+            async with self.semaphore:
+                # 逾時只計後端呼叫本身，不含排隊等待
+                async with asyncio.timeout(self.timeout):
+                    async for chunk in self.backend.stream(prompt, self.timeout):
+                        await generation.publish(chunk)
+            if self.cache is not None:
+                # 寫入快取失敗不影響這次的解讀
+                try:
+                    await asyncio.to_thread(self.cache.put, 'narrative', key, ''.join(generation.chunks))
+                except sqlite3.Error:
+                    self.stats['cache_errors'] += 1
+        except TimeoutError:
+            error = TimeoutError(f"解讀生成逾時 ({self.timeout:g}s)")
+            self.stats['timeouts'] += 1
+        except Exception as e:
+            error = e
+            self.stats['errors'] += 1
+        finally:
+            self.in_flight.pop(key, None)
+            await generation.finish(error)
+
+
+# --- 同步介面 (Streamlit) ---
+# Streamlit 每個工作階段各有執行緒；所有請求交給同一個背景事件迴圈，跨工作階段的同鍵請求也能合併。
+
+@lru_cache(maxsize=1)
+def background_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='narrative-loop', daemon=True).start()
+    return loop
+
+
+@lru_cache(maxsize=1)
+def default_service():
+    """依環境變數建立的共用服務；未設定後端時為 None"""
+    backend = backend_from_env()
+    return NarrativeService(backend, cache=default_cache()) if backend is not None else None
+
+
+def stream_sync(service, key, prompt):
+    """在背景事件迴圈中串流生成，以一般產生器逐段回傳 (可直接交給 st.write_stream)"""
+    chunks = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for chunk in service.stream(key, prompt):
+                chunks.put(chunk)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    asyncio.run_coroutine_threadsafe(pump(), background_loop())
+    while (item := chunks.get()) is not done:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def chart_narrative(pillars, gender, service=None):
+    """單一命盤的完整解讀文字 (同步)；未設定後端時回傳 None"""
+    service = service or default_service()
+    if service is None:
+        return None
+    analysis = cached_analysis(*pillars, gender)
+    return ''.join(stream_sync(service, narrative_key(analysis), chart_prompt(analysis)))
+
+
+# --- 離線壓測 ---
+
+async def benchmark(service, prompts, requests, clients, seed=0):
+    """clients 個並行用戶端共送出 requests 個請求 (命盤從 prompts 中隨機挑選)，回傳排序後的延遲"""
+    rng = random.Random(seed)
+    picks = [rng.choice(prompts) for _ in range(requests)]
+    latencies = []
+    gate = asyncio.Semaphore(clients)
+
+    async def one(key, prompt):
+        async with gate:
+            start = time.perf_counter()
+            await service.generate(key, prompt)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(key, prompt) for key, prompt in picks))
+    return sorted(latencies)
+
+
+if __name__ == "__main__":
+    from batch import record_pillars
+    from chart_store import CHART_COUNT, chart_from_index
+
+    parser = argparse.ArgumentParser(description="AI 命理解讀：單盤串流輸出，或以 --bench 離線壓測生成層")
+    parser.add_argument('--datetime', help="出生時刻 (ISO 8601)")
+    parser.add_argument('--pillars', help="四柱，以逗號分隔")
+    parser.add_argument('--gender', default='男')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None, help="預設依環境變數")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同時呼叫後端的上限")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--charts', type=int, default=200, help="壓測時不同命盤的數量")
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--cache', action='store_true', help="使用持久快取 (BAZI_CACHE_PATH)")
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    backend = BACKENDS[args.backend]() if args.backend else backend_from_env()
+    if backend is None:
+        sys.exit("未設定解讀後端：設定 GOOGLE_API_KEY 或 BAZI_NARRATIVE_BACKEND，或加上 --backend stub")
+
+    async def main():
+        service = NarrativeService(backend, args.concurrency, args.timeout, default_cache() if args.cache else None)
+        if not args.bench:
+            analysis = cached_analysis(*record_pillars({'datetime': args.datetime, 'pillars': args.pillars}), args.gender)
+            async for chunk in service.stream(narrative_key(analysis), chart_prompt(analysis)):
+                sys.stdout.write(chunk)
+                sys.stdout.flush()
+            print()
+            return
+        rng = random.Random(0)
+        prompts = []
+        for index in rng.sample(range(CHART_COUNT), args.charts):
+            bazi = chart_from_index(index)
+            analysis = cached_analysis(*bazi.pillars, bazi.gender)
+            prompts.append((narrative_key(analysis), chart_prompt(analysis)))
+        start = time.perf_counter()
+        latencies = await benchmark(service, prompts, args.requests, args.clients)
+        elapsed = time.perf_counter() - start
+        pct = lambda q: latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))] * 1000
+        print(f"{backend.name}：{args.requests} 請求 / {elapsed:.2f}s = {args.requests / elapsed:,.1f} req/s；"
+              f"後端呼叫 {service.stats['calls']}，合併 {service.stats['deduplicated']}，"
+              f"快取命中 {service.stats['cache_hits']}，逾時 {service.stats['timeouts']}，錯誤 {service.stats['errors']}")
+        print(f"延遲 (ms)：p50 {pct(50):.1f} / p90 {pct(90):.1f} / p99 {pct(99):.1f} / max {latencies[-1] * 1000:.1f}")
+
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+import argparse
+import csv
+import datetime
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+from bazi_core import FIVE_ELEMENTS, GENDERS, SHEN_SHA_NAMES
+from batch import map_chunks
+from bulk import worker_store
+from chart_store import (
+    BUILT, PATTERN_NAMES, RECORD_DTYPE, STRENGTHS, chart_from_index, chart_indices, encode_summary, summarize,
+)
+from solar_pillars import pillar_indices_batch
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# --- 人口統計彙總 ---
+# 以兩小時 (每個時辰取中點：00、02 ... 22 點) 為解析度走訪日期區間，統計格局、神煞、身強弱與五行分數分布。
+# 每個月為一個工作單位，在程序池中計算部分計數 (numpy 陣列)，主程序依序合併，分組 (年 / 月 / 全部) 完成即輸出。
+# 命盤摘要優先取自結果庫 (chart_store)，未建庫時即時計算；輸出為 CSV，或安裝 pyarrow 時輸出 Parquet。
+
+SAMPLE_HOURS = 2
+SCORE_BIN = 5     # 五行分數直方圖的組距
+SCORE_BINS = 20   # 最後一組含 95 以上
+COLUMNS = ['group', 'metric', 'value', 'count', 'share']
+GROUPINGS = ('year', 'month', 'total')
+
+
+def month_periods(start, end):
+    """[start, end] 切成逐月的 [起, 迄) 日期區段"""
+    periods = []
+    day = start
+    while day <= end:
+        next_month = (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        stop = min(next_month, end + datetime.timedelta(days=1))
+        periods.append((day, stop))
+        day = stop
+    return periods
+
+
+def group_key(day, by):
+    if by == 'year':
+        return str(day.year)
+    if by == 'month':
+        return f"{day.year}-{day.month:02d}"
+    return 'all'
+
+
+def summary_records(indices):
+    """命盤編號陣列 -> 摘要紀錄陣列；結果庫沒有的命盤即時計算 (同一批內重複的只算一次)"""
+    store = worker_store()
+    if store is not None:
+        records = store.records(indices)
+        missing = (records['flags'] & BUILT) == 0
+    else:
+        records = np.zeros(len(indices), dtype=RECORD_DTYPE)
+        missing = np.ones(len(indices), dtype=bool)
+    if missing.any():
+        unique, inverse = np.unique(indices[missing], return_inverse=True)
+        computed = np.array([encode_summary(summarize(chart_from_index(i))) for i in unique.tolist()], dtype=RECORD_DTYPE)
+        records[missing] = computed[inverse]
+    return records
+
+
+def tally(records):
+    """摘要紀錄陣列的部分計數"""
+    union = np.bitwise_or.reduce(records['shen_sha'], axis=1)
+    score_bins = np.minimum(records['scores'] // (SCORE_BIN * 10), SCORE_BINS - 1)
+    return {
+        'charts': np.array([len(records)]),
+        'strength': np.bincount(records['strength'], minlength=len(STRENGTHS)),
+        'pattern': ((records['patterns'][:, None] >> np.arange(len(PATTERN_NAMES))) & 1).sum(axis=0),
+        'shen_sha': ((union[:, None] >> np.arange(len(SHEN_SHA_NAMES), dtype=np.uint64)) & np.uint64(1)).sum(axis=0),
+        'score': np.bincount((score_bins + np.arange(5) * SCORE_BINS).ravel(), minlength=5 * SCORE_BINS).reshape(5, SCORE_BINS),
+    }
+
+
+def merge(total, part):
+    if total is None:
+        return {name: counts.copy() for name, counts in part.items()}
+    for name, counts in part.items():
+        total[name] += counts
+    return total
+
+
+def count_period(period, gender_codes, by):
+    """一個日期區段內所有取樣時刻 × 性別的部分計數，回傳 (分組, 計數)"""
+    start, stop = period
+    times = np.arange(np.datetime64(start, 'h'), np.datetime64(stop, 'h'), SAMPLE_HOURS)
+    jiazi = pillar_indices_batch(times)
+    indices = np.concatenate([chart_indices(jiazi, np.full(len(jiazi), g)) for g in gender_codes])
+    return group_key(start, by), tally(summary_records(indices))
+
+
+def count_chunk(periods, gender_codes, by):
+    return [count_period(p, gender_codes, by) for p in periods]
+
+
+def group_rows(key, counts):
+    """合併後的計數展開為 (分組, 指標, 值, 次數, 佔比) 列"""
+    charts = int(counts['charts'][0])
+    rows = [(key, 'charts', '', charts, 1.0)]
+    labelled = [('strength', STRENGTHS, counts['strength']), ('pattern', PATTERN_NAMES, counts['pattern']),
+                ('shen_sha', SHEN_SHA_NAMES, counts['shen_sha'])]
+    bin_labels = [f"{i * SCORE_BIN}-{(i + 1) * SCORE_BIN}" for i in range(SCORE_BINS - 1)] + [f"{(SCORE_BINS - 1) * SCORE_BIN}+"]
+    labelled += [(f'score:{e}', bin_labels, counts['score'][i]) for i, e in enumerate(FIVE_ELEMENTS)]
+    for metric, labels, values in labelled:
+        rows += [(key, metric, label, int(v), round(int(v) / charts, 6)) for label, v in zip(labels, values)]
+    return rows
+
+
+class CsvSink:
+    def __init__(self, stream):
+        self.writer = csv.writer(stream)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class ParquetSink:
+    """每個分組寫成一個 row group，不需把全部結果留在記憶體"""
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise RuntimeError("輸出 Parquet 需要 pyarrow：pip install pyarrow")
+        self.schema = pyarrow.schema([('group', pyarrow.string()), ('metric', pyarrow.string()), ('value', pyarrow.string()),
+                                      ('count', pyarrow.int64()), ('share', pyarrow.float64())])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        self.writer.write_table(pyarrow.Table.from_pylist([dict(zip(COLUMNS, r)) for r in rows], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def aggregate(start, end, sink, by='year', genders=GENDERS, workers=None, chunksize=12, log=sys.stderr):
+    """統計 [start, end] 的出生時刻分布並寫入 sink，回傳統計的命盤數"""
+    gender_codes = [GENDERS.index(g) for g in genders]
+    started = time.perf_counter()
+    key, counts, charts = None, None, 0
+    for part_key, part in map_chunks(partial(count_chunk, gender_codes=gender_codes, by=by), month_periods(start, end),
+                                     workers=workers, chunksize=chunksize):
+        # 工作單位依時間順序回傳，分組鍵改變即代表前一組已完整
+        if part_key != key and counts is not None:
+            sink.write(group_rows(key, counts))
+            if log:
+                print(f"{key}：{int(counts['charts'][0]):,} 盤，{time.perf_counter() - started:.1f}s", file=log)
+            counts = None
+        key, counts = part_key, merge(counts, part)
+        charts += int(part['charts'][0])
+    if counts is not None:
+        sink.write(group_rows(key, counts))
+    sink.close()
+    if log:
+        print(f"完成：{charts:,} 盤，{time.perf_counter() - started:.1f}s", file=log)
+    return charts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以兩小時解析度統計日期區間內的格局、神煞、身強弱與五行分數分布")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date(1900, 1, 1))
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=datetime.date(2100, 12, 31))
+    parser.add_argument('--by', choices=GROUPINGS, default='year')
+    parser.add_argument('--gender', choices=GENDERS, default=None, help="預設兩性各計一次")
+    parser.add_argument('--output', default='-', help="輸出檔 (預設 stdout 的 CSV；副檔名 .parquet 時輸出 Parquet)")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    genders = [args.gender] if args.gender else GENDERS
+    if args.output.endswith('.parquet'):
+        sink = ParquetSink(args.output)
+        aggregate(args.start, args.end, sink, by=args.by, genders=genders, workers=args.workers)
+    elif args.output == '-':
+        sys.stdout.reconfigure(encoding='utf-8', newline='')
+        aggregate(args.start, args.end, CsvSink(sys.stdout), by=args.by, genders=genders, workers=args.workers)
+    else:
+        with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+            aggregate(args.start, args.end, CsvSink(f), by=args.by, genders=genders, workers=args.workers)
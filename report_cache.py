@@ -0,0 +1,195 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+
+from bazi_core import RULES_VERSION, SECTION_INDEX, current_year, render_chart_cached, render_section_cached
+
+# --- 持久報告快取 (SQLite) ---
+# 已產生的 AI 解讀與 HTML 報告 / 段落存入 SQLite，鍵為 (種類, 命盤鍵|性別|分析年|規則或提示詞版本[|出生時刻])，內容以 zlib 壓縮。
+# WAL 模式 + busy_timeout 讓多個 Streamlit / API 工作程序同時讀寫；每個執行緒各自一條連線。
+# 超過存活時間 (TTL) 的項目視為未命中；總大小超過上限時依最近存取時間 (LRU) 淘汰，總大小由觸發器維護，不必每次加總。
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_cache.sqlite3")
+DEFAULT_TTL = float(os.environ.get('BAZI_CACHE_TTL', 30 * 24 * 3600))
+DEFAULT_MAX_BYTES = int(os.environ.get('BAZI_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# 存取時間只在與上次相差超過此秒數時才更新，避免每次讀取都寫入
+ACCESS_RESOLUTION = 60
+# 淘汰到上限的此比例為止，避免每次寫入都觸發淘汰
+EVICT_TARGET = 0.9
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+INSERT OR IGNORE INTO totals VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+    BEGIN UPDATE totals SET bytes = bytes + new.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+    BEGIN UPDATE totals SET bytes = bytes - old.size; END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+    BEGIN UPDATE totals SET bytes = bytes + new.size - old.size; END;
+"""
+
+
+def chart_key(pillars, gender, analysis_year=None, version=RULES_VERSION, birth=None):
+    """快取鍵：四柱|性別|分析年 (預設今年)|版本，有出生時刻時再加 |出生時刻"""
+    key = f"{''.join(pillars)}|{gender}|{analysis_year or current_year()}|{version}"
+    return f"{key}|{birth.isoformat()}" if birth is not None else key
+
+
+def birth_time(birth):
+    """只有含時刻的 datetime 會改變報告 (大運起運歲數)；日期或 None 一律視為無出生時刻，共用同一份快取"""
+    return birth if isinstance(birth, datetime.datetime) else None
+
+
+class ReportCache:
+    """多程序安全的持久快取；連線依 (程序, 執行緒) 建立，fork 後的子程序會自行重連"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, kind, key):
+        """命中時回傳字串；不存在或已過期回傳 None"""
+        conn = self.connect()
+        row = conn.execute("SELECT created, accessed, value FROM entries WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        if row is None:
+            return None
+        created, accessed, value = row
+        now = time.time()
+        if now - created > self.ttl:
+            conn.execute("DELETE FROM entries WHERE kind = ? AND key = ? AND created = ?", (kind, key, created))
+            return None
+        if now - accessed > ACCESS_RESOLUTION:
+            conn.execute("UPDATE entries SET accessed = ? WHERE kind = ? AND key = ?", (now, kind, key))
+        return zlib.decompress(value).decode('utf-8')
+
+    def put(self, kind, key, text):
+        value = zlib.compress(text.encode('utf-8'))
+        now = time.time()
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (kind, key) DO UPDATE SET "
+                "created = excluded.created, accessed = excluded.accessed, size = excluded.size, value = excluded.value",
+                (kind, key, now, now, len(value), value),
+            )
+            if self.total_bytes(conn) > self.max_bytes:
+                self.evict(conn, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def total_bytes(self, conn=None):
+        return (conn or self.connect()).execute("SELECT bytes FROM totals").fetchone()[0]
+
+    def evict(self, conn, now):
+        """先刪過期項目，仍超過上限時依存取時間由舊到新刪到目標大小"""
+        conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl,))
+        excess = self.total_bytes(conn) - int(self.max_bytes * EVICT_TARGET)
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM "
+                "(SELECT rowid, SUM(size) OVER (ORDER BY accessed, rowid) AS freed FROM entries) WHERE freed - size < ?)",
+                (excess,),
+            )
+
+    def get_or_create(self, kind, key, create):
+        text = self.get(kind, key)
+        if text is None:
+            text = create()
+            self.put(kind, key, text)
+        return text
+
+    def prune(self):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        self.evict(conn, time.time())
+        conn.execute("COMMIT")
+
+    def clear(self):
+        self.connect().execute("DELETE FROM entries")
+
+    def stats(self):
+        rows = self.connect().execute("SELECT kind, COUNT(*), SUM(size) FROM entries GROUP BY kind ORDER BY kind").fetchall()
+        return {'bytes': self.total_bytes(), 'max_bytes': self.max_bytes, 'ttl': self.ttl,
+                'kinds': {kind: {'entries': count, 'bytes': size} for kind, count, size in rows}}
+
+
+@lru_cache(maxsize=1)
+def default_cache():
+    """環境變數 BAZI_CACHE_PATH 指定的共用快取；設為空字串時停用 (回傳 None)"""
+    path = os.environ.get('BAZI_CACHE_PATH', DEFAULT_CACHE_PATH)
+    return ReportCache(path) if path else None
+
+
+# 分析年只取一次，同時用於快取鍵與渲染 (程序內快取也以分析年為鍵)，跨年時寫入的內容與鍵一定是同一年
+
+def report_section(year, month, day, hour, gender, key, birth=None, cache=None, analysis_year=None):
+    """單一報告段落 HTML：先查持久快取，未命中時渲染後寫入。birth 只影響大運段落，其他段落忽略以共用快取"""
+    cache = cache or default_cache()
+    birth = birth_time(birth) if 'dayun' in SECTION_INDEX[key][2] else None
+    analysis_year = analysis_year or current_year()
+    render = lambda: render_section_cached(year, month, day, hour, gender, key, birth, analysis_year=analysis_year)
+    if cache is None:
+        return render()
+    return cache.get_or_create(f'section:{key}', chart_key((year, month, day, hour), gender, analysis_year, birth=birth), render)
+
+
+def report_html(year, month, day, hour, gender, birth=None, cache=None, analysis_year=None):
+    """整份報告 HTML (含樣式表)；birth 為含時刻的 datetime 時大運段落使用實際起運歲數，流年取 analysis_year (預設今年)"""
+    cache = cache or default_cache()
+    birth = birth_time(birth)
+    analysis_year = analysis_year or current_year()
+    render = lambda: render_chart_cached(year, month, day, hour, gender, birth, analysis_year=analysis_year)
+    if cache is None:
+        return render()
+    return cache.get_or_create('report', chart_key((year, month, day, hour), gender, analysis_year, birth=birth), render)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="持久報告快取維護")
+    parser.add_argument('path', nargs='?', default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--prune', action='store_true', help="刪除過期項目並淘汰到大小上限內")
+    parser.add_argument('--clear', action='store_true')
+    args = parser.parse_args()
+
+    cache = ReportCache(args.path)
+    if args.clear:
+        cache.clear()
+    if args.prune:
+        cache.prune()
+    stats = cache.stats()
+    print(f"{args.path}：{stats['bytes'] / 1024:,.1f} KB / 上限 {stats['max_bytes'] / 1024 / 1024:,.0f} MB，TTL {stats['ttl'] / 86400:g} 天")
+    for kind, info in stats['kinds'].items():
+        print(f"  {kind}：{info['entries']:,} 筆，{info['bytes'] / 1024:,.1f} KB")
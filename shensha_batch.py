@@ -0,0 +1,70 @@
+import numpy as np
+
+from bazi_core import (
+    SS_YEAR_TABLE, SS_DAY_TABLE, SS_MONTH_TABLE, SS_DAY_ONLY_TABLE, HG_INDEX,
+    YEAR_FIRE_LIFE, YEAR_WATER_EARTH_LIFE, SAN_QI_INDEX, GONG_LU_INDEX,
+    BIT_HUA_GAI, BIT_SAN_QI, BIT_TIAN_LUO, BIT_DI_WANG, BRANCH_INDEX,
+)
+
+# --- 批次神煞引擎 (NumPy 向量化) ---
+# 與 bazi_core.shen_sha_masks 共用同一份編譯後的規則表，只是改以陣列索引一次計算 N 個命盤。
+
+YEAR_TABLE = np.array(SS_YEAR_TABLE, dtype=np.uint64)          # (年柱 120, 目標地支 12)
+DAY_TABLE = np.array(SS_DAY_TABLE, dtype=np.uint64)            # (日柱 120, 目標干支 120)
+MONTH_TABLE = np.array(SS_MONTH_TABLE, dtype=np.uint64)        # (月支 12, 目標干支 120)
+DAY_ONLY_TABLE = np.array(SS_DAY_ONLY_TABLE, dtype=np.uint64)  # (月支 12, 日柱 120)
+HG_ARRAY = np.array(HG_INDEX, dtype=np.int64)
+FIRE_LIFE = np.array(YEAR_FIRE_LIFE, dtype=bool)
+WATER_EARTH_LIFE = np.array(YEAR_WATER_EARTH_LIFE, dtype=bool)
+
+SAN_QI_TABLE = np.zeros((10, 10, 10), dtype=bool)
+for y_s, m_s, d_s in SAN_QI_INDEX:
+    SAN_QI_TABLE[y_s, m_s, d_s] = True
+
+GONG_LU_TABLE = np.zeros((120, 120), dtype=np.uint64)
+for (d_p, h_p), bit in GONG_LU_INDEX.items():
+    GONG_LU_TABLE[d_p, h_p] = bit
+
+XU, HAI = BRANCH_INDEX['戌'], BRANCH_INDEX['亥']
+CHEN, SI = BRANCH_INDEX['辰'], BRANCH_INDEX['巳']
+
+# 性別編碼：0 = 男，1 = 女 (亦接受 "男" / "女" 字串陣列)
+MALE, FEMALE = 0, 1
+
+
+def gender_codes(gender):
+    gender = np.asarray(gender)
+    if gender.dtype.kind in ('U', 'S', 'O'):
+        return np.where(gender == "男", MALE, np.where(gender == "女", FEMALE, -1))
+    return gender.astype(np.int64)
+
+
+def shen_sha_batch(stems, branches, gender):
+    """批次計算神煞：stems (N,4) 天干索引、branches (N,4) 地支索引、gender (N,)，回傳 (N,4) uint64 遮罩"""
+    s = np.asarray(stems, dtype=np.int64)
+    b = np.asarray(branches, dtype=np.int64)
+    g = gender_codes(gender)
+    p = s * 12 + b
+    y_p, d_p, h_p = p[:, 0:1], p[:, 2:3], p[:, 3]
+    y_b, m_b, d_b = b[:, 0:1], b[:, 1:2], b[:, 2:3]
+
+    masks = YEAR_TABLE[y_p, b] | DAY_TABLE[d_p, p] | MONTH_TABLE[m_b, p]
+    masks[SAN_QI_TABLE[s[:, 0], s[:, 1], s[:, 2]]] |= np.uint64(BIT_SAN_QI)
+
+    # 華蓋 (年日互查，排除自身)
+    hua_gai = (b == HG_ARRAY[y_b]) & (np.arange(4) != 0)
+    hua_gai |= (b == HG_ARRAY[d_b]) & (np.arange(4) != 2)
+    masks[hua_gai] |= np.uint64(BIT_HUA_GAI)
+
+    # 天羅 (火命或男性，見戌亥) / 地網 (水土命或女性，見辰巳)
+    has_xu_hai = (b == XU).any(axis=1) & (b == HAI).any(axis=1)
+    has_chen_si = (b == CHEN).any(axis=1) & (b == SI).any(axis=1)
+    luo = has_xu_hai & (FIRE_LIFE[y_p[:, 0]] | (g == MALE))
+    wang = has_chen_si & (WATER_EARTH_LIFE[y_p[:, 0]] | (g == FEMALE))
+    masks[luo[:, None] & ((b == XU) | (b == HAI))] |= np.uint64(BIT_TIAN_LUO)
+    masks[wang[:, None] & ((b == CHEN) | (b == SI))] |= np.uint64(BIT_DI_WANG)
+
+    # 日柱專屬 (魁罡、十靈日、陰差陽錯…) 與時柱拱祿
+    masks[:, 2] |= DAY_ONLY_TABLE[m_b[:, 0], d_p[:, 0]]
+    masks[:, 3] |= GONG_LU_TABLE[d_p[:, 0], h_p]
+    return masks
@@ -0,0 +1,226 @@
+import argparse
+import datetime
+import os
+import sys
+from bisect import bisect_right
+
+import numpy as np
+
+from bazi_core import STEMS, BRANCHES
+from timing import timed
+
+# --- 原生陽曆轉四柱 ---
+# 年、月柱以「節」的交接時刻 (精確到秒) 為界，節氣時刻表由 lunar_python 預先產生 (jieqi_table.py)；
+# 日柱由日序直接推算；時柱依 lunar_python 預設流派：晚子時 (23 點) 日柱算當天、時干取次日。
+# lunar_python 僅作為產表與比對的參考實作，執行時不需要。
+
+try:
+    from jieqi_table import JIE_TIMES, FIRST_MONTH_JIAZI, FIRST_YEAR_JIAZI, FIRST_LICHUN
+except ImportError:
+    JIE_TIMES = ()
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jieqi_table.py")
+MIN_YEAR, MAX_YEAR = 1900, 2100
+
+# 公曆日序 + 常數 = 六十甲子日序 (1900-01-01 為甲戌日)
+DAY_JIAZI_OFFSET = 1721414
+
+
+def ymdhms_key(year, month, day, hour=0, minute=0, second=0):
+    return ((((year * 100 + month) * 100 + day) * 100 + hour) * 100 + minute) * 100 + second
+
+
+def jiazi_name(index):
+    return STEMS[index % 10] + BRANCHES[index % 12]
+
+
+def pillar_indices(year, month, day, hour, minute=0, second=0):
+    """陽曆時刻轉四柱的六十甲子序號 (年, 月, 日, 時)"""
+    if not JIE_TIMES:
+        raise RuntimeError("缺少 jieqi_table.py，請先執行 python solar_pillars.py --build-table")
+    k = bisect_right(JIE_TIMES, ymdhms_key(year, month, day, hour, minute, second)) - 1
+    if k < 0 or k >= len(JIE_TIMES) - 1:
+        raise ValueError(f"僅支援 {MIN_YEAR}-{MAX_YEAR} 年")
+    year_jz = (FIRST_YEAR_JIAZI + (k + 12 - FIRST_LICHUN) // 12) % 60
+    month_jz = (FIRST_MONTH_JIAZI + k) % 60
+    day_jz = (datetime.date(year, month, day).toordinal() + DAY_JIAZI_OFFSET) % 60
+    # 晚子時：時干以次日日干起算
+    day_stem = (day_jz + 1) % 10 if hour == 23 else day_jz % 10
+    hour_branch = (hour + 1) // 2 % 12
+    hour_stem = (day_stem % 5 * 2 + hour_branch) % 10
+    hour_jz = (6 * hour_stem - 5 * hour_branch) % 60
+    return year_jz, month_jz, day_jz, hour_jz
+
+
+@timed('calendar')
+def solar_to_pillars(year, month, day, hour, minute=0, second=0):
+    """陽曆時刻轉四柱干支字串 (年柱, 月柱, 日柱, 時柱)，與 lunar_python 的 getEightChar() 一致"""
+    return tuple(jiazi_name(i) for i in pillar_indices(year, month, day, hour, minute, second))
+
+
+# --- 向量化版本 ---
+
+JIE_ARRAY = np.array([
+    np.datetime64(f"{t // 10**10:04d}-{t // 10**8 % 100:02d}-{t // 10**6 % 100:02d}T"
+                  f"{t // 10**4 % 100:02d}:{t // 100 % 100:02d}:{t % 100:02d}", 's')
+    for t in JIE_TIMES
+], dtype='datetime64[s]')
+DAY_EPOCH = np.datetime64('1970-01-01', 'D')
+EPOCH_DAY_JIAZI = (datetime.date(1970, 1, 1).toordinal() + DAY_JIAZI_OFFSET) % 60
+
+
+def pillar_indices_batch(datetimes):
+    """陽曆時刻陣列轉四柱六十甲子序號，回傳 (N,4) int64；天干 = 序號 % 10，地支 = 序號 % 12"""
+    t = np.asarray(datetimes, dtype='datetime64[s]')
+    k = np.searchsorted(JIE_ARRAY, t, side='right') - 1
+    if len(t) and (k.min() < 0 or k.max() >= len(JIE_ARRAY) - 1):
+        raise ValueError(f"僅支援 {MIN_YEAR}-{MAX_YEAR} 年")
+    days = t.astype('datetime64[D]')
+    hour = (t - days).astype('timedelta64[h]').astype(np.int64)
+    day_jz = ((days - DAY_EPOCH).astype(np.int64) + EPOCH_DAY_JIAZI) % 60
+    day_stem = np.where(hour == 23, day_jz + 1, day_jz) % 10
+    hour_branch = (hour + 1) // 2 % 12
+    hour_stem = (day_stem % 5 * 2 + hour_branch) % 10
+    out = np.empty((len(t), 4), dtype=np.int64)
+    out[:, 0] = (FIRST_YEAR_JIAZI + (k + 12 - FIRST_LICHUN) // 12) % 60
+    out[:, 1] = (FIRST_MONTH_JIAZI + k) % 60
+    out[:, 2] = day_jz
+    out[:, 3] = (6 * hour_stem - 5 * hour_branch) % 60
+    return out
+
+
+# --- 反查：由八字找出生時段 ---
+# 倒排索引 (年柱, 月柱, 日柱) -> 該日落在此年月柱內的時段；時柱再由五鼠遁直接推出兩小時的時辰窗口。
+
+REVERSE_INDEX = None
+
+
+def jiazi_of(pillar):
+    """干支字串轉六十甲子序號"""
+    if len(pillar) != 2 or pillar[0] not in STEMS or pillar[1] not in BRANCHES:
+        raise ValueError(f"無效的干支：{pillar}")
+    s, b = STEMS.index(pillar[0]), BRANCHES.index(pillar[1])
+    if (s - b) % 2:
+        raise ValueError(f"無效的干支：{pillar}")
+    return (6 * s - 5 * b) % 60
+
+
+def key_to_datetime(key):
+    return datetime.datetime(key // 10**10, key // 10**8 % 100, key // 10**6 % 100,
+                             key // 10**4 % 100, key // 100 % 100, key % 100)
+
+
+def reverse_index():
+    """建立 (年, 月, 日柱序號) -> [(起, 迄)] 的倒排索引 (首次查詢時建立一次)"""
+    global REVERSE_INDEX
+    if REVERSE_INDEX is None:
+        index = {}
+        one_day = datetime.timedelta(days=1)
+        for k in range(len(JIE_TIMES) - 1):
+            t0, t1 = key_to_datetime(JIE_TIMES[k]), key_to_datetime(JIE_TIMES[k + 1])
+            year_jz = (FIRST_YEAR_JIAZI + (k + 12 - FIRST_LICHUN) // 12) % 60
+            month_jz = (FIRST_MONTH_JIAZI + k) % 60
+            day = datetime.datetime(t0.year, t0.month, t0.day)
+            while day < t1:
+                day_jz = (day.toordinal() + DAY_JIAZI_OFFSET) % 60
+                index.setdefault((year_jz, month_jz, day_jz), []).append((max(day, t0), min(day + one_day, t1)))
+                day += one_day
+        REVERSE_INDEX = index
+    return REVERSE_INDEX
+
+
+def find_datetimes(year_p, month_p, day_p, hour_p, start=MIN_YEAR, end=MAX_YEAR):
+    """反查所有產生此八字的時段，回傳依時間排序的 [(起, 迄)]，迄為開區間"""
+    day_jz, hour_jz = jiazi_of(day_p), jiazi_of(hour_p)
+    hour_stem, hour_branch = hour_jz % 10, hour_jz % 12
+    day_stem = day_jz % 10
+    if hour_branch == 0:
+        # 子時分早子 (00 點，日干起) 與晚子 (23 點，次日日干起)
+        hours = [(h0, h1) for h0, h1, stem in ((0, 1, day_stem), (23, 24, day_stem + 1)) if stem % 5 * 2 % 10 == hour_stem]
+    elif (day_stem % 5 * 2 + hour_branch) % 10 == hour_stem:
+        hours = [(hour_branch * 2 - 1, hour_branch * 2 + 1)]
+    else:
+        hours = []
+
+    found = []
+    for span_start, span_end in reverse_index().get((jiazi_of(year_p), jiazi_of(month_p), day_jz), ()):
+        midnight = datetime.datetime(span_start.year, span_start.month, span_start.day)
+        for h0, h1 in hours:
+            window_start = max(midnight + datetime.timedelta(hours=h0), span_start)
+            window_end = min(midnight + datetime.timedelta(hours=h1), span_end)
+            if window_start < window_end and start <= window_start.year <= end:
+                found.append((window_start, window_end))
+    return sorted(found)
+
+
+# --- 產表與比對 (需要 lunar_python) ---
+
+JIE_NAMES = ['小寒', '立春', '惊蛰', '清明', '立夏', '芒种', '小暑', '立秋', '白露', '寒露', '立冬', '大雪']
+
+
+def build_table(path=TABLE_PATH):
+    """以 lunar_python 產生 1900-2100 年 (前後各延伸一個節) 的節交接時刻表"""
+    from lunar_python import Solar
+
+    times = {}
+    for year in range(MIN_YEAR - 1, MAX_YEAR + 2):
+        table = Solar.fromYmd(year, 6, 1).getLunar().getJieQiTable()
+        for name in JIE_NAMES:
+            s = table[name]
+            times[ymdhms_key(s.getYear(), s.getMonth(), s.getDay(), s.getHour(), s.getMinute(), s.getSecond())] = name
+    keys = sorted(times)
+    first = next(i for i, key in enumerate(keys) if times[key] == '大雪' and key // 10**10 == MIN_YEAR - 1)
+    last = next(i for i, key in enumerate(keys) if times[key] == '小寒' and key // 10**10 == MAX_YEAR + 1)
+    keys = keys[first:last + 1]
+
+    s = Solar.fromYmdHms(MIN_YEAR - 1, 12, 31, 12, 0, 0).getLunar().getEightChar()
+    month_jz = (6 * STEMS.index(s.getMonthGan()) - 5 * BRANCHES.index(s.getMonthZhi())) % 60
+    year_jz = (6 * STEMS.index(s.getYearGan()) - 5 * BRANCHES.index(s.getYearZhi())) % 60
+    with open(path, 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write("# 由 python solar_pillars.py --build-table 以 lunar_python 產生，請勿手動修改\n")
+        f.write(f"# 節交接時刻 (YYYYMMDDHHMMSS)，自 {MIN_YEAR - 1} 年大雪至 {MAX_YEAR + 1} 年小寒\n")
+        f.write(f"FIRST_MONTH_JIAZI = {month_jz}\n")
+        f.write(f"FIRST_YEAR_JIAZI = {year_jz}\n")
+        f.write(f"FIRST_LICHUN = {keys.index(next(k for k in keys if times[k] == '立春'))}\n")
+        f.write("JIE_TIMES = (\n")
+        for i in range(0, len(keys), 6):
+            f.write("    " + ", ".join(str(k) for k in keys[i:i + 6]) + ",\n")
+        f.write(")\n")
+    return path
+
+
+def verify_against_lunar(start=MIN_YEAR, end=MAX_YEAR, log=sys.stderr):
+    """逐時比對 start-end 年每個整點的四柱與 lunar_python (含向量化版本)，回傳不一致的時刻列表"""
+    from lunar_python import Solar
+
+    mismatches = []
+    day = datetime.date(start, 1, 1)
+    while day.year <= end:
+        stamps = [datetime.datetime(day.year, day.month, day.day, h) for h in range(24)]
+        batch = pillar_indices_batch(np.array(stamps, dtype='datetime64[s]'))
+        for h, row in zip(range(24), batch):
+            ec = Solar.fromYmdHms(day.year, day.month, day.day, h, 0, 0).getLunar().getEightChar()
+            expected = (ec.getYear(), ec.getMonth(), ec.getDay(), ec.getTime())
+            if solar_to_pillars(day.year, day.month, day.day, h) != expected or tuple(jiazi_name(i) for i in row) != expected:
+                mismatches.append((day, h, expected))
+        if log and day.month == 1 and day.day == 1:
+            print(f"{day.year}：不一致 {len(mismatches)}", file=log)
+        day += datetime.timedelta(days=1)
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="原生陽曆轉四柱：產生節氣時刻表或與 lunar_python 全面比對")
+    parser.add_argument('--build-table', action='store_true')
+    parser.add_argument('--verify', action='store_true')
+    parser.add_argument('--start', type=int, default=MIN_YEAR)
+    parser.add_argument('--end', type=int, default=MAX_YEAR)
+    args = parser.parse_args()
+    if args.build_table:
+        print(build_table())
+    if args.verify:
+        bad = verify_against_lunar(args.start, args.end)
+        print(f"不一致：{len(bad)}")
+        for item in bad[:20]:
+            print(item)
+        sys.exit(1 if bad else 0)
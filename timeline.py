@@ -0,0 +1,268 @@
+import argparse
+import calendar
+import datetime
+import io
+import json
+import sys
+from bisect import bisect_right
+
+import numpy as np
+
+from bazi_core import STEMS, FIVE_ELEMENTS, ELEMENTS_MAP, GENDERS, cached_analysis, current_year
+from batch import map_chunks, record_datetime
+from solar_pillars import (
+    JIE_ARRAY, JIE_TIMES, MIN_YEAR, MAX_YEAR, jiazi_name, key_to_datetime, pillar_indices_batch, ymdhms_key,
+)
+
+# --- 百年大運流年時間軸 ---
+# 起運依出生時刻到最近「節」的實際距離折算 (順行取下一節、逆行取上一節)：三天折一年、六小時折一月、十二分鐘折一天、
+# 一分鐘折兩小時，與 lunar_python Yun(sect=2) 相同。整條時間軸以陣列運算，一次算出 N 個命盤的全部大運與流年。
+# 年齡一律為虛歲；流年以西元年計 (干支 = (年 - 4) % 60)，起運前的年份不屬任何大運 (大運序號 0)。
+# 單一命盤 (報告) 走 life_timeline 的純 Python 版本，省去小陣列的開銷；兩者結果一致。
+
+TIMELINE_YEARS = 100
+MINUTES_PER_YEAR, MINUTES_PER_MONTH, MINUTES_PER_DAY = 4320, 360, 12
+
+LUCK_NAMES = ('平', '吉', '凶')
+STEM_ELEMENT = np.array([FIVE_ELEMENTS.index(ELEMENTS_MAP[s]) for s in STEMS])
+JIAZI_NAMES = tuple(jiazi_name(i) for i in range(60))
+JIAZI_ELEMENT = tuple(FIVE_ELEMENTS.index(ELEMENTS_MAP[STEMS[i % 10]]) for i in range(60))
+# 大運說明依 (吉凶碼, 五行索引) 預先產生
+DAYUN_LUCK_DESC = tuple(
+    tuple(template.format(elem) for elem in FIVE_ELEMENTS)
+    for template in ("大運走{}，運勢平穩", "大運走{}，為喜用神，運勢較佳", "大運走{}，為忌神，宜謹慎行事")
+)
+DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+LIUNIAN_LUCK_DESC = ("今年運勢平穩，順勢而為", "今年運勢較佳，宜積極把握機會", "今年運勢起伏，宜保守穩健")
+
+
+def luck_codes(pattern_result):
+    """五行 -> 吉凶碼 (0 平、1 吉、2 凶)：喜神、用神為吉，忌神為凶，與 analyze_dayun_liunian 相同"""
+    return tuple(
+        1 if elem in (pattern_result['xi_shen'], pattern_result['yong_shen'])
+        else 2 if elem in pattern_result.get('ji_shen', [])
+        else 0
+        for elem in FIVE_ELEMENTS
+    )
+
+
+def qiyun_start(t, minutes):
+    """出生時刻加上起運折算的年、月、日、時；月底與閏年的進位規則同 lunar_python Solar.nextYear / nextMonth"""
+    years, months = minutes // MINUTES_PER_YEAR, minutes % MINUTES_PER_YEAR // MINUTES_PER_MONTH
+    days, hours = minutes % MINUTES_PER_MONTH // MINUTES_PER_DAY, minutes % MINUTES_PER_DAY * 2
+    day0 = t.astype('datetime64[D]')
+    month0 = t.astype('datetime64[M]')
+    dom = (day0 - month0.astype('datetime64[D]')).astype(np.int64) + 1
+    year = month0.astype(np.int64) // 12 + 1970 + years
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    dom = np.where((month0.astype(np.int64) % 12 == 1) & (dom == 29) & ~leap, 28, dom)
+    target = ((year - 1970) * 12 + month0.astype(np.int64) % 12 + months).astype('datetime64[M]')
+    dom = np.minimum(dom, ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64))
+    return (target.astype('datetime64[D]') + (dom - 1 + days).astype('timedelta64[D]') + (t - day0)
+            + (hours * 3600).astype('timedelta64[s]'))
+
+
+def timeline_arrays(datetimes, gender_codes, luck_tables, years=TIMELINE_YEARS):
+    """N 個出生時刻的大運流年陣列。luck_tables 為 (N, 5) 五行吉凶碼 (luck_codes)；回傳 dict：
+    forward、minutes (起運折算前的分鐘差)、start (起運時刻)、dayun_jz / dayun_start_year / dayun_luck (N, 步數)、
+    liunian_year / liunian_jz / liunian_luck / liunian_dayun (N, years)"""
+    t = np.asarray(datetimes, dtype='datetime64[s]')
+    gender_codes = np.asarray(gender_codes)
+    luck_tables = np.asarray(luck_tables, dtype=np.int8).reshape(len(t), 5)
+    pillars = pillar_indices_batch(t)
+    k = np.searchsorted(JIE_ARRAY, t, side='right') - 1
+    # 陽年男、陰年女順行
+    forward = (pillars[:, 0] % 2 == 0) == (gender_codes == 0)
+    birth_minute = t.astype('datetime64[m]')
+    minutes = np.where(forward,
+                       JIE_ARRAY[k + 1].astype('datetime64[m]') - birth_minute,
+                       birth_minute - JIE_ARRAY[k].astype('datetime64[m]')).astype(np.int64)
+    start = qiyun_start(t, minutes)
+    birth_year = t.astype('datetime64[Y]').astype(np.int64)[:, None] + 1970
+    start_year = start.astype('datetime64[Y]').astype(np.int64)[:, None] + 1970
+
+    steps = years // 10 + 1
+    offsets = np.arange(1, steps + 1)
+    dayun_jz = (pillars[:, 1:2] + np.where(forward[:, None], offsets, -offsets)) % 60
+    liunian_year = birth_year + np.arange(years)
+    liunian_jz = (liunian_year - 4) % 60
+    rows = np.arange(len(t))[:, None]
+    return {
+        'forward': forward,
+        'minutes': minutes,
+        'start': start,
+        'birth_year': birth_year[:, 0],
+        'dayun_jz': dayun_jz,
+        'dayun_start_year': start_year + (offsets - 1) * 10,
+        'dayun_luck': luck_tables[rows, STEM_ELEMENT[dayun_jz % 10]],
+        'liunian_year': liunian_year,
+        'liunian_jz': liunian_jz,
+        'liunian_luck': luck_tables[rows, STEM_ELEMENT[liunian_jz % 10]],
+        'liunian_dayun': np.where(liunian_year >= start_year, (liunian_year - start_year) // 10 + 1, 0),
+    }
+
+
+def start_age(minutes):
+    """起運折算 (年, 月, 日, 時)"""
+    return (minutes // MINUTES_PER_YEAR, minutes % MINUTES_PER_YEAR // MINUTES_PER_MONTH,
+            minutes % MINUTES_PER_MONTH // MINUTES_PER_DAY, minutes % MINUTES_PER_DAY * 2)
+
+
+def qiyun(birth_dt, forward):
+    """單一出生時刻的 (起運分鐘差, 起運時刻)，算法同 timeline_arrays / qiyun_start"""
+    k = bisect_right(JIE_TIMES, ymdhms_key(birth_dt.year, birth_dt.month, birth_dt.day, birth_dt.hour, birth_dt.minute, birth_dt.second)) - 1
+    if k < 0 or k >= len(JIE_TIMES) - 1:
+        raise ValueError(f"僅支援 {MIN_YEAR}-{MAX_YEAR} 年")
+    jie = key_to_datetime(JIE_TIMES[k + 1] if forward else JIE_TIMES[k]).replace(second=0)
+    birth_minute = birth_dt.replace(second=0, microsecond=0)
+    minutes = int(((jie - birth_minute) if forward else (birth_minute - jie)).total_seconds()) // 60
+    years, months, days, hours = start_age(minutes)
+    year = birth_dt.year + years
+    day = 28 if birth_dt.month == 2 and birth_dt.day == 29 and not calendar.isleap(year) else birth_dt.day
+    year, month = divmod(year * 12 + birth_dt.month - 1 + months, 12)
+    day = min(day, 29 if month == 1 and calendar.isleap(year) else DAYS_IN_MONTH[month])
+    start = datetime.datetime(year, month + 1, day, birth_dt.hour, birth_dt.minute, birth_dt.second)
+    return minutes, start + datetime.timedelta(days=days, hours=hours)
+
+
+def life_timeline(bazi, birth_dt, pattern_result, years=TIMELINE_YEARS, analysis_year=None):
+    """單一命盤的完整時間軸；包含 analyze_dayun_liunian 原有的鍵，報告可直接使用。
+    流年以欄位陣列表示 ({'year', 'age', 'pillar', 'luck', 'dayun'} 各為長度 years 的列表)，由循環表切片產生"""
+    forward = (bazi.stem_idx[0] % 2 == 0) == (bazi.gender_code == 0)
+    minutes, start = qiyun(birth_dt, forward)
+    luck = luck_codes(pattern_result)
+    birth_year = birth_dt.year
+    month_jz = (6 * bazi.stem_idx[1] - 5 * bazi.branch_idx[1]) % 60
+    step = 1 if forward else -1
+
+    dayun_list = []
+    # 流年所屬大運：起運前為空字串，之後每十年一步
+    dayun_column = [''] * min(max(start.year - birth_year, 0), years)
+    for i in range(years // 10 + 1):
+        jz = (month_jz + step * (i + 1)) % 60
+        start_year = start.year + i * 10
+        age = start_year - birth_year + 1
+        elem_idx = JIAZI_ELEMENT[jz]
+        code = luck[elem_idx]
+        dayun_list.append({
+            'pillar': JIAZI_NAMES[jz],
+            'element': FIVE_ELEMENTS[elem_idx],
+            'luck': LUCK_NAMES[code],
+            'luck_desc': DAYUN_LUCK_DESC[code][elem_idx],
+            'age_range': f"{age}-{age + 9}歲",
+            'start_year': start_year,
+            'end_year': start_year + 9,
+        })
+        dayun_column += [JIAZI_NAMES[jz]] * 10
+
+    # 流年干支每 60 年、吉凶每 10 年 (天干) 循環，整欄直接由循環表切片
+    first_jz = (birth_year - 4) % 60
+    stem_luck = [LUCK_NAMES[luck[JIAZI_ELEMENT[s]]] for s in range(10)]
+    cycles = years // 60 + 2
+    liunian = {
+        'year': list(range(birth_year, birth_year + years)),
+        'age': list(range(1, years + 1)),
+        'pillar': list((JIAZI_NAMES * cycles)[first_jz:first_jz + years]),
+        'luck': (stem_luck * (cycles * 6))[first_jz % 10:first_jz % 10 + years],
+        'dayun': dayun_column[:years],
+    }
+
+    if analysis_year is None:
+        analysis_year = current_year()
+    current_jz = (analysis_year - 4) % 60
+    y, m, d, h = start_age(minutes)
+    return {
+        'direction': "順行" if forward else "逆行",
+        'start_age': {'years': y, 'months': m, 'days': d, 'hours': h},
+        'start_text': f"{y}歲{m}個月{d}天",
+        'start_datetime': start.isoformat(' '),
+        'dayun_list': dayun_list,
+        'liunian': liunian,
+        'analysis_year': analysis_year,
+        'liunian_pillar': JIAZI_NAMES[current_jz],
+        'liunian_luck': LIUNIAN_LUCK_DESC[luck[JIAZI_ELEMENT[current_jz]]],
+    }
+
+
+# --- 客戶名冊批次 ---
+
+def timeline_chunk(rows, years=TIMELINE_YEARS):
+    """一批 (列號, 紀錄) 轉為時間軸輸出；紀錄需有出生時刻 (datetime 或 date 加 time / hour) 與 gender"""
+    out, parsed = [], []
+    for row_no, record in rows:
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            dt = record_datetime(record)
+            if not MIN_YEAR <= dt.year <= MAX_YEAR:
+                raise ValueError(f"僅支援 {MIN_YEAR}-{MAX_YEAR} 年")
+            gender = record['gender']
+            if gender not in GENDERS:
+                raise ValueError(f"無效的性別：{gender}")
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            out.append({'row': row_no, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        parsed.append((len(out), row_no, record, dt, gender))
+        out.append(None)
+    if not parsed:
+        return out
+
+    datetimes = np.array([dt for _, _, _, dt, _ in parsed], dtype='datetime64[s]')
+    pillars = pillar_indices_batch(datetimes)
+    names = [[JIAZI_NAMES[i] for i in row] for row in pillars.tolist()]
+    luck = [luck_codes(cached_analysis(*p, gender)['pattern']) for p, (*_, gender) in zip(names, parsed)]
+    arr = timeline_arrays(datetimes, [GENDERS.index(g) for *_, g in parsed], luck, years)
+    for i, (slot, row_no, record, dt, gender) in enumerate(parsed):
+        y, m, d, h = start_age(int(arr['minutes'][i]))
+        line = {'row': row_no}
+        if 'id' in record:
+            line['id'] = record['id']
+        line.update({
+            'pillars': names[i],
+            'gender': gender,
+            'direction': "順行" if arr['forward'][i] else "逆行",
+            'start_age': [y, m, d, h],
+            'start_datetime': str(arr['start'][i]).replace('T', ' '),
+            'dayun': [[JIAZI_NAMES[jz], year, LUCK_NAMES[luck]] for jz, year, luck in
+                      zip(arr['dayun_jz'][i].tolist(), arr['dayun_start_year'][i].tolist(), arr['dayun_luck'][i].tolist())],
+            'liunian': {
+                'year': arr['liunian_year'][i].tolist(),
+                'pillar': [JIAZI_NAMES[jz] for jz in arr['liunian_jz'][i].tolist()],
+                'luck': [LUCK_NAMES[luck] for luck in arr['liunian_luck'][i].tolist()],
+                'dayun': arr['liunian_dayun'][i].tolist(),
+            },
+        })
+        out[slot] = line
+    return out
+
+
+if __name__ == "__main__":
+    from functools import partial
+
+    from bulk import detect_format, read_rows
+
+    parser = argparse.ArgumentParser(description="由 CSV / JSONL 客戶名冊計算百年大運流年，每筆輸出一行 JSON")
+    parser.add_argument('input', nargs='?', default='-', help="輸入檔 (預設 stdin)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default=None, help="預設依副檔名或內容判斷")
+    parser.add_argument('--years', type=int, default=TIMELINE_YEARS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=512)
+    args = parser.parse_args()
+
+    sys.stdout.reconfigure(encoding='utf-8')
+    if args.input == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+    else:
+        stream = open(args.input, encoding='utf-8-sig', newline='')
+    ok = failed = 0
+    with stream:
+        fmt, rows = detect_format(stream, args.input) if args.format is None else (args.format, stream)
+        for result in map_chunks(partial(timeline_chunk, years=args.years), read_rows(rows, fmt),
+                                 workers=args.workers, chunksize=args.chunksize):
+            if 'error' in result:
+                failed += 1
+                print(f"略過第 {result['row']} 列：{result['error']}", file=sys.stderr)
+            else:
+                sys.stdout.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n')
+                ok += 1
+    print(f"完成：輸出 {ok:,} 筆，略過 {failed:,} 筆", file=sys.stderr)
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# --- 階段計時 (以環境變數 BAZI_TIMING=1 開啟) ---
+# 關閉時 timed() 直接回傳原函式，不增加任何呼叫成本；開啟時每個階段寫一行 JSON 日誌到 logger "bazi.timing"，
+# 並記入目前 collect() 區塊的紀錄，供介面顯示單次請求的分解。
+
+ENABLED = os.environ.get('BAZI_TIMING', '').strip().lower() not in ('', '0', 'false', 'no')
+LOGGER = logging.getLogger('bazi.timing')
+CURRENT = ContextVar('bazi_timing_records', default=None)
+
+if ENABLED and not LOGGER.handlers:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
+
+
+def log_event(event, **fields):
+    LOGGER.info(json.dumps({'event': event, **fields}, ensure_ascii=False, separators=(',', ':')))
+
+
+def record(stage, elapsed_ns):
+    """記錄一個階段的耗時：寫入日誌，並附加到目前的 collect() 紀錄 (若有)"""
+    ms = elapsed_ns / 1e6
+    records = CURRENT.get()
+    if records is not None:
+        records.append((stage, ms))
+    log_event('stage', stage=stage, ms=round(ms, 3))
+
+
+def timed(stage, func=None):
+    """包裝函式以計時；可當裝飾器 @timed('calendar') 或直接 timed('calendar', func)。未開啟時原樣回傳"""
+    if func is None:
+        return lambda f: timed(stage, f)
+    if not ENABLED:
+        return func
+
+    clock = time.perf_counter_ns
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        t0 = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(stage, clock() - t0)
+    return wrapper
+
+
+def summarize(records):
+    """同名階段加總，依首次出現順序回傳 {階段: 毫秒}"""
+    totals = {}
+    for stage, ms in records:
+        totals[stage] = totals.get(stage, 0.0) + ms
+    return totals
+
+
+@contextmanager
+def collect(label='request', **fields):
+    """收集區塊內所有階段耗時，產出 [(階段, 毫秒)]；結束時另寫一行請求總結日誌"""
+    records = []
+    token = CURRENT.set(records)
+    t0 = time.perf_counter_ns()
+    try:
+        yield records
+    finally:
+        CURRENT.reset(token)
+        if ENABLED:
+            log_event(label, total_ms=round((time.perf_counter_ns() - t0) / 1e6, 3),
+                      stages={stage: round(ms, 3) for stage, ms in summarize(records).items()}, **fields)